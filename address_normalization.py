@@ -1,26 +1,61 @@
+import re
+import numpy as np
 import pandas as pd
+from functools import lru_cache
+from typing import Callable, Dict, Optional
 
 def normalize_addresses(
     df: pd.DataFrame,
     city_map: dict = None,
     state_map: dict = None,
-    address_map: dict = None
+    address_map: dict = None,
+    word_boundary: bool = False,
+    address_replacer: Optional[Callable[[str], str]] = None,
+    copy: bool = True
 ) -> pd.DataFrame:
     """
     住所レコード（City, StateName, Address1, Address2）の表記ゆれを
     辞書ベースで正規化する。
 
+    各カラムは factorize したユニーク値だけを変換し、コード経由で全行へ戻す。
+
     Parameters:
         df (pd.DataFrame): DataFrame (すでにCleaning/Formatting済みを想定)
         city_map (dict): { "RALIEGH": "RALEIGH", ... } のようなCityName修正用マップ
         state_map (dict): { "VA": "VIRGINIA", ... } のようなStateName修正用マップ
         address_map (dict): { "St.": "Street", ... } のようなAddress修正用マップ
+        word_boundary (bool): True の場合、address_map のキーを単語単位でのみ置換する
+                              (例: "St." が "Fst." の一部にはマッチしない)
+        address_replacer (Callable): make_address_replacer で作った置換関数。
+                                     指定した場合は address_map / word_boundary の代わりに使う
+                                     (ストリーミング処理でバッチをまたいでメモを再利用するため)
+        copy (bool): False の場合は df をコピーせず、渡された df の列を置き換えて返す
 
     Returns:
         pd.DataFrame: 正規化後のDataFrame
     """
-    df = df.copy()
+    if copy:
+        df = df.copy()
+
+    normalizers = column_normalizers(city_map, state_map, address_map, word_boundary, address_replacer)
+    for col, func in normalizers.items():
+        if col in df.columns:
+            df[col] = _map_unique(df[col], func)
+
+    return df
 
+def column_normalizers(
+    city_map: dict = None,
+    state_map: dict = None,
+    address_map: dict = None,
+    word_boundary: bool = False,
+    address_replacer: Optional[Callable[[str], str]] = None
+) -> Dict[str, Callable[[pd.Series], pd.Series]]:
+    """
+    normalize_addresses が各列のユニーク値 (Series) に適用する変換を {列名: 関数} で返す。
+    data_cleaning_formatting.clean_and_format_data(post_transforms=...) に渡すと、
+    Cleaning と Normalization を1パスで行える。
+    """
     if city_map is None:
         city_map = {}
     if state_map is None:
@@ -28,28 +63,145 @@ def normalize_addresses(
     if address_map is None:
         address_map = {}
 
-    # 1. CityName の変換
-    if "City" in df.columns:
-        df["City"] = df["City"].apply(lambda x: city_map[x] if x in city_map else x)
-
-    # 2. StateName の変換
-    if "StateName" in df.columns:
-        df["StateName"] = df["StateName"].apply(lambda x: state_map[x] if x in state_map else x)
-
     # 3. Address1, Address2 の一括変換（辞書内のキーが含まれていれば置換）
     #    ※ ここでは単純に "St." → "Street" などの部分置換を想定
-    if "Address1" in df.columns:
-        df["Address1"] = df["Address1"].apply(lambda x: _replace_address_text(x, address_map))
-    if "Address2" in df.columns:
-        df["Address2"] = df["Address2"].apply(lambda x: _replace_address_text(x, address_map))
+    #    辞書全体を1つの正規表現にコンパイルし、1パスで置換する
+    if address_replacer is not None:
+        replace_values = lambda values: values.map(address_replacer)
+    else:
+        replace_values = lambda values: _replace_address_series(values, address_map, word_boundary)
 
-    return df
+    return {
+        # 1. CityName の変換
+        "City": lambda values: _lookup(values, city_map),
+        # 2. StateName の変換
+        "StateName": lambda values: _lookup(values, state_map),
+        "Address1": replace_values,
+        "Address2": replace_values
+    }
+
+def make_address_replacer(
+    address_map: dict,
+    word_boundary: bool = False,
+    cache_size: Optional[int] = 100_000
+) -> Callable[[str], str]:
+    """
+    Address 用の置換関数 (str -> str) を返す。結果は最大 cache_size 件の LRU メモに保持される。
+    ストリーミング処理では同じ関数を normalize_addresses(address_replacer=...) に渡し続けることで、
+    前のバッチで変換済みの住所は再計算しない。メモの状況は .cache_info() で確認できる。
+    """
+    address_map = dict(address_map)
+
+    @lru_cache(maxsize=cache_size)
+    def replace(text: str) -> str:
+        return _replace_address_text(text, address_map, word_boundary)
+
+    return replace
+
+def _map_unique(series: pd.Series, func: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    series を factorize し、ユニーク値 (Series) にだけ func を適用して全行へブロードキャストする。
+    category 型はカテゴリに対して変換し、category 型のまま返す。欠損値はそのまま残す。
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if len(series.cat.categories) == 0:
+            return series
+        categories = pd.Series(series.cat.categories, dtype=object)
+        # 変換後に同じ値になったカテゴリはまとめ直す
+        new_codes, new_categories = pd.factorize(func(categories))
+        codes = series.cat.codes.to_numpy()
+        values = pd.Categorical.from_codes(
+            np.where(codes >= 0, new_codes[codes], -1), categories=new_categories
+        )
+        return pd.Series(values, index=series.index, name=series.name)
+
+    codes, uniques = pd.factorize(series)
+    if len(uniques) == 0:
+        return series
+    transformed = func(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    values = np.where(codes >= 0, transformed[codes], series.to_numpy(dtype=object))
+    return pd.Series(values, index=series.index, name=series.name)
+
+def _lookup(values: pd.Series, mapping: dict) -> pd.Series:
+    """
+    mapping にある値だけ置き換え、それ以外はそのまま返す。
+    """
+    if not mapping:
+        return values
+    return values.map(lambda x: mapping[x] if x in mapping else x)
+
+def compile_address_map(address_map: dict, word_boundary: bool = False) -> Optional[re.Pattern]:
+    """
+    address_map のキーをすべて含む1つの正規表現にコンパイルする。
+    重なるキー ("St" と "St.") は最長一致が優先される。
+    同じ辞書に対するコンパイル結果はキャッシュされる。
+
+    Parameters:
+        address_map (dict): { "St.": "Street", ... }
+        word_boundary (bool): True の場合、キーの前後が英数字に接していない箇所のみマッチ
+
+    Returns:
+        re.Pattern: コンパイル済みパターン (辞書が空なら None)
+    """
+    return _compile_address_keys(tuple(address_map), word_boundary)
+
+@lru_cache(maxsize=64)
+def _compile_address_keys(keys: tuple, word_boundary: bool) -> Optional[re.Pattern]:
+    # キーをトライ木にまとめてから正規表現化する。
+    # 単純な "A|B|C..." だと位置ごとに全キーを試すため、数千キーの辞書では遅い。
+    trie = {}
+    for key in keys:
+        if not key:
+            continue
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    if not trie:
+        return None
+    return re.compile(_trie_to_regex(trie, word_boundary, last_char="", top=True))
+
+def _trie_to_regex(node: dict, word_boundary: bool, last_char: str, top: bool = False) -> str:
+    """
+    トライ木のノードを正規表現に変換する。
+    - 同じノードの子は先頭文字がすべて異なるので、選択肢は高々1つしか進めない
+    - キーの終端でも子 (より長いキー) を先に試すため、最長一致になる
+    - word_boundary=True の場合、英数字で始まる/終わるキーの外側に英数字が続かないことを条件にする
+    """
+    alternatives = []
+    for ch in sorted(k for k in node if k):
+        prefix = r"(?<!\w)" if top and word_boundary and _is_word_char(ch) else ""
+        alternatives.append(prefix + re.escape(ch) + _trie_to_regex(node[ch], word_boundary, ch))
+
+    if "" in node:
+        # ここでキーが終わる場合
+        alternatives.append(r"(?!\w)" if word_boundary and _is_word_char(last_char) else "")
+
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")"
+
+def _is_word_char(ch: str) -> bool:
+    return re.match(r"\w", ch) is not None
+
+def _replace_address_series(
+    series: pd.Series, addr_map: dict, word_boundary: bool = False
+) -> pd.Series:
+    """
+    _replace_address_text の Series 版。Series.str.replace で全行を1パス置換する。
+    """
+    pattern = compile_address_map(addr_map, word_boundary)
+    if pattern is None:
+        return series
+    return series.str.replace(pattern, lambda m: addr_map[m.group(0)], regex=True)
 
-def _replace_address_text(text: str, addr_map: dict) -> str:
+def _replace_address_text(text: str, addr_map: dict, word_boundary: bool = False) -> str:
     """
-    部分文字列の置換を連続的に適用するヘルパー関数
+    部分文字列の置換を1パスで適用するヘルパー関数
     例: "1234 Main St." -> "1234 Main Street"
     """
-    for k, v in addr_map.items():
-        text = text.replace(k, v)
-    return text
+    pattern = compile_address_map(addr_map, word_boundary)
+    if pattern is None:
+        return text
+    return pattern.sub(lambda m: addr_map[m.group(0)], text)
@@ -0,0 +1,98 @@
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_cleaning_formatting import clean_and_format_data
+
+def _legacy_clean_and_format_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    ベクトル化前の clean_and_format_data (比較用にそのまま残したもの)。
+    """
+    df = df.copy()
+    str_columns = [
+        "CustomerDisplayName", "locationname", "DistributorName",
+        "AccountNo", "Address1", "Address2", "City", "StateName",
+        "PostalCode", "CountryName"
+    ]
+    for col in str_columns:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+    if "City" in df.columns:
+        df["City"] = df["City"].str.upper()
+    if "StateName" in df.columns:
+        df["StateName"] = df["StateName"].str.upper()
+    if "CountryName" in df.columns:
+        df["CountryName"] = df["CountryName"].replace("", None)
+        df["CountryName"] = df["CountryName"].fillna("United States of America")
+    if "PostalCode" in df.columns:
+        df["PostalCode"] = df["PostalCode"].apply(_legacy_normalize_postal_code)
+    return df
+
+def _legacy_normalize_postal_code(postal_code: str) -> str:
+    postal_code = postal_code.strip()
+    if re.match(r'^\d{5}$', postal_code):
+        return postal_code
+    if re.match(r'^\d{5}-\d{4}$', postal_code):
+        return postal_code
+    return postal_code
+
+def make_sample_data(num_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    ベンチマーク用のダミーデータを作る。
+    """
+    rng = np.random.default_rng(seed)
+    cities = np.array([f" city{i} " for i in range(2000)])
+    states = np.array(["nc", "va ", " tx", "ca"])
+    postal = np.array(["27601", " 27622-0013 ", "2760", "ABC-1234"])
+    countries = np.array(["", "United States of America", "Canada"])
+    house = rng.integers(1, 9999, num_rows).astype(str)
+    return pd.DataFrame({
+        "CustomerDisplayName": np.char.add("Customer", rng.integers(0, 50000, num_rows).astype(str)),
+        "locationname": " Quarry ",
+        "DistributorName": "Distributor1",
+        "AccountNo": rng.integers(0, 99999, num_rows),
+        "Address1": np.char.add(house, " Main St. "),
+        "Address2": "",
+        "City": cities[rng.integers(0, len(cities), num_rows)],
+        "StateName": states[rng.integers(0, len(states), num_rows)],
+        "PostalCode": postal[rng.integers(0, len(postal), num_rows)],
+        "CountryName": countries[rng.integers(0, len(countries), num_rows)]
+    })
+
+def _rows_per_second(func, df: pd.DataFrame, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - start)
+    return len(df) / best
+
+def run_benchmark(num_rows: int = 1_000_000):
+    """
+    旧実装と現在の clean_and_format_data の処理速度 (rows/sec) を比較して表示する。
+    """
+    df = make_sample_data(num_rows)
+
+    legacy = _legacy_clean_and_format_data(df)
+    current = clean_and_format_data(df)
+    same = all(
+        legacy[col].astype(str).tolist() == current[col].astype(str).tolist()
+        for col in legacy.columns
+    )
+
+    legacy_rps = _rows_per_second(_legacy_clean_and_format_data, df)
+    current_rps = _rows_per_second(clean_and_format_data, df)
+
+    print(f"rows: {num_rows}")
+    print(f"legacy : {legacy_rps:,.0f} rows/sec")
+    print(f"current: {current_rps:,.0f} rows/sec ({current_rps / legacy_rps:.1f}x)")
+    print(f"outputs identical: {same}")
+    print(f"memory (deep) legacy={legacy.memory_usage(deep=True).sum() / 1e6:.1f} MB "
+          f"current={current.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    # 実行例: python bench_cleaning.py 1000000
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    run_benchmark(rows)
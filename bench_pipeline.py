@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from functools import partial
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_ingestion import load_customer_data
+from data_cleaning_formatting import clean_and_format_data
+from address_normalization import normalize_addresses
+from duplicate_collapse import collapse_exact_duplicates, expand_exact_duplicates
+from preliminary_grouping import iter_chunk_blocks, materialize_block
+from llm_matching import LLMMatcher, perform_llm_matching
+from llm_dispatch import (
+    dispatch_chunks, estimate_row_tokens, PROMPT_OVERHEAD_TOKENS, BLOCK_HEADER_TOKENS
+)
+from local_similarity import DEFAULT_LOW_THRESHOLD, DEFAULT_HIGH_THRESHOLD
+from group_id_unifier import GroupIdAllocator
+from chunk_reconciliation import reconcile_split_blocks
+from review_consolidation import review_and_consolidate
+from memory_tracker import StageMemoryTracker
+from synthetic_data import make_synthetic_addresses, ENTITY_ID_COL
+from fake_llm import FakeLLMClient
+from run_end_to_end import CITY_MAP, STATE_MAP, ADDRESS_MAP, build_match_func, match_chunk
+
+DEFAULT_OUTPUT = "bench_results.json"
+
+def run_pipeline_benchmark(
+    num_rows: int,
+    duplicate_rate: float = 0.3,
+    noise_rate: float = 0.1,
+    city_skew: float = 1.1,
+    seed: int = 0,
+    latency: float = 0.0,
+    latency_per_1k_tokens: float = 0.0,
+    error_rate: float = 0.0,
+    malformed_rate: float = 0.0,
+    max_concurrency: int = 8,
+    use_rules: bool = True,
+    similarity_thresholds: Optional[Tuple[float, float]] = (DEFAULT_LOW_THRESHOLD, DEFAULT_HIGH_THRESHOLD),
+    chunk_token_budget: Optional[int] = 3000,
+    max_chunk_size: int = 100,
+    work_dir: Optional[str] = None
+) -> dict:
+    """
+    合成データ (synthetic_data) と LLM の代わり (fake_llm.FakeLLMClient) で run_end_to_end と同じ処理を流し、
+    ステージごとの処理時間・rows/sec・メモリと、LLM の呼び出し件数・トークン数、グループの精度を dict で返す。
+
+    ステージ: ingest (CSV 読み込み) → clean → normalize → collapse → group → match → unify → reconcile → review
+    (出力ファイルの書き出しは含めない)
+    """
+    params = {
+        "num_rows": num_rows, "duplicate_rate": duplicate_rate, "noise_rate": noise_rate, "city_skew": city_skew,
+        "seed": seed, "latency": latency, "latency_per_1k_tokens": latency_per_1k_tokens, "error_rate": error_rate,
+        "malformed_rate": malformed_rate, "max_concurrency": max_concurrency, "use_rules": use_rules,
+        "similarity_thresholds": list(similarity_thresholds) if similarity_thresholds else None,
+        "chunk_token_budget": chunk_token_budget, "max_chunk_size": max_chunk_size
+    }
+
+    # 入力 CSV を作る (計測対象外)
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "synthetic.csv")
+        make_synthetic_addresses(
+            num_rows, duplicate_rate, noise_rate, city_skew, seed=seed, include_entity_id=True
+        ).to_csv(csv_path, index=False)
+
+        tracker = StageMemoryTracker()
+        started = time.perf_counter()
+        with tracker.stage("ingest"):
+            df = load_customer_data(csv_path)
+
+    with tracker.stage("clean"):
+        df = clean_and_format_data(df, copy=False)
+
+    with tracker.stage("normalize"):
+        df = normalize_addresses(df, CITY_MAP, STATE_MAP, ADDRESS_MAP, copy=False)
+
+    with tracker.stage("collapse"):
+        df_reps, df_members = collapse_exact_duplicates(df, copy=False)
+    del df
+
+    with tracker.stage("group"):
+        token_budget = None
+        if chunk_token_budget is not None:
+            token_budget = max(1, chunk_token_budget - PROMPT_OVERHEAD_TOKENS - BLOCK_HEADER_TOKENS)
+        blocks = list(iter_chunk_blocks(
+            df_reps, max_chunk_size=max_chunk_size, token_budget=token_budget, token_estimator=estimate_row_tokens
+        ))
+
+    client = FakeLLMClient(latency, latency_per_1k_tokens, error_rate, malformed_rate, seed=seed)
+    matcher = LLMMatcher(client=client, max_retries=5)
+    match_func = build_match_func(
+        partial(perform_llm_matching, matcher=matcher),
+        similarity_thresholds=similarity_thresholds,
+        use_rules=use_rules
+    )
+    with tracker.stage("match"):
+        matched_chunks = list(dispatch_chunks(
+            (materialize_block(df_reps, block) for block in blocks),
+            partial(match_chunk, match_func=match_func),
+            max_concurrency=max_concurrency
+        ))
+
+    with tracker.stage("unify"):
+        allocator = GroupIdAllocator()
+        for chunk_no, sub_df in enumerate(matched_chunks):
+            allocator.add(chunk_no, sub_df["LLMGroupID"])
+        df_matched_reps = pd.concat(matched_chunks, axis=0)
+        df_matched_reps["LLMGroupID"] = allocator.allocate()
+        chunk_ids = pd.Series(
+            np.repeat(np.arange(len(matched_chunks)), [len(sub_df) for sub_df in matched_chunks]),
+            index=df_matched_reps.index
+        )
+    del matched_chunks
+
+    with tracker.stage("reconcile"):
+        df_matched_reps, num_merges = reconcile_split_blocks(
+            df_matched_reps,
+            chunk_ids,
+            partial(match_chunk, match_func=match_func),
+            max_chunk_size=max_chunk_size,
+            token_budget=token_budget,
+            token_estimator=estimate_row_tokens,
+            max_concurrency=max_concurrency
+        )
+
+    with tracker.stage("review"):
+        df_final = expand_exact_duplicates(df_matched_reps, df_members, copy=False)
+        df_final = review_and_consolidate(df_final, suspicious_threshold=50, mark_singleton=False, copy=False)
+    total_seconds = time.perf_counter() - started
+
+    stages = tracker.report().drop(columns=["allocated_peak_mb"])
+    stages["rows_per_second"] = num_rows / stages["seconds"].clip(lower=1e-9)
+
+    return {
+        "params": params,
+        "environment": _environment(),
+        "rows": num_rows,
+        "distinct_addresses": len(df_reps),
+        "chunks": len(blocks),
+        "total_seconds": total_seconds,
+        "rows_per_second": num_rows / total_seconds,
+        "peak_rss_mb": stages["peak_rss_mb"].max(),
+        "stages": stages.to_dict(orient="records"),
+        "llm": {**dict(client.usage), **dict(matcher.stats)},
+        "reconcile_merges": num_merges,
+        "quality": _group_quality(df_final["FinalGroupID"], df_final[ENTITY_ID_COL])
+    }
+
+def _group_quality(group_ids: pd.Series, entity_ids: pd.Series) -> dict:
+    """
+    正解の実体番号と比べた、グループ分けの簡易的な精度。
+    - pure_group_rate: 1つの実体だけを含むグループの割合 (過剰な統合が無いほど 1)
+    - unsplit_entity_rate: 1つのグループにまとまった実体の割合 (取りこぼしが無いほど 1)
+    """
+    entities_per_group = entity_ids.groupby(group_ids.to_numpy()).nunique()
+    groups_per_entity = group_ids.groupby(entity_ids.to_numpy()).nunique()
+    return {
+        "groups": int(len(entities_per_group)),
+        "entities": int(len(groups_per_entity)),
+        "pure_group_rate": float((entities_per_group == 1).mean()),
+        "unsplit_entity_rate": float((groups_per_entity == 1).mean())
+    }
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+def run_benchmark_suite(sizes: List[int], output_path: Optional[str] = DEFAULT_OUTPUT, **kwargs) -> List[dict]:
+    """
+    sizes の行数ごとに run_pipeline_benchmark を実行し、結果を JSON (リスト) で output_path に書く。
+    """
+    results = []
+    for num_rows in sizes:
+        result = run_pipeline_benchmark(num_rows, **kwargs)
+        results.append(result)
+        print(f"rows: {num_rows:,}  total: {result['total_seconds']:.2f}s "
+              f"({result['rows_per_second']:,.0f} rows/sec)  peak RSS: {result['peak_rss_mb']:,.0f} MB  "
+              f"LLM requests: {result['llm'].get('requests', 0):,}")
+        for stage in result["stages"]:
+            print(f"  {stage['stage']:<10} {stage['seconds']:8.2f}s  {stage['rows_per_second']:>14,.0f} rows/sec")
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, default=_json_default)
+        print(f"Results saved to {output_path}")
+    return results
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Synthetic end-to-end benchmark with a simulated LLM.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000], help="row counts to run (e.g. 10000 1000000)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--duplicate-rate", type=float, default=0.3)
+    parser.add_argument("--noise-rate", type=float, default=0.1)
+    parser.add_argument("--city-skew", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per LLM request")
+    parser.add_argument("--latency-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM requests failing with 429/500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of LLM answers cut off mid-JSON")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    run_benchmark_suite(
+        args.rows,
+        output_path=args.output,
+        duplicate_rate=args.duplicate_rate,
+        noise_rate=args.noise_rate,
+        city_skew=args.city_skew,
+        seed=args.seed,
+        latency=args.latency,
+        latency_per_1k_tokens=args.latency_per_1k_tokens,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        max_concurrency=args.max_concurrency
+    )
+
+if __name__ == "__main__":
+    # 実行例: python bench_pipeline.py --rows 10000 100000 1000000 --latency 0.5 --error-rate 0.01
+    main(sys.argv[1:])
@@ -0,0 +1,116 @@
+import glob
+import json
+import os
+from typing import Dict
+
+import pandas as pd
+
+# チェックポイントの既定保存先
+DEFAULT_CHECKPOINT_DIR = ".checkpoint"
+
+MANIFEST_FILE = "manifest.jsonl"
+CHUNK_FILE_PATTERN = "chunk_*.parquet"
+
+def checkpoint_available() -> bool:
+    """
+    チャンクの保存に使う pyarrow (Parquet) が使えるかどうか。
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class ChunkJournal:
+    """
+    run_end_to_end のチャンクごとのマッチング結果を記録する追記専用のジャーナル。
+
+    - 各チャンクの結果は chunk_{番号}.parquet に書き (一時ファイル → os.replace)、
+      書き終えてから manifest.jsonl に1行追記して fsync する
+    - manifest の1行目はラン全体のキー (入力ファイル + パラメータ)。再開時にキーが違えばエラー
+    - 記録するのはチャンク内のローカル LLMGroupID のまま。全体のグループ番号は
+      group_id_unifier.allocate_group_codes が (チャンク番号, ローカルID) から決めるので、カウンタは持たない
+    - 書き込み途中で落ちた場合、manifest に載っていない Parquet は無視される。再開時には manifest を
+      最後の完全な行まで切り詰めてから追記するので、壊れた行の後ろに次の記録がつながることはない
+      (読めない行があっても読み飛ばし、それ以降の記録は使う)
+    - 新規実行で消すのはジャーナル自身のファイル (manifest.jsonl / chunk_*.parquet / その .tmp) だけで、
+      directory にある他のファイルには触れない
+    """
+
+    def __init__(self, directory: str = DEFAULT_CHECKPOINT_DIR, run_key: str = "", resume: bool = False):
+        self.directory = directory
+        self.run_key = run_key
+        self.completed: Dict[int, dict] = {}
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+
+        if resume and os.path.exists(manifest_path):
+            self._load_manifest(manifest_path)
+        else:
+            # 新規実行: 前回のジャーナルは捨てる
+            os.makedirs(directory, exist_ok=True)
+            self._remove_journal_files()
+            self._append({"run_key": run_key})
+
+    def is_done(self, chunk_no: int) -> bool:
+        return chunk_no in self.completed
+
+    def load(self, chunk_no: int) -> pd.DataFrame:
+        """
+        記録済みチャンクの結果を返す。
+        """
+        entry = self.completed[chunk_no]
+        return pd.read_parquet(os.path.join(self.directory, entry["file"]))
+
+    def record(self, chunk_no: int, df: pd.DataFrame) -> None:
+        """
+        チャンクの結果を Parquet に書き、manifest に追記する。
+        """
+        file_name = f"chunk_{chunk_no:06d}.parquet"
+        path = os.path.join(self.directory, file_name)
+        tmp_path = path + ".tmp"
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+        entry = {"chunk": chunk_no, "file": file_name, "rows": len(df)}
+        self._append(entry)
+        self.completed[chunk_no] = entry
+
+    def _remove_journal_files(self) -> None:
+        patterns = [MANIFEST_FILE, CHUNK_FILE_PATTERN, CHUNK_FILE_PATTERN + ".tmp"]
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(glob.escape(self.directory), pattern)):
+                os.remove(path)
+
+    def _append(self, record: dict) -> None:
+        with open(os.path.join(self.directory, MANIFEST_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load_manifest(self, manifest_path: str) -> None:
+        with open(manifest_path, "rb") as f:
+            data = f.read()
+
+        # 追記途中で落ちた最後の行 (改行で終わっていない部分) を切り詰める
+        complete_size = data.rfind(b"\n") + 1
+        if complete_size < len(data):
+            with open(manifest_path, "r+b") as f:
+                f.truncate(complete_size)
+                f.flush()
+                os.fsync(f.fileno())
+
+        records = []
+        for line in data[:complete_size].decode("utf-8").splitlines():
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # 壊れた行は読み飛ばす
+                continue
+
+        if not records or records[0].get("run_key") != self.run_key:
+            raise ValueError(
+                f"Checkpoint in {self.directory} was written for a different input or settings; "
+                "run without resume to start over."
+            )
+        for entry in records[1:]:
+            self.completed[entry["chunk"]] = entry
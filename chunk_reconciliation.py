@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional, Tuple
+
+from preliminary_grouping import iter_chunk_blocks, materialize_block
+from llm_dispatch import dispatch_chunks
+from union_find import UnionFind
+
+def reconcile_split_blocks(
+    df: pd.DataFrame,
+    chunk_ids: pd.Series,
+    match_func: Callable[[pd.DataFrame], pd.DataFrame],
+    id_col: str = "LLMGroupID",
+    group_cols: List[str] = None,
+    max_chunk_size: int = 100,
+    token_budget: Optional[int] = None,
+    token_estimator: Optional[Callable[[pd.DataFrame], np.ndarray]] = None,
+    max_concurrency: int = 1
+) -> Tuple[pd.DataFrame, int]:
+    """
+    1つのブロック (Country / State / City) が複数チャンクに分割された場合に、
+    別々のチャンクに入った同一住所のグループを統合する2回目のパス。
+
+    - 各グループ (id_col) から代表1行を選び、複数チャンクにまたがるブロックの代表行だけを集める
+    - 代表行はブロック内で候補キー (ZIP5 → 番地 → 通り名) の順に並べ替えてからチャンクにまとめるので、
+      同じ住所の候補は元の行順で離れていても (max_chunk_size 行以上) 同じチャンクに入る
+    - 代表行どうしを同じブロックキーでチャンクにまとめ、match_func
+      (通常はルール照合 → 局所類似度 → LLM をつないだもの) で照合する。
+      1つの元チャンクの代表行しか含まないチャンクは送らない
+    - 同じグループと判定され、かつ2つ以上の元チャンクにまたがる代表行の組を Union-Find でまとめる。
+      統合後のIDは、その集合で最初に出てきたグループのID
+    - 送るのはグループ数ぶんの代表行だけなので、コストは行数ではなくグループ数に比例する
+
+    Parameters:
+        df (pd.DataFrame): 全チャンクを結合したマッチング結果 (id_col は全体で一意なID)
+        chunk_ids (pd.Series): 各行がどのチャンクで照合されたか (index は df と同じ)
+
+    Returns:
+        Tuple[pd.DataFrame, int]: (id_col を更新したDataFrame, チャンクをまたいで統合した回数)
+    """
+    if group_cols is None:
+        group_cols = ["CountryName", "StateName", "City"]
+    if len(df) == 0:
+        return df, 0
+
+    group_codes, group_ids = pd.factorize(df[id_col], sort=False)
+    is_rep = ~pd.Series(group_codes).duplicated().to_numpy()
+    reps = df.loc[is_rep]
+    rep_codes = group_codes[is_rep]
+    rep_chunks = chunk_ids.loc[reps.index].to_numpy()
+
+    # 複数チャンクに代表行があるブロックだけを対象にする
+    block_codes = reps.groupby(group_cols, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+    chunks_per_block = pd.Series(rep_chunks).groupby(block_codes).transform("nunique").to_numpy()
+    targets = np.flatnonzero(chunks_per_block >= 2)
+    if len(targets) == 0:
+        return df, 0
+
+    # 代表行だけの DataFrame (index は代表行の位置番号)。元の行順のままだと元のチャンクと同じ境界で
+    # 分かれてしまうので、候補キーで並べ替えて同じ住所の候補を隣り合わせにする
+    targets = targets[_candidate_order(reps.iloc[targets])]
+    rep_frame = reps.iloc[targets].reset_index(drop=True)
+    rep_frame_codes = rep_codes[targets]
+    rep_frame_chunks = rep_chunks[targets]
+
+    blocks = [
+        block for block in iter_chunk_blocks(rep_frame, group_cols, max_chunk_size, token_budget, token_estimator)
+        if len(np.unique(rep_frame_chunks[block.positions])) >= 2
+    ]
+    matched = dispatch_chunks(
+        (materialize_block(rep_frame, block) for block in blocks),
+        match_func,
+        max_concurrency=max_concurrency
+    )
+
+    uf = UnionFind(len(group_ids))
+    merges = 0
+    for sub_df in matched:
+        positions = sub_df.index.to_numpy()
+        local_ids = sub_df["LLMGroupID"].to_numpy()
+        for local_id in pd.unique(local_ids):
+            members = positions[local_ids == local_id]
+            if len(np.unique(rep_frame_chunks[members])) < 2:
+                continue
+            codes = rep_frame_codes[members]
+            merges += uf.union_many(codes[:1].repeat(len(codes) - 1), codes[1:])
+
+    if merges == 0:
+        return df, 0
+
+    df = df.copy()
+    df[id_col] = np.asarray(group_ids, dtype=object)[uf.roots()[group_codes]]
+    return df, merges
+
+def _candidate_order(df: pd.DataFrame) -> np.ndarray:
+    """
+    同一住所の候補が隣り合うように、(ZIP5, 番地, 番地以降の住所) で安定ソートした行位置を返す。
+    番地と ZIP が同じなら、通り名の略記や綴りの揺れがあっても並びが離れない。
+    """
+    def column(name: str) -> pd.Series:
+        if name not in df.columns:
+            return pd.Series([""] * len(df), index=df.index)
+        return df[name].astype(object).where(df[name].notna(), "").astype(str).str.strip().str.upper()
+
+    address1 = column("Address1")
+    house = address1.str.extract(r"^(\d+)", expand=False).fillna("")
+    keys = pd.DataFrame({
+        "zip5": column("PostalCode").str[:5].to_numpy(),
+        "house": house.str.zfill(10).to_numpy(),
+        "street": address1.str.replace(r"^\d+\s*", "", regex=True).to_numpy()
+    })
+    return np.asarray(keys.sort_values(["zip5", "house", "street"], kind="stable").index)
@@ -1,42 +1,121 @@
 import pandas as pd
 import re
+from typing import Callable, Dict, Optional
 
-def clean_and_format_data(df: pd.DataFrame) -> pd.DataFrame:
+# 文字列として扱うカラム
+STR_COLUMNS = [
+    "CustomerDisplayName", "locationname", "DistributorName",
+    "AccountNo", "Address1", "Address2", "City", "StateName",
+    "PostalCode", "CountryName"
+]
+
+# 値の種類が少なく groupby のキーになるカラムは category 型で持つ
+CATEGORY_COLUMNS = ["City", "StateName", "CountryName"]
+
+DEFAULT_COUNTRY = "United States of America"
+
+# 5桁 または 5桁-4桁
+_POSTAL_CODE_RE = re.compile(r"^(\d{5})(?:-(\d{4}))?$")
+
+def clean_and_format_data(
+    df: pd.DataFrame,
+    copy: bool = True,
+    post_transforms: Optional[Dict[str, Callable[[pd.Series], pd.Series]]] = None
+) -> pd.DataFrame:
     """
     DataFrame内の住所データをクリーニングし、フォーマットを統一する。
     - 余分な空白の除去
     - City/StateName の大文字化
     - CountryName が空の場合は "United States of America" を補完
     - PostalCode の簡易フォーマット修正 (5桁または 5桁-4桁を想定)
+
+    各カラムを factorize し、ユニーク値に対してだけ .str 系のベクトル演算を行って
+    元の行へ戻す (同じ値が大量に繰り返される住所データで効果が大きい)。
+    City, StateName, CountryName は category 型で返す (メモリ削減・groupby 高速化のため)。
+
+    - copy=False の場合は df をコピーせず、渡された df の列を置き換えて返す (呼び出し元が df を使い回さない場合用)
+    - post_transforms={列名: 関数} を渡すと、クリーニング後のユニーク値にその関数も続けて適用する。
+      address_normalization.column_normalizers と組み合わせると、Cleaning と Normalization を
+      列ごとに1回の factorize で済ませられる (中間の DataFrame を作らない)
     """
-    df = df.copy()
+    if copy:
+        df = df.copy()
+    post_transforms = post_transforms or {}
 
+    for col in STR_COLUMNS:
+        if col not in df.columns:
+            continue
+        transform = _COLUMN_TRANSFORMS.get(col, _strip)
+        if col in post_transforms:
+            transform = _compose(transform, post_transforms[col])
+        df[col] = _transform_unique(
+            _as_str(df[col]),
+            transform,
+            as_category=col in CATEGORY_COLUMNS
+        )
+
+    return df
+
+def _compose(first, second):
+    return lambda values: second(first(values))
+
+def _strip(values: pd.Series) -> pd.Series:
     # 1. 文字列カラムの両端の空白除去
-    str_columns = [
-        "CustomerDisplayName", "locationname", "DistributorName",
-        "AccountNo", "Address1", "Address2", "City", "StateName",
-        "PostalCode", "CountryName"
-    ]
-    for col in str_columns:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
+    return values.str.strip()
 
+def _strip_upper(values: pd.Series) -> pd.Series:
     # 2. City, StateName を大文字化
-    if "City" in df.columns:
-        df["City"] = df["City"].str.upper()
-    if "StateName" in df.columns:
-        df["StateName"] = df["StateName"].str.upper()
+    return values.str.strip().str.upper()
 
+def _strip_fill_country(values: pd.Series) -> pd.Series:
     # 3. CountryName が空の場合は補完
-    if "CountryName" in df.columns:
-        df["CountryName"] = df["CountryName"].replace("", None)
-        df["CountryName"] = df["CountryName"].fillna("United States of America")
+    values = values.str.strip()
+    return values.mask(values == "", DEFAULT_COUNTRY)
 
-    # 4. PostalCode の簡易フォーマット修正
-    if "PostalCode" in df.columns:
-        df["PostalCode"] = df["PostalCode"].apply(_normalize_postal_code)
+def _transform_unique(series: pd.Series, func, as_category: bool = False) -> pd.Series:
+    """
+    series のユニーク値だけに func を適用し、結果を全行へブロードキャストする。
+    as_category=True の場合は category 型で返す。
+    """
+    codes, uniques = pd.factorize(series)
+    transformed = func(pd.Series(uniques, dtype=object))
 
-    return df
+    if as_category:
+        # 変換後に同じ値になったもの (" raleigh" と "RALEIGH" など) をまとめ直す
+        new_codes, categories = pd.factorize(transformed)
+        values = pd.Categorical.from_codes(new_codes[codes], categories=categories)
+    else:
+        values = transformed.to_numpy(dtype=object)[codes]
+
+    return pd.Series(values, index=series.index, name=series.name)
+
+def _as_str(series: pd.Series) -> pd.Series:
+    """
+    Series を文字列型にそろえる。すでに欠損なしの文字列のみであれば変換を省略する。
+    (それ以外は従来どおり astype(str) と同じ結果になる)
+    """
+    if series.dtype == object and pd.api.types.infer_dtype(series, skipna=False) == "string":
+        return series
+    return series.astype(str)
+
+def _normalize_postal_code_series(postal_codes: pd.Series) -> pd.Series:
+    """
+    _normalize_postal_code のベクトル版。
+    コンパイル済み正規表現 1 回の str.extract で 5桁 / 5桁-4桁 を判定し、
+    一致したものは整形した値、一致しないものは strip した値をそのまま返す。
+    """
+    postal_codes = postal_codes.str.strip()
+    parts = postal_codes.str.extract(_POSTAL_CODE_RE)
+    formatted = parts[0].str.cat(parts[1], sep="-", na_rep="").str.rstrip("-")
+    return formatted.where(parts[0].notna(), postal_codes)
+
+_COLUMN_TRANSFORMS = {
+    "City": _strip_upper,
+    "StateName": _strip_upper,
+    "CountryName": _strip_fill_country,
+    # 4. PostalCode の簡易フォーマット修正
+    "PostalCode": _normalize_postal_code_series
+}
 
 def _normalize_postal_code(postal_code: str) -> str:
     """
@@ -45,12 +124,10 @@ def _normalize_postal_code(postal_code: str) -> str:
     - 上記でない場合は、そのまま返す
     """
     postal_code = postal_code.strip()
-    import re
-    # 5桁（数字のみ）
-    if re.match(r'^\d{5}$', postal_code):
-        return postal_code
-    # 5桁-4桁
-    if re.match(r'^\d{5}-\d{4}$', postal_code):
-        return postal_code
+    match = _POSTAL_CODE_RE.match(postal_code)
+    if match and match.group(2):
+        return f"{match.group(1)}-{match.group(2)}"
+    if match:
+        return match.group(1)
 
     return postal_code
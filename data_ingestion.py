@@ -1,5 +1,20 @@
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Iterator, List, Optional
+
+# 想定するカラム一覧（必要に応じて調整）
+REQUIRED_COLUMNS: List[str] = [
+    "CustomerDisplayName",
+    "locationname",
+    "DistributorName",
+    "AccountNo",
+    "Address1",
+    "Address2",
+    "City",
+    "StateName",
+    "PostalCode",
+    "CountryName"
+]
 
 def load_customer_data(file_path: str) -> pd.DataFrame:
     """
@@ -19,24 +34,127 @@ def load_customer_data(file_path: str) -> pd.DataFrame:
         df = pd.read_csv(file_path)
     except FileNotFoundError as e:
         raise FileNotFoundError(f"ファイルが見つかりません: {file_path}") from e
-    
-    # 想定するカラム一覧（必要に応じて調整）
-    required_columns = [
-        "CustomerDisplayName",
-        "locationname",
-        "DistributorName",
-        "AccountNo",
-        "Address1",
-        "Address2",
-        "City",
-        "StateName",
-        "PostalCode",
-        "CountryName"
-    ]
-    
+
     # 必須カラムがそろっているか確認
-    missing_columns = [col for col in required_columns if col not in df.columns]
+    _check_required_columns(df.columns)
+
+    return df
+
+def iter_customer_data(
+    file_path: str,
+    batch_size: int = 100_000,
+    engine: str = "c",
+    columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    CSVファイルを batch_size 行ずつ読み込み、DataFrame のバッチを順に返すジェネレータ。
+    巨大なCSVでも全体をメモリに載せずに後段の処理へ流せる。
+
+    - ヘッダーだけを先に読み、必須カラムの有無を一度だけ確認する
+    - 読み込むのは必須カラム (columns) のみ、すべて文字列 (str) として読む
+      (郵便番号や AccountNo の先頭 0 が数値変換で落ちない)
+    - engine="pyarrow" の場合は pyarrow.csv のストリーミングリーダーを使う
+
+    Parameters:
+        file_path (str): 読み込むCSVファイルのパス
+        batch_size (int): 1バッチあたりの最大行数
+        engine (str): "c" (pandas 標準) または "pyarrow"
+        columns (List[str]): 読み込むカラム。省略時は REQUIRED_COLUMNS
+
+    Yields:
+        pd.DataFrame: 最大 batch_size 行のDataFrame (index はファイル全体での通し番号)
+
+    Raises:
+        FileNotFoundError: 指定されたパスにファイルが存在しない場合
+        ValueError: 必須カラム不足、または batch_size / engine が不正な場合
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size は1以上を指定してください: {batch_size}")
+    if engine not in ("c", "pyarrow"):
+        raise ValueError(f"未対応の engine です: {engine}")
+    if columns is None:
+        columns = REQUIRED_COLUMNS
+
+    # 1. ヘッダーのみ読み込んでカラムを確認
+    try:
+        header = pd.read_csv(file_path, nrows=0)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"ファイルが見つかりません: {file_path}") from e
+    _check_required_columns(header.columns)
+
+    # 2. バッチ単位で読み込み
+    if engine == "pyarrow":
+        batches = _iter_batches_pyarrow(file_path, batch_size, columns)
+    else:
+        batches = pd.read_csv(
+            file_path,
+            usecols=columns,
+            dtype=str,
+            chunksize=batch_size
+        )
+
+    for batch in batches:
+        # 列順は columns の指定順にそろえる
+        yield batch[columns]
+
+def _iter_batches_pyarrow(
+    file_path: str,
+    batch_size: int,
+    columns: List[str]
+) -> Iterator[pd.DataFrame]:
+    """
+    pyarrow.csv.open_csv でCSVをストリーミングし、batch_size 行ごとのDataFrameを返す。
+    pyarrow のレコードバッチはサイズが一定ではないため、ここで batch_size 行に詰め直す。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError as e:
+        raise ImportError("engine='pyarrow' を使うには pyarrow をインストールしてください。") from e
+
+    reader = pa_csv.open_csv(
+        file_path,
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types={col: pa.string() for col in columns},
+            # 空セルは pandas エンジンと同様に欠損値として扱う
+            strings_can_be_null=True
+        )
+    )
+
+    pending = []
+    pending_rows = 0
+    offset = 0
+    for record_batch in reader:
+        pending.append(record_batch)
+        pending_rows += record_batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            head = table.slice(0, batch_size)
+            rest = table.slice(batch_size)
+            yield _arrow_to_frame(head, offset)
+            offset += batch_size
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+
+    if pending_rows > 0:
+        yield _arrow_to_frame(pa.Table.from_batches(pending), offset)
+
+def _arrow_to_frame(table, offset: int) -> pd.DataFrame:
+    """
+    pyarrow.Table を DataFrame に変換し、index をファイル全体での行番号にそろえる。
+    空セルは to_pandas で None になるので、c エンジンと同じ NaN にそろえる
+    (そろえないと、クリーニング後に "None" と "nan" のように結果が変わる)。
+    """
+    df = table.to_pandas()
+    df = df.where(df.notna(), np.nan)
+    df.index = pd.RangeIndex(offset, offset + len(df))
+    return df
+
+def _check_required_columns(columns) -> None:
+    """
+    必須カラムがそろっているか確認し、不足していれば ValueError を送出する。
+    """
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
     if missing_columns:
         raise ValueError(f"必須カラムが不足しています: {missing_columns}")
-    
-    return df
@@ -0,0 +1,81 @@
+import pandas as pd
+from typing import List, Tuple
+
+# 正規化後にこれらがすべて一致する行は「完全一致の重複」とみなす
+ADDRESS_KEY_COLUMNS = [
+    "Address1", "Address2", "City", "StateName", "PostalCode", "CountryName"
+]
+
+DEDUP_KEY_COL = "DedupKey"
+DUPLICATE_COUNT_COL = "DuplicateCount"
+
+def collapse_exact_duplicates(
+    df: pd.DataFrame,
+    key_cols: List[str] = None,
+    copy: bool = True
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    正規化済みの住所 (key_cols) が完全に一致する行をまとめ、
+    各住所につき代表1行だけを残したDataFrameを作る。
+    LLM には代表行だけを送り、結果は expand_exact_duplicates で全行へ戻す。
+
+    Parameters:
+        df (pd.DataFrame): normalize_addresses 済みのDataFrame
+        key_cols (List[str]): 住所の一致判定に使うカラム (存在するものだけを使う)
+        copy (bool): False の場合は df をコピーせず、df 自体に DedupKey を足して全行のDataFrameとして返す
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]:
+            (代表行のDataFrame, 全行のDataFrame)
+            どちらにも住所タプルのハッシュ "DedupKey" が付き、
+            代表行には同じ住所の行数 "DuplicateCount" が付く
+    """
+    if key_cols is None:
+        key_cols = ADDRESS_KEY_COLUMNS
+    key_cols = [col for col in key_cols if col in df.columns]
+    if not key_cols:
+        raise ValueError("DataFrame does not contain any address key column.")
+
+    df_members = df.copy() if copy else df
+    # 行ごとの住所タプルを 64bit ハッシュに (index は含めない)
+    keys = pd.util.hash_pandas_object(df_members[key_cols], index=False)
+    df_members[DEDUP_KEY_COL] = keys.to_numpy()
+
+    is_first = ~df_members[DEDUP_KEY_COL].duplicated()
+    df_reps = df_members.loc[is_first].copy()
+    counts = df_members[DEDUP_KEY_COL].value_counts()
+    df_reps[DUPLICATE_COUNT_COL] = df_reps[DEDUP_KEY_COL].map(counts).to_numpy()
+
+    return df_reps, df_members
+
+def expand_exact_duplicates(
+    df_matched_reps: pd.DataFrame,
+    df_members: pd.DataFrame,
+    id_cols: List[str] = None,
+    copy: bool = True
+) -> pd.DataFrame:
+    """
+    代表行に付いたグループID (id_cols) を、同じ DedupKey を持つ全行へ展開する。
+
+    Parameters:
+        df_matched_reps (pd.DataFrame): LLM Matching 済みの代表行 (DedupKey を含む)
+        df_members (pd.DataFrame): collapse_exact_duplicates が返した全行のDataFrame
+        id_cols (List[str]): 展開するカラム。省略時は ["LLMGroupID"]
+        copy (bool): False の場合は df_members をコピーせず、列を足して (DedupKey は削除して) 返す
+
+    Returns:
+        pd.DataFrame: df_members の行順のまま id_cols を付与したDataFrame (DedupKey は削除)
+    """
+    if id_cols is None:
+        id_cols = ["LLMGroupID"]
+    if DEDUP_KEY_COL not in df_matched_reps.columns:
+        raise ValueError(f"DataFrame does not contain {DEDUP_KEY_COL} column.")
+
+    rep_ids = df_matched_reps.drop_duplicates(DEDUP_KEY_COL).set_index(DEDUP_KEY_COL)
+
+    df_result = df_members.copy() if copy else df_members
+    for col in id_cols:
+        df_result[col] = df_result[DEDUP_KEY_COL].map(rep_ids[col])
+
+    del df_result[DEDUP_KEY_COL]
+    return df_result
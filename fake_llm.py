@@ -0,0 +1,128 @@
+import csv
+import json
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# 回答するときに同じ語とみなす略記 (LLM が表記ゆれを吸収する代わり)
+_WORD_ALIASES = {
+    "st": "street", "ave": "avenue", "rd": "road", "dr": "drive", "blvd": "boulevard", "ln": "lane"
+}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_VERBOSE_ROW_RE = re.compile(r"^Index:(-?\d+), Address1:(.*?), Address2:(.*?), City:.*?, State:.*?, Zip:(.*?), Country:", re.MULTILINE)
+
+class FakeAPIError(Exception):
+    """
+    API のエラー応答の代わり。status_code は llm_dispatch.is_retryable_error がそのまま見る。
+    """
+
+    def __init__(self, status_code: int, message: str = "simulated API error"):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.response = None
+
+class FakeLLMClient:
+    """
+    OpenAI クライアントの代わりに、ローカルで住所をグループ分けして回答する (ベンチマーク・テスト用)。
+    LLMMatcher(client=FakeLLMClient(...)) として渡す。
+
+    - 同じ住所の判定: 番地・部屋番号・ZIP5 が同じで、通り名の文字の並べ替え (1文字の入れ替え) と
+      略記 (St. / Street など) を同じとみなす
+    - latency + latency_per_1k_tokens * (トークン数 / 1000) 秒だけ待ってから回答する
+    - error_rate の確率で 429 / 500 (FakeAPIError) を返し、malformed_rate の確率で途中で切れた JSON を返す
+    - 呼び出し件数・エラー件数・トークン数を usage (Counter) に集計する。トークン数は文字数 / 4 で概算する
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_per_1k_tokens: float = 0.0,
+        error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.sleep = sleep
+        self.usage: Counter = Counter()
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages: List[dict], **kwargs) -> SimpleNamespace:
+        prompt = messages[-1]["content"]
+        with self._lock:
+            error_draw, malformed_draw = self._rng.random(2)
+            self.usage["requests"] += 1
+
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        self.sleep(self.latency + self.latency_per_1k_tokens * prompt_tokens / 1000)
+
+        if error_draw < self.error_rate:
+            with self._lock:
+                self.usage["errors"] += 1
+            raise FakeAPIError(429 if error_draw < self.error_rate / 2 else 500)
+
+        content = json.dumps({"groups": group_rows(parse_prompt_rows(prompt))})
+        if malformed_draw < self.malformed_rate:
+            content = content[:max(1, len(content) * 2 // 3)]
+            with self._lock:
+                self.usage["malformed"] += 1
+
+        completion_tokens = len(content) // 4
+        with self._lock:
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        )
+
+def parse_prompt_rows(prompt: str) -> List[Dict[str, str]]:
+    """
+    LLMMatcher.build_prompt が作ったプロンプトから行を取り出す ({"index", "Address1", "Address2", "Zip"})。
+    compact 形式 (ヘッダー "i,..." の CSV) と verbose 形式 ("Index:..., Address1:...") の両方を読む。
+    """
+    lines = prompt.splitlines()
+    header_at = next((n for n, line in enumerate(lines) if line.startswith("i,")), None)
+    if header_at is None:
+        return [
+            {"index": index, "Address1": address1, "Address2": address2, "Zip": zip_code}
+            for index, address1, address2, zip_code in _VERBOSE_ROW_RE.findall(prompt)
+        ]
+
+    body = []
+    for line in lines[header_at + 1:]:
+        if not line or not line[0].isdigit():
+            break
+        body.append(line)
+    reader = csv.DictReader([lines[header_at]] + body)
+    return [{**row, "index": row["i"]} for row in reader]
+
+def group_rows(rows: List[Dict[str, str]]) -> List[dict]:
+    """
+    同じ住所とみなす行に同じ group_id ("G1", "G2", ... を出現順) を振る。
+    """
+    group_ids: Dict[tuple, str] = {}
+    items = []
+    for row in rows:
+        key = _address_key(row)
+        group_id = group_ids.setdefault(key, f"G{len(group_ids) + 1}")
+        items.append({"index": int(row["index"]), "group_id": group_id})
+    return items
+
+def _address_key(row: Dict[str, str]) -> tuple:
+    words = _WORD_RE.findall((row.get("Address1") or "").lower())
+    words = [_WORD_ALIASES.get(word, word) for word in words]
+    # 通り名は文字を並べ替えても同じ (1文字の入れ替えを同じとみなす)
+    words = ["".join(sorted(word)) for word in words]
+    zip5 = (row.get("Zip") or "")[:5]
+    return tuple(words), (row.get("Address2") or "").strip().lower(), zip5
@@ -1,3 +1,5 @@
+import threading
+import numpy as np
 import pandas as pd
 from typing import Tuple
 
@@ -33,3 +35,74 @@ def unify_local_group_ids(
     df[global_id_col] = df[local_id_col].map(mapping)
 
     return df, current_count
+
+def allocate_group_codes(chunk_ids, local_ids, start: int = 1) -> np.ndarray:
+    """
+    全チャンク分の (チャンクID, ローカル LLMGroupID) の組を1回で因数分解し、全体で一意な int64 のグループ番号を返す。
+
+    番号は「チャンクID順 → チャンク内で最初に出てきた順」に start から振るので、
+    unify_local_group_ids をチャンク順に適用した場合と同じ番号になる。
+    行の並び (チャンクが終わった順) に依存しないので、並行・順不同に集めた結果でも再現性がある。
+
+    Parameters:
+        chunk_ids: 各行のチャンクID (整数)
+        local_ids: 各行のチャンク内ローカルID (欠損も1つのIDとして扱う)
+        start (int): 最初の番号
+
+    Returns:
+        np.ndarray: 各行のグループ番号 (int64)
+    """
+    chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+    local_codes, local_uniques = pd.factorize(pd.Series(local_ids, dtype=object), use_na_sentinel=False)
+    if len(chunk_ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # チャンクID順 (チャンク内は元の行順) に並べ、(チャンク, ローカルID) の組を出現順に番号付け
+    order = np.argsort(chunk_ids, kind="stable")
+    pair_keys = chunk_ids[order] * len(local_uniques) + local_codes[order]
+    sorted_codes, _ = pd.factorize(pair_keys)
+
+    codes = np.empty(len(chunk_ids), dtype=np.int64)
+    codes[order] = sorted_codes
+    return codes + start
+
+def render_group_ids(codes, prefix: str = "G") -> np.ndarray:
+    """
+    整数のグループ番号を "G123" 形式の文字列にする (出力直前に1回だけ呼ぶ)。
+    """
+    codes = np.asarray(codes)
+    return np.char.add(prefix, codes.astype(np.int64).astype(str)).astype(object)
+
+class GroupIdAllocator:
+    """
+    チャンクの結果を (並行に・順不同で) 受け取り、最後に allocate_group_codes でまとめて番号を振る。
+
+    例:
+        allocator = GroupIdAllocator()
+        allocator.add(chunk_no, sub_df["LLMGroupID"])   # 終わった順でよい
+        codes = allocator.allocate()                    # チャンクID順に並べた全行の番号
+    """
+
+    def __init__(self):
+        self._chunks = {}
+        self._lock = threading.Lock()
+
+    def add(self, chunk_id: int, local_ids) -> None:
+        with self._lock:
+            self._chunks[chunk_id] = np.asarray(local_ids, dtype=object)
+
+    def chunk_ids(self) -> list:
+        """
+        受け取ったチャンクIDを昇順で返す (allocate の行順)。
+        """
+        return sorted(self._chunks)
+
+    def allocate(self, start: int = 1) -> np.ndarray:
+        """
+        チャンクID昇順に全行を並べたときの、各行のグループ番号を返す。
+        """
+        with self._lock:
+            chunk_ids = sorted(self._chunks)
+            lengths = [len(self._chunks[c]) for c in chunk_ids]
+            local_ids = np.concatenate([self._chunks[c] for c in chunk_ids]) if chunk_ids else np.array([], dtype=object)
+        return allocate_group_codes(np.repeat(np.asarray(chunk_ids, dtype=np.int64), lengths), local_ids, start)
@@ -0,0 +1,177 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional
+
+from duplicate_collapse import ADDRESS_KEY_COLUMNS
+from preliminary_grouping import iter_chunk_blocks, materialize_block
+from llm_dispatch import dispatch_chunks
+from result_writer import read_partitioned_results
+
+MASTER_ID_COL = "FinalGroupID"
+
+_ZIP5_RE = r"^(\d{5})"
+
+def load_master(path: str) -> pd.DataFrame:
+    """
+    前回の実行結果 (review_and_consolidate の出力、FinalGroupID 列を含む) を読み込む。
+    ディレクトリなら result_writer のパーティション出力として、ファイルなら拡張子に応じて Excel / Parquet / CSV として読み、文字列の列は文字列のまま扱う
+    ("nan" などの文字列も欠損に変換せず、書き出したときの値のまま読む)。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if os.path.isdir(path):
+        df = read_partitioned_results(path)
+    elif ext in (".xlsx", ".xls"):
+        df = pd.read_excel(path, dtype=str, keep_default_na=False)
+    elif ext == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if MASTER_ID_COL not in df.columns:
+        raise ValueError(f"Master file does not contain {MASTER_ID_COL} column: {path}")
+    return df
+
+def group_representatives(df_master: pd.DataFrame, id_col: str = MASTER_ID_COL) -> pd.DataFrame:
+    """
+    既存マスタの各グループから代表1行 (先頭行) を取り出す。
+    """
+    return df_master.loc[~df_master[id_col].duplicated()]
+
+def next_group_number(group_ids: pd.Series, prefix: str = "G") -> int:
+    """
+    既存の "{prefix}{番号}" 形式のIDと重ならない、次の番号を返す。
+    """
+    numbers = group_ids.dropna().astype(str).str.extract(f"^{re.escape(prefix)}(\\d+)$", expand=False)
+    numbers = pd.to_numeric(numbers, errors="coerce").dropna()
+    return int(numbers.max()) + 1 if len(numbers) else 1
+
+def match_delta(
+    df_master: pd.DataFrame,
+    df_new: pd.DataFrame,
+    match_func: Callable[[pd.DataFrame], pd.DataFrame],
+    group_cols: List[str] = None,
+    max_chunk_size: int = 100,
+    token_budget: Optional[int] = None,
+    token_estimator: Optional[Callable[[pd.DataFrame], np.ndarray]] = None,
+    max_concurrency: int = 1,
+    prefix: str = "G"
+) -> pd.DataFrame:
+    """
+    新しい行 (正規化済み) だけを既存マスタのグループに照合し、FinalGroupID を付けて返す。
+
+    - 既存マスタのどこかの行と住所が完全一致する新しい行は、その行の FinalGroupID をそのまま使う
+    - 残りの行は、同じブロックキー (Country / State / City) を持つ既存グループの代表1行ずつと一緒に
+      チャンクにして match_func (通常は perform_llm_matching をつないだもの) に渡す。
+      新しい行を含まないチャンクは送らない
+    - チャンク内では新しい行を先に、郵便番号 (5桁) が新しい行と一致する代表行をその次に並べるので、
+      ブロックが1チャンクに収まらない場合も近い候補から優先して送られる
+    - 代表行と同じグループになった新しい行はその既存IDを引き継ぎ、それ以外は既存と重ならない
+      新しいID ("{prefix}{番号}") を振る。既存の FinalGroupID は変えない
+
+    Returns:
+        pd.DataFrame: df_new に "LLMGroupID" と "FinalGroupID" を付けたもの (行順・index は入力のまま)
+    """
+    if group_cols is None:
+        group_cols = ["CountryName", "StateName", "City"]
+
+    df_result = df_new.copy()
+
+    # 1. 既存マスタとの完全一致
+    master_keys = _address_keys(df_master)
+    new_keys = _address_keys(df_new)
+    known = pd.Series(df_master[MASTER_ID_COL].to_numpy(dtype=object), index=master_keys.to_numpy())
+    known = known[~known.index.duplicated()]
+    final_ids = new_keys.map(known).astype(object)
+
+    # 2. 残りの行 (同じ住所は1行にまとめる) と、同じブロックキーを持つ既存グループの代表行
+    pending_mask = final_ids.isna() & ~new_keys.duplicated()
+    df_pending = df_new.loc[pending_mask]
+    reps = group_representatives(df_master)
+    reps = reps.loc[_key_index(reps, group_cols).isin(_key_index(df_pending, group_cols))]
+
+    cols = [col for col in df_new.columns if col in df_master.columns]
+    # 片方が空のときに concat すると、空の側の dtype の扱いについて pandas が FutureWarning を出すので結合しない
+    if len(df_pending) == 0:
+        combined = reps[cols].reset_index(drop=True)
+    elif len(reps) == 0:
+        combined = df_pending[cols].reset_index(drop=True)
+    else:
+        combined = pd.concat([df_pending[cols], reps[cols]], ignore_index=True)
+    is_new = np.arange(len(combined)) < len(df_pending)
+    master_ids = np.concatenate([np.full(len(df_pending), None, dtype=object), reps[MASTER_ID_COL].to_numpy(dtype=object)])
+
+    # 新しい行 → 郵便番号が一致する代表行 → その他の代表行 の順に並べる
+    zip5 = combined["PostalCode"].astype(str).str.extract(_ZIP5_RE, expand=False) if "PostalCode" in combined.columns \
+        else pd.Series(np.nan, index=combined.index)
+    zip_hit = zip5.isin(zip5[is_new].dropna()).to_numpy()
+    order = np.lexsort((np.arange(len(combined)), ~zip_hit, ~is_new))
+    combined = combined.iloc[order].reset_index(drop=True)
+    is_new, master_ids = is_new[order], master_ids[order]
+    new_index = np.full(len(combined), None, dtype=object)
+    new_index[is_new] = df_pending.index.to_numpy(dtype=object)[order[is_new]]
+
+    # 3. 新しい行を含むチャンクだけを match_func に渡す
+    blocks = [
+        block for block in iter_chunk_blocks(combined, group_cols, max_chunk_size, token_budget, token_estimator)
+        if is_new[block.positions].any()
+    ]
+    matched_chunks = dispatch_chunks(
+        (materialize_block(combined, block) for block in blocks),
+        _single_or_match(match_func),
+        max_concurrency=max_concurrency
+    )
+
+    # 4. チャンク順に、既存IDの引き継ぎと新しいIDの採番を行う
+    counter = next_group_number(df_master[MASTER_ID_COL], prefix)
+    assigned = {}
+    for sub_df in matched_chunks:
+        # combined の index は行位置そのもの
+        positions = sub_df.index.to_numpy()
+        local_ids = sub_df["LLMGroupID"].to_numpy()
+        for local_id in pd.unique(local_ids):
+            members = positions[local_ids == local_id]
+            existing = [gid for gid in master_ids[members] if gid is not None]
+            if existing:
+                gid = existing[0]
+            else:
+                gid = f"{prefix}{counter}"
+                counter += 1
+            for pos in members[is_new[members]]:
+                assigned.setdefault(new_index[pos], gid)
+
+    # ブロックキーが欠けていてチャンクに入らなかった行は、それぞれ新しいグループ
+    for idx in df_pending.index:
+        if idx not in assigned:
+            assigned[idx] = f"{prefix}{counter}"
+            counter += 1
+
+    final_ids.loc[list(assigned)] = list(assigned.values())
+
+    # 同じ住所の2行目以降は、1行目のIDを使う
+    first_id_by_key = pd.Series(final_ids[pending_mask].to_numpy(), index=new_keys[pending_mask].to_numpy())
+    still_missing = final_ids.isna()
+    final_ids[still_missing] = new_keys[still_missing].map(first_id_by_key).to_numpy()
+
+    df_result["LLMGroupID"] = final_ids
+    df_result[MASTER_ID_COL] = final_ids
+    return df_result
+
+def _single_or_match(match_func: Callable[[pd.DataFrame], pd.DataFrame]) -> Callable[[pd.DataFrame], pd.DataFrame]:
+    # 1行だけのチャンクは match_func を呼ばずに単独グループにする
+    def wrapped(sub_df: pd.DataFrame) -> pd.DataFrame:
+        if len(sub_df) < 2:
+            sub_df = sub_df.copy()
+            sub_df["LLMGroupID"] = [f"Single_{i}" for i in range(len(sub_df))]
+            return sub_df
+        return match_func(sub_df)
+    return wrapped
+
+def _address_keys(df: pd.DataFrame) -> pd.Series:
+    # 読み込み元 (Excel / CSV / 正規化直後) で型や欠損の表現が違っても同じキーになるよう、文字列にそろえてハッシュする
+    cols = [col for col in ADDRESS_KEY_COLUMNS if col in df.columns]
+    as_text = df[cols].astype(object).where(df[cols].notna(), "").astype(str)
+    return pd.util.hash_pandas_object(as_text, index=False)
+
+def _key_index(df: pd.DataFrame, group_cols: List[str]) -> pd.MultiIndex:
+    return pd.MultiIndex.from_frame(df[group_cols].astype(object).where(df[group_cols].notna(), "").astype(str))
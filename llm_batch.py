@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+from llm_matching import LLMMatcher, get_llm_client
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+DEFAULT_BATCH_DIR = ".llm_batch"
+# Batch API のジョブが取り得る終了状態
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class BatchCollector(LLMMatcher):
+    """
+    API を呼ばずに、送るはずだったプロンプトを Batch API のリクエストとして集める LLMMatcher。
+    complete() は空の回答 "[]" を返すので、この段階の結果はすべて Fallback になる (捨てて使う)。
+    chunk_id に現在のチャンクIDを入れてから呼ぶと、それが custom_id になる。
+    聞き直しのリクエストは集めない (max_followups=0)。
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_followups", 0)
+        super().__init__(*args, **kwargs)
+        self.chunk_id: Optional[str] = None
+        self.requests: List[dict] = []
+        self.custom_ids: Dict[str, str] = {}  # プロンプト -> custom_id
+
+    def complete(self, user_prompt: str) -> str:
+        if user_prompt not in self.custom_ids:
+            custom_id = self.chunk_id or f"request-{len(self.requests)}"
+            self.custom_ids[user_prompt] = custom_id
+            self.requests.append(build_batch_request(custom_id, self.request_body(user_prompt)))
+        return "[]"
+
+class BatchResultMatcher(LLMMatcher):
+    """
+    Batch API の結果を、同じプロンプトへの回答として返す LLMMatcher。
+    perform_llm_matching(df, matcher=...) に渡すと、オンライン実行と同じ JSON パース処理を通る。
+    結果が無い・エラーになったリクエストは空文字を返す (= Fallback)。
+    回答から漏れた行はオフラインでは聞き直せないので、そのまま Fallback になる (max_followups=0)。
+    キャッシュの検索は BatchCollector の段階ですでに数えているので、ここではヒット・ミス数に数えない。
+    """
+
+    count_cache_lookups = False
+
+    def __init__(self, custom_ids: Dict[str, str], results: Dict[str, Optional[str]], *args, **kwargs):
+        kwargs.setdefault("max_followups", 0)
+        super().__init__(*args, **kwargs)
+        self.custom_ids = custom_ids
+        self.results = results
+
+    def complete(self, user_prompt: str) -> str:
+        custom_id = self.custom_ids.get(user_prompt)
+        return (self.results.get(custom_id) or "").strip()
+
+def build_batch_request(custom_id: str, body: dict) -> dict:
+    """
+    Batch API の入力ファイル1行分 (チャット補完リクエスト) を作る。body は LLMMatcher.request_body の戻り値。
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": body
+    }
+
+def write_batch_file(requests: List[dict], path: str) -> str:
+    """
+    リクエストを JSONL で書き出し、パスを返す。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+def parse_batch_results(path: str) -> Dict[str, Optional[str]]:
+    """
+    Batch API の結果ファイル (JSONL) を {custom_id: 回答テキスト} に変換する。
+    エラーになったリクエストの値は None。
+    """
+    results = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            content = None
+            if not record.get("error") and response.get("status_code") == 200:
+                try:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    content = None
+            results[record["custom_id"]] = content
+    return results
+
+class OpenAIBatchBackend:
+    """
+    OpenAI Batch API にファイルを投入・監視・取得するバックエンド。
+    """
+
+    def __init__(self, client=None, completion_window: str = "24h"):
+        self._client = client
+        self.completion_window = completion_window
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_llm_client()
+        return self._client
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id: str, output_path: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, "w", encoding="utf-8") as f:
+            if batch.output_file_id:
+                f.write(self.client.files.content(batch.output_file_id).text)
+        return output_path
+
+class LocalBatchBackend:
+    """
+    Batch API のローカル代替 (テスト・オフライン検証用)。
+    入力 JSONL を読み、各リクエストの body を answer_func に渡して、Batch API と同じ形式の結果ファイルを作る。
+    answer_func を省略すると、全行を別々のグループにする回答を返す。
+    """
+
+    def __init__(self, answer_func: Optional[Callable[[dict], str]] = None):
+        self.answer_func = answer_func or _singleton_answer
+        self._batches: Dict[str, List[dict]] = {}
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "r", encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        batch_id = f"local_batch_{len(self._batches)}"
+        self._batches[batch_id] = requests
+        return batch_id
+
+    def poll(self, batch_id: str) -> str:
+        return "completed"
+
+    def download(self, batch_id: str, output_path: str) -> str:
+        with open(output_path, "w", encoding="utf-8") as f:
+            for n, request in enumerate(self._batches[batch_id]):
+                record = {
+                    "id": f"{batch_id}_req_{n}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"message": {"role": "assistant", "content": self.answer_func(request["body"])}}]}
+                    },
+                    "error": None
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return output_path
+
+def run_batch(
+    requests: List[dict],
+    backend,
+    batch_dir: str = DEFAULT_BATCH_DIR,
+    poll_interval: float = 60.0,
+    timeout: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    clock: Callable[[], float] = time.monotonic,
+    on_event: Optional[Callable[..., None]] = None
+) -> Dict[str, Optional[str]]:
+    """
+    リクエストを JSONL に書き出して backend に投入し、完了まで poll_interval 秒ごとに監視して、
+    結果を {custom_id: 回答テキスト} で返す。
+    on_event (通常は PipelineMetrics.log) には、投入時に "batch_submitted" (batch_id, requests)、
+    終了時に "batch_finished" (batch_id, status, seconds) のイベントを渡す。
+
+    Raises:
+        RuntimeError: ジョブが completed 以外で終了した場合
+        TimeoutError: timeout 秒以内に終わらなかった場合
+    """
+    if not requests:
+        return {}
+
+    input_path = write_batch_file(requests, os.path.join(batch_dir, "batch_input.jsonl"))
+    batch_id = backend.submit(input_path)
+    if on_event is not None:
+        on_event("batch_submitted", batch_id=batch_id, requests=len(requests))
+
+    started = clock()
+    status = backend.poll(batch_id)
+    while status not in TERMINAL_STATUSES:
+        if timeout is not None and clock() - started >= timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout} seconds (status: {status}).")
+        sleep(poll_interval)
+        status = backend.poll(batch_id)
+
+    if on_event is not None:
+        on_event("batch_finished", batch_id=batch_id, status=status, seconds=clock() - started)
+    if status != "completed":
+        raise RuntimeError(f"Batch {batch_id} ended with status: {status}")
+
+    output_path = backend.download(batch_id, os.path.join(batch_dir, f"{batch_id}_output.jsonl"))
+    return parse_batch_results(output_path)
+
+def _singleton_answer(body: dict) -> str:
+    prompt = body["messages"][-1]["content"]
+    # compact 形式 ("0,...") と verbose 形式 ("Index:0, ...") のどちらの行番号も拾う
+    indices = re.findall(r"^(?:Index:)?(-?\d+),", prompt, flags=re.MULTILINE)
+    return json.dumps([{"index": int(i), "group_id": f"G{n + 1}"} for n, i in enumerate(indices)])
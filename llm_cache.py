@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = ".llm_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def canonicalize_rows(row_texts: List[str]) -> List[int]:
+    """
+    行テキストの並び順を正規化する順列を返す (テキスト順、同じテキストは元の順)。
+    order[k] = 正規化後 k 番目の行の、元の位置。
+    行の並びや DataFrame の index が違っても、同じ住所の集合なら同じキーになる。
+    """
+    return sorted(range(len(row_texts)), key=lambda pos: (row_texts[pos], pos))
+
+def make_cache_key(
+    model: str,
+    reasoning_effort: str,
+    prompt_template: str,
+    row_texts: List[str]
+) -> Tuple[str, List[int]]:
+    """
+    モデル・reasoning_effort・プロンプトテンプレート・正規化した住所ブロックからキャッシュキーを作る。
+
+    Returns:
+        Tuple[str, List[int]]: (キー, canonicalize_rows の順列)
+    """
+    order = canonicalize_rows(row_texts)
+    payload = json.dumps(
+        {
+            "model": model,
+            "reasoning_effort": reasoning_effort,
+            "prompt_template": prompt_template,
+            "rows": [row_texts[pos] for pos in order]
+        },
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest(), order
+
+class LLMResponseCache:
+    """
+    LLM の回答 (正規化後の行番号 -> group_id) を SQLite ファイルに永続化するキャッシュ。
+    スレッドセーフで、合計サイズが max_bytes を超えたら最終アクセスが古いものから削除する。
+    合計サイズは開いたときに1回だけ数え、以降はメモリ上で増減させる (put のたびに全件を集計しない)。
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str, count: bool = True) -> Optional[Dict[int, str]]:
+        """
+        キーに対応するグループ対応表を返す。無ければ None。
+        count=False のときはヒット・ミス数に数えない (同じ検索を2回目に行う場合など)。
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+                )
+        return {int(pos): gid for pos, gid in json.loads(row[0]).items()}
+
+    def put(self, key: str, group_map: Dict[int, str]) -> None:
+        """
+        グループ対応表を保存し、必要なら古いエントリを削除する。
+        """
+        value = json.dumps({str(pos): gid for pos, gid in group_map.items()}, ensure_ascii=False)
+        size = len(key) + len(value.encode("utf-8"))
+        with self._lock:
+            with self._conn:
+                # 同じキーを上書きする場合は、古いエントリのサイズを差し引く
+                old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time())
+                )
+                self._total_bytes += size - (old[0] if old else 0)
+                self._evict()
+
+    def stats(self) -> dict:
+        """
+        ヒット・ミス数、ヒット率、エントリ数、合計サイズを返す。
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self._total_bytes
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        # 上限を超えたら、上限の 90% になるまで最終アクセスの古い順に削除
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.evictions += 1
@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+import openai
+import pandas as pd
+
+# プロンプトテンプレート本文のおおよそのトークン数
+PROMPT_OVERHEAD_TOKENS = 300
+# 1行あたりの出力 ({"index": n, "group_id": "Gx"}) のおおよそのトークン数
+COMPLETION_TOKENS_PER_ROW = 15
+# compact 形式で各行に載せる列 (City / State / Country はブロック共通なのでヘッダに1回だけ載る)
+ROW_TOKEN_COLUMNS = ["Address1", "Address2", "PostalCode"]
+# ヘッダ (Shared fields 行と CSV の列名行) のおおよそのトークン数
+BLOCK_HEADER_TOKENS = 30
+
+class TokenBucket:
+    """
+    1分あたり rate_per_minute 単位まで消費できるトークンバケット (スレッドセーフ)。
+    バケットの容量は1分ぶんで、空のときは補充されるまで acquire がブロックする。
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute は正の値を指定してください: {rate_per_minute}")
+        self.capacity = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        amount 単位を消費する。足りなければ補充を待つ。待った秒数を返す。
+        容量を超える要求は容量ぶんとして扱う (永久に待たないため)。
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+                self._updated_at = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate_per_second
+            self._sleep(wait)
+            waited += wait
+
+class RateLimiter:
+    """
+    requests-per-minute と tokens-per-minute の2つの予算をまとめて管理する。
+    どちらも None の場合は制限しない。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.requests = TokenBucket(requests_per_minute, clock, sleep) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, clock, sleep) if tokens_per_minute else None
+
+    def acquire(self, tokens: int) -> float:
+        """
+        リクエスト1回ぶんと tokens トークンぶんの予算を確保する。待った秒数を返す。
+        """
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+def estimate_row_tokens(df: pd.DataFrame) -> np.ndarray:
+    """
+    compact 形式のプロンプトで、各行が消費する入出力トークン数の概算 (4文字 ≒ 1トークン)。
+    ローカル番号・区切り文字のぶんとして1行あたり4文字を足す。
+    """
+    chars = np.full(len(df), 4, dtype=np.int64)
+    for col in ROW_TOKEN_COLUMNS:
+        if col in df.columns:
+            chars += df[col].astype(object).where(df[col].notna(), "").astype(str).str.len().to_numpy(dtype=np.int64)
+    return -(-chars // 4) + COMPLETION_TOKENS_PER_ROW
+
+def estimate_prompt_tokens(user_prompt: str) -> int:
+    """
+    組み立て済みのプロンプト1回分の入出力トークン数の概算 (LLMMatcher が API 呼び出しごとに予算を確保するのに使う)。
+    入力は 4文字 ≒ 1トークン、出力は1行 ≒ プロンプト1行として COMPLETION_TOKENS_PER_ROW を足す。
+    """
+    return len(user_prompt) // 4 + COMPLETION_TOKENS_PER_ROW * user_prompt.count("\n")
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """
+    リトライすべき API エラー (429 / 5xx / 接続エラー・タイムアウト) かどうか。
+    """
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status == 429 or (status is not None and 500 <= status < 600)
+
+def call_with_retries(
+    func: Callable,
+    *args,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    sleep: Callable[[float], None] = time.sleep,
+    on_retry: Optional[Callable[[BaseException, int, float], None]] = None,
+    **kwargs
+):
+    """
+    func(*args, **kwargs) を呼び、リトライ可能なエラーなら指数バックオフ + ジッターで再試行する。
+    待ち時間は random.uniform(0, min(max_delay, base_delay * 2**attempt)) (full jitter)。
+    サーバーが Retry-After を返した場合はそれ以上待つ。
+    on_retry を渡すと、待つ前に on_retry(例外, 試行回数, 待ち時間) を呼ぶ (計測用)。
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            if attempt >= max_retries or not is_retryable_error(exc):
+                raise
+            delay = max(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))), _retry_after_seconds(exc))
+            if on_retry is not None:
+                on_retry(exc, attempt + 1, delay)
+            sleep(delay)
+            attempt += 1
+
+def dispatch_chunks(
+    chunks: Iterable[pd.DataFrame],
+    match_func: Callable[[pd.DataFrame], pd.DataFrame],
+    max_concurrency: int = 8
+) -> Iterator[pd.DataFrame]:
+    """
+    チャンクをスレッドプールで並行に match_func に渡し、結果を「入力と同じ順序で」返す。
+    同時に実行中のチャンクは最大 max_concurrency 個で、入力は必要な分だけ先読みする。
+    (グループIDは group_id_unifier.GroupIdAllocator がチャンク番号から決めるので、順序には依存しない)
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency は1以上を指定してください: {max_concurrency}")
+
+    if max_concurrency == 1:
+        for chunk in chunks:
+            yield match_func(chunk)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(match_func, chunk))
+            if len(pending) >= max_concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _retry_after_seconds(exc: BaseException) -> float:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return 0.0
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
@@ -1,27 +1,310 @@
 import os
+import csv
+import hashlib
+import io
 import json
+import re
+import threading
+import time
 import pandas as pd
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
 
-def get_llm_client():
+from llm_cache import LLMResponseCache, make_cache_key
+from llm_dispatch import RateLimiter, call_with_retries, estimate_prompt_tokens
+
+# プロンプトテンプレートはカレントディレクトリではなく、このモジュールと同じ場所から読む
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_prompt.txt")
+COMPACT_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_prompt_compact.txt")
+
+# "compact": ブロック共通の項目をヘッダに1回だけ書き、各行はローカル番号付きの CSV にする
+# "verbose": 従来どおり、各行に全項目を "Index:..., Address1:..., ..." の形で書く
+PROMPT_FORMATS = {"compact": COMPACT_PROMPT_PATH, "verbose": PROMPT_PATH}
+DEFAULT_PROMPT_FORMAT = "compact"
+
+# プロンプトに載せる列と、プロンプト上の名前
+PROMPT_FIELDS = [
+    ("Address1", "Address1"),
+    ("Address2", "Address2"),
+    ("City", "City"),
+    ("StateName", "State"),
+    ("PostalCode", "Zip"),
+    ("CountryName", "Country"),
+]
+# compact 形式で、ブロック内で値がそろっていればヘッダにまとめる列 (Preliminary Grouping のキー)
+SHARED_FIELD_CANDIDATES = ["City", "StateName", "CountryName"]
+
+# structured output (response_format) で回答の形を固定する JSON Schema
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "address_groups",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "groups": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "group_id": {"type": "string"}
+                        },
+                        "required": ["index", "group_id"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["groups"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# 回答が途中で切れた場合などに、個々の {"index": ..., "group_id": ...} を拾うための正規表現
+_ITEM_RE = re.compile(r"\{[^{}]*\}")
+
+DEFAULT_MODEL = "o3-mini"
+DEFAULT_REASONING_EFFORT = "medium"
+
+def get_llm_client(http_client=None):
     """
     .env から OPENAI_API_KEY を読み込み、OpenAI クライアントを返す。
+    http_client を渡すと、その (コネクションプール付きの) HTTP クライアントを使う。
     """
     load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OpenAI API key not found in environment (OPENAI_API_KEY).")
-    return OpenAI(api_key=api_key)
+    if http_client is None:
+        return OpenAI(api_key=api_key)
+    return OpenAI(api_key=api_key, http_client=http_client)
+
+@lru_cache(maxsize=8)
+def load_prompt_template(path: str = PROMPT_PATH) -> str:
+    """
+    プロンプトテンプレートを読み込む。同じパスは2回目以降ファイルを読まない。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+class LLMMatcher:
+    """
+    LLM Matching に必要な設定・プロンプトテンプレート・API クライアントを1回だけ用意して使い回すためのクラス。
+
+    - クライアントは初回の API 呼び出し時に1度だけ作る (スレッドセーフ)
+    - HTTP クライアントはコネクションプール付きで、スレッド間で共有され keep-alive / TLS セッションが再利用される
+    - perform_llm_matching(df, matcher=...) に渡して使う
+    - cache (LLMResponseCache) を渡すと、同じ住所ブロックへの回答を API を呼ばずに再利用する
+    - prompt_format="compact" (既定) では、共通項目をヘッダにまとめた CSV 形式で行を送り、
+      LLM はローカル番号 (0, 1, ...) で答える。"verbose" は従来の1行1項目ずつの形式
+    - structured_output=True (既定) では、JSON Schema の response_format で回答の形を指定する
+    - 回答から漏れた行は、最大 max_followups 回まで、その行だけを小さなリクエストで聞き直す
+    - limiter (llm_dispatch.RateLimiter) を渡すと、聞き直しを含む API 呼び出し1回ごとに
+      token_estimator(プロンプト) トークンぶんの予算を確保する。429 / 5xx はその呼び出しだけを
+      最大 max_retries 回まで再試行する (on_retry / sleep は llm_dispatch.call_with_retries に渡す)
+    - stats には全呼び出しの救済・再リクエストの件数が累計される
+    - count_cache_lookups=False のサブクラスは、キャッシュのヒット・ミス数に数えずに検索する
+    """
+
+    count_cache_lookups = True
+
+    def __init__(
+        self,
+        client=None,
+        model: str = DEFAULT_MODEL,
+        reasoning_effort: str = DEFAULT_REASONING_EFFORT,
+        prompt_template: Optional[str] = None,
+        prompt_path: Optional[str] = None,
+        cache: Optional[LLMResponseCache] = None,
+        prompt_format: str = DEFAULT_PROMPT_FORMAT,
+        structured_output: bool = True,
+        max_followups: int = 1,
+        metrics=None,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = 0,
+        on_retry: Optional[Callable[[BaseException, int, float], None]] = None,
+        token_estimator: Callable[[str], int] = estimate_prompt_tokens,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        if prompt_format not in PROMPT_FORMATS:
+            raise ValueError(f"Unknown prompt_format: {prompt_format} (expected one of {sorted(PROMPT_FORMATS)})")
+        self.model = model
+        self.reasoning_effort = reasoning_effort
+        self.prompt_format = prompt_format
+        if prompt_template is None:
+            prompt_template = load_prompt_template(prompt_path or PROMPT_FORMATS[prompt_format])
+        self.prompt_template = prompt_template
+        self.cache = cache
+        self.structured_output = structured_output
+        self.max_followups = max_followups
+        self.metrics = metrics
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.on_retry = on_retry
+        self.token_estimator = token_estimator
+        self.sleep = sleep
+        self.stats = Counter()
+        self._client = client
+        self._http_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._http_client = DefaultHttpxClient()
+                    self._client = get_llm_client(http_client=self._http_client)
+        return self._client
+
+    def close(self) -> None:
+        """
+        自分で作った HTTP クライアントのコネクションを閉じる。
+        """
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+            self._client = None
+
+    def settings(self) -> dict:
+        """
+        回答に影響する設定 (モデル・プロンプトの形式とテンプレート・構造化出力・聞き直し回数)。
+        チェックポイントのキーなど、同じ設定で得た回答かどうかの判定に使う。
+        """
+        return {
+            "model": self.model,
+            "reasoning_effort": self.reasoning_effort,
+            "prompt_format": self.prompt_format,
+            "prompt_template": hashlib.sha256(self.prompt_template.encode("utf-8")).hexdigest(),
+            "structured_output": self.structured_output,
+            "max_followups": self.max_followups
+        }
+
+    def cache_key(self, df: pd.DataFrame) -> Tuple[str, List[int]]:
+        """
+        df に対するキャッシュキーと、行の正規化順列を返す (llm_cache.make_cache_key を参照)。
+        行の index はキーに含めないので、並び順や index が違っても同じ住所の集合なら同じキーになる。
+        """
+        row_texts = [
+            "|".join(str(row.get(col, "")) for col in
+                     ["Address1", "Address2", "City", "StateName", "PostalCode", "CountryName"])
+            for _, row in df.iterrows()
+        ]
+        return make_cache_key(self.model, self.reasoning_effort, self.prompt_template, row_texts)
+
+    def build_prompt(self, df: pd.DataFrame) -> str:
+        """
+        DataFrame の各行を address_block にしてテンプレートに埋め込んだプロンプトを返す。
+        """
+        if self.prompt_format == "compact":
+            address_block = _compact_address_block(df)
+        else:
+            address_list_str = []
+            for i, row in df.iterrows():
+                address_list_str.append(
+                    f"Index:{i}, Address1:{row.get('Address1','')}, "
+                    f"Address2:{row.get('Address2','')}, City:{row.get('City','')}, "
+                    f"State:{row.get('StateName','')}, Zip:{row.get('PostalCode','')}, "
+                    f"Country:{row.get('CountryName','')}"
+                )
+            address_block = "\n".join(address_list_str)
+
+        # (A) .replace を使って、{address_block} 部分だけ置換
+        return self.prompt_template.replace("{address_block}", address_block)
+
+    def decode_group_map(self, df: pd.DataFrame, group_map: Dict) -> Dict:
+        """
+        LLM の回答の index を df の index に直す。
+        compact 形式ではローカル番号 (行位置) なので df.index に変換し、範囲外の番号は捨てる。
+        """
+        if self.prompt_format != "compact":
+            return {idx: gid for idx, gid in group_map.items() if idx in df.index}
+        decoded = {}
+        for pos, gid in group_map.items():
+            try:
+                pos = int(pos)
+            except (TypeError, ValueError):
+                continue
+            if 0 <= pos < len(df):
+                decoded[df.index[pos]] = gid
+        return decoded
+
+    def request_body(self, user_prompt: str) -> dict:
+        """
+        チャット補完 API に渡す引数 (Batch API の body と同じ形) を返す。
+        """
+        body = {
+            "model": self.model,
+            "reasoning_effort": self.reasoning_effort,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ]
+        }
+        if self.structured_output:
+            body["response_format"] = RESPONSE_FORMAT
+        return body
+
+    def complete(self, user_prompt: str) -> str:
+        """
+        チャット補完 API を呼び、回答テキストを返す。
+        limiter があれば呼び出しごとに予算を確保し、429 / 5xx はこの呼び出しだけを再試行する。
+        """
+        def attempt() -> str:
+            if self.limiter is not None:
+                self.limiter.acquire(self.token_estimator(user_prompt))
+            return self._create(user_prompt)
+
+        return call_with_retries(attempt, max_retries=self.max_retries, on_retry=self.on_retry, sleep=self.sleep)
+
+    def _create(self, user_prompt: str) -> str:
+        if self.metrics is None:
+            response = self.client.chat.completions.create(**self.request_body(user_prompt))
+            return (response.choices[0].message.content or "").strip()
+
+        # API 1回ごとのレイテンシ・トークン数を記録する
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(**self.request_body(user_prompt))
+        except Exception as exc:
+            self.metrics.record_llm_call(time.perf_counter() - started, error=exc)
+            raise
+        usage = getattr(response, "usage", None)
+        self.metrics.record_llm_call(
+            time.perf_counter() - started,
+            prompt_tokens=_usage_tokens(usage, "prompt_tokens"),
+            completion_tokens=_usage_tokens(usage, "completion_tokens")
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    def record_stats(self, stats: Counter) -> None:
+        """
+        1回分の perform_llm_matching の件数を累計に足す (スレッドセーフ)。
+        """
+        with self._lock:
+            self.stats.update(stats)
 
-def perform_llm_matching(df: pd.DataFrame) -> pd.DataFrame:
+def perform_llm_matching(df: pd.DataFrame, matcher: Optional[LLMMatcher] = None) -> pd.DataFrame:
     """
     与えられた DataFrame(1グループ or 1チャンク) を LLM に渡し、
     その中で「どの行が同一住所か」をグルーピングする。
     LLM には外部ファイル llm_prompt.txt を使ってプロンプトを指定。
     JSON 形式で (row_index -> group_id) を返してもらい、結果を DataFrame に反映。
 
-    - "Fallback_xxx" が付く場合は、JSON パースに失敗したフォールバック。
+    - 回答が壊れていても、正しい {index, group_id} の項目はすべて使う。
+    - 回答から漏れた行 (不正な項目を含む) だけを、既存グループの代表行と一緒にもう一度送る
+      (matcher.max_followups 回まで)。
+    - "Fallback_xxx" が付く場合は、聞き直しても回答が得られなかった行。
+    - matcher を渡すと、そのクライアント・テンプレートを使い回す
+      (省略時は呼び出しごとに LLMMatcher を作る)。
+    - 救済・再リクエストの件数は df_result.attrs["llm_stats"] に入り、matcher.stats にも累計される。
     """
 
     # 1件以下ならLLM呼び出し不要
@@ -30,62 +313,165 @@ def perform_llm_matching(df: pd.DataFrame) -> pd.DataFrame:
         df["LLMGroupID"] = [f"Single_{i}" for i in range(len(df))]
         return df
 
-    client = get_llm_client()
+    if matcher is None:
+        matcher = LLMMatcher(client=get_llm_client())
 
-    # address_block を組み立て
-    address_list_str = []
-    for i, row in df.iterrows():
-        address_list_str.append(
-            f"Index:{i}, Address1:{row.get('Address1','')}, "
-            f"Address2:{row.get('Address2','')}, City:{row.get('City','')}, "
-            f"State:{row.get('StateName','')}, Zip:{row.get('PostalCode','')}, "
-            f"Country:{row.get('CountryName','')}"
-        )
-    address_block = "\n".join(address_list_str)
-
-    # llm_prompt.txt 読み込み
-    with open("llm_prompt.txt", "r", encoding="utf-8") as f:
-        prompt_template = f.read()
+    # キャッシュにあれば API を呼ばない
+    cache_key = None
+    if matcher.cache is not None:
+        cache_key, order = matcher.cache_key(df)
+        cached = matcher.cache.get(cache_key, count=matcher.count_cache_lookups)
+        if cached is not None:
+            group_map = {df.index[order[pos]]: gid for pos, gid in cached.items() if pos < len(order)}
+            return _apply_group_map(df, group_map)
 
-    # (A) .replace を使って、{address_block} 部分だけ置換
-    user_prompt = prompt_template.replace("{address_block}", address_block)
+    stats = Counter()
 
     # LLM呼び出し
-    response = client.chat.completions.create(
-        model="o3-mini",
-        reasoning_effort="medium",
-        messages=[
-            {
-                "role": "user",
-                "content": user_prompt
-            }
-        ]
-    )
+    group_map = _request_group_map(df, matcher, stats)
 
-    raw_answer = response.choices[0].message.content.strip()
+    # 漏れた行だけを聞き直す
+    for attempt in range(1, matcher.max_followups + 1):
+        missing = df.index[~df.index.isin(list(group_map))]
+        if len(missing) == 0:
+            break
+        stats["followup_requests"] += 1
+        stats["followup_rows"] += len(missing)
+        group_map.update(_request_followup(df, group_map, missing, matcher, stats, attempt))
 
-    # JSON パースを試みる
-    df_result = df.copy()
-    df_result["LLMGroupID"] = None
+    stats["fallback_rows"] = int((~df.index.isin(list(group_map))).sum())
+    matcher.record_stats(stats)
+
+    # 全行に回答がある場合だけ、正規化後の行番号で保存する (途中で切れた回答は保存しない)
+    if cache_key is not None and stats["fallback_rows"] == 0:
+        canonical_pos = {df.index[pos]: k for k, pos in enumerate(order)}
+        matcher.cache.put(cache_key, {canonical_pos[idx]: gid for idx, gid in group_map.items()})
+
+    df_result = _apply_group_map(df, group_map)
+    df_result.attrs["llm_stats"] = dict(stats)
+    return df_result
+
+def _request_group_map(df: pd.DataFrame, matcher: LLMMatcher, stats: Counter) -> Dict:
+    """
+    df を1回 LLM に送り、回答から取り出せた {df の index: group_id} を返す。
+    """
+    stats["requests"] += 1
+    raw_answer = matcher.complete(matcher.build_prompt(df))
+    items, invalid, salvaged = _parse_group_items(raw_answer)
+    group_map = matcher.decode_group_map(df, items)
+    stats["invalid_items"] += invalid + (len(items) - len(group_map))
+    if salvaged:
+        stats["salvaged_responses"] += 1
+        stats["salvaged_items"] += len(group_map)
+    return group_map
+
+def _request_followup(
+    df: pd.DataFrame,
+    group_map: Dict,
+    missing: pd.Index,
+    matcher: LLMMatcher,
+    stats: Counter,
+    attempt: int
+) -> Dict:
+    """
+    漏れた行と、既存の各グループの代表行1行ずつを送り直し、漏れた行の group_id を返す。
+    代表行と同じグループになった行はそのグループのIDを引き継ぎ、
+    それ以外は前回のIDとかぶらないよう "{gid}_r{attempt}" にする。
+    """
+    representatives = {}
+    for idx, gid in group_map.items():
+        representatives.setdefault(gid, idx)
+    rep_of = {idx: gid for gid, idx in representatives.items()}
+
+    send_index = df.index[df.index.isin(list(missing)) | df.index.isin(list(rep_of))]
+    answer = _request_group_map(df.loc[send_index], matcher, stats)
+
+    # 新しいIDごとに、含まれる代表行の元のIDを対応させる
+    new_to_old = {}
+    for idx, gid in answer.items():
+        if idx in rep_of:
+            new_to_old.setdefault(gid, rep_of[idx])
+
+    return {
+        idx: new_to_old.get(gid, f"{gid}_r{attempt}")
+        for idx, gid in answer.items()
+        if idx not in group_map
+    }
+
+def _parse_group_items(raw_answer: str) -> Tuple[Dict, int, bool]:
+    """
+    LLM の回答から {index: group_id} を取り出す。
+    JSON 配列・{"groups": [...]} のどちらも受け付け、index / group_id が不正な項目は数えて捨てる。
+    JSON 全体が壊れている (途中で切れた等) 場合は、個々の {...} を拾って使う。
+
+    Returns:
+        Tuple[Dict, int, bool]: (対応表, 捨てた項目数, 壊れた回答から拾ったかどうか)
+    """
+    salvaged = False
     try:
-        match_list = json.loads(raw_answer)  # JSONデコード
-        # match_list は [{"index": int, "group_id": str}, ...] のはず
-        group_map = {}
-        for item in match_list:
-            idx = item["index"]
-            gid = item["group_id"]
-            group_map[idx] = gid
-
-        # DataFrame に反映
-        for i in df_result.index:
-            if i in group_map:
-                df_result.at[i, "LLMGroupID"] = group_map[i]
-            else:
-                df_result.at[i, "LLMGroupID"] = f"Fallback_{i}"
-
-    except (json.JSONDecodeError, KeyError, TypeError):
-        # JSON不正やキー不足 → フォールバック
-        for i in df_result.index:
-            df_result.at[i, "LLMGroupID"] = f"Fallback_{i}"
+        parsed = json.loads(raw_answer)
+        if isinstance(parsed, dict):
+            parsed = parsed.get("groups")
+        if not isinstance(parsed, list):
+            raise ValueError("answer is not a list of items")
+        items = parsed
+    except ValueError:
+        salvaged = True
+        items = []
+        for fragment in _ITEM_RE.findall(raw_answer or ""):
+            try:
+                items.append(json.loads(fragment))
+            except ValueError:
+                continue
+
+    group_map = {}
+    invalid = 0
+    for item in items:
+        idx = item.get("index") if isinstance(item, dict) else None
+        gid = item.get("group_id") if isinstance(item, dict) else None
+        if isinstance(idx, bool) or not isinstance(idx, (int, str)) or gid is None or str(gid) == "":
+            invalid += 1
+            continue
+        group_map[idx] = str(gid)
+    return group_map, invalid, salvaged and bool(group_map)
 
+def _usage_tokens(usage, name: str) -> int:
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else 0
+
+def _compact_address_block(df: pd.DataFrame) -> str:
+    """
+    compact 形式の address_block を作る。
+    ブロック内で値がそろっている City / State / Country は "Shared fields" に1回だけ書き、
+    残りの列をローカル番号 i 付きの CSV にする。
+    """
+    shared = []
+    row_fields = []
+    for col, name in PROMPT_FIELDS:
+        if col in df.columns:
+            values = df[col].astype(object).where(df[col].notna(), "").astype(str)
+        else:
+            values = pd.Series([""] * len(df), index=df.index)
+        if col in SHARED_FIELD_CANDIDATES and values.nunique() == 1:
+            shared.append(f"{name}={values.iloc[0]}")
+        else:
+            row_fields.append((name, values.tolist()))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["i"] + [name for name, _ in row_fields])
+    for pos, row in enumerate(zip(*[values for _, values in row_fields])):
+        writer.writerow([pos, *row])
+
+    header = f"Shared fields: {'; '.join(shared)}\n" if shared else ""
+    return header + buffer.getvalue().rstrip("\n")
+
+def _apply_group_map(df: pd.DataFrame, group_map: Dict) -> pd.DataFrame:
+    """
+    {row_index: group_id} を "LLMGroupID" 列に反映する。対応表に無い行は "Fallback_{index}"。
+    """
+    df_result = df.copy()
+    row_index = pd.Series(df_result.index, index=df_result.index, dtype=object)
+    group_ids = row_index.map(group_map)
+    df_result["LLMGroupID"] = group_ids.where(group_ids.notna(), "Fallback_" + row_index.astype(str))
     return df_result
@@ -0,0 +1,184 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Tuple
+
+from llm_matching import perform_llm_matching
+
+# 類似度の計算に使うカラム (City/State/Country はブロックのキーなので同一)
+SIMILARITY_COLUMNS = ["Address1", "Address2", "PostalCode"]
+
+# これ以上なら同一住所として自動確定、これ未満なら別住所として自動確定
+DEFAULT_HIGH_THRESHOLD = 0.9
+DEFAULT_LOW_THRESHOLD = 0.3
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"\s+")
+
+def similarity_matrix(
+    df: pd.DataFrame,
+    cols: List[str] = None,
+    ngram: int = 3
+) -> np.ndarray:
+    """
+    ブロック内の全行ペアについて、文字 n-gram の TF-IDF コサイン類似度を計算する。
+
+    Parameters:
+        df (pd.DataFrame): 1ブロック(チャンク)分のDataFrame
+        cols (List[str]): 連結して比較するカラム
+        ngram (int): 文字 n-gram の長さ
+
+    Returns:
+        np.ndarray: (行数 x 行数) の類似度行列 (対角は 1.0)
+    """
+    texts = _row_texts(df, cols)
+    n = len(texts)
+
+    # n-gram の出現回数行列 (行 x 語彙) を作る
+    vocab = {}
+    rows, cols_idx = [], []
+    for i, text in enumerate(texts):
+        padded = f" {text} "
+        for j in range(max(len(padded) - ngram + 1, 1)):
+            gram = padded[j:j + ngram]
+            rows.append(i)
+            cols_idx.append(vocab.setdefault(gram, len(vocab)))
+
+    counts = np.zeros((n, max(len(vocab), 1)), dtype=np.float64)
+    np.add.at(counts, (np.array(rows, dtype=np.int64), np.array(cols_idx, dtype=np.int64)), 1.0)
+
+    # TF-IDF (smooth idf) → L2 正規化 → 内積がコサイン類似度
+    doc_freq = (counts > 0).sum(axis=0)
+    idf = np.log((1 + n) / (1 + doc_freq)) + 1.0
+    weights = counts * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    weights /= norms
+
+    sim = weights @ weights.T
+    np.fill_diagonal(sim, 1.0)
+    return sim
+
+def cluster_block(
+    df: pd.DataFrame,
+    low: float = DEFAULT_LOW_THRESHOLD,
+    high: float = DEFAULT_HIGH_THRESHOLD,
+    cols: List[str] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    類似度行列からブロック内の行をクラスタに分け、LLM に判断を任せるべき行を決める。
+
+    - 類似度 >= low かつ番地・部屋番号が食い違わないペアを辺とみなし、連結成分を作る
+      (番地が違う住所どうしが似た通り名でつながり、ブロックのほぼ全体が1つの成分になるのを防ぐ)
+    - 成分内の全ペアが「類似度 >= high かつ住所中の数字 (番地など) が一致」なら同一住所として確定
+    - 1行だけの成分は別住所として確定
+    - それ以外の成分は不確実 (uncertain) として LLM に回す
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (各行の成分番号, 不確実な成分に属する行の bool 配列)
+    """
+    if not 0.0 <= low <= high <= 1.0:
+        raise ValueError(f"0 <= low <= high <= 1 を満たすしきい値を指定してください: low={low}, high={high}")
+
+    n = len(df)
+    sim = similarity_matrix(df, cols)
+
+    # 番地 (Address1 の先頭の数字) と部屋番号 (それ以外の数字) を行ごとに整数コードにする
+    house_numbers, unit_numbers = [], []
+    for address1, address2 in zip(_row_texts(df, ["Address1"]), _row_texts(df, ["Address2"])):
+        numbers = _DIGITS_RE.findall(address1)
+        house_numbers.append(numbers[0] if address1[:1].isdigit() else "")
+        unit_numbers.append(frozenset(numbers[1:] if address1[:1].isdigit() else numbers)
+                            | frozenset(_DIGITS_RE.findall(address2)))
+    house_codes = _codes(house_numbers)
+    unit_codes = _codes(unit_numbers)
+
+    # 両方にあって値が違えば別住所とみなして辺を張らない (片方が欠けているだけなら LLM に任せる)
+    has_house = np.array([bool(number) for number in house_numbers])
+    has_unit = np.array([bool(numbers) for numbers in unit_numbers])
+    house_conflict = has_house[:, None] & has_house[None, :] & (house_codes[:, None] != house_codes[None, :])
+    unit_conflict = has_unit[:, None] & has_unit[None, :] & (unit_codes[:, None] != unit_codes[None, :])
+    candidate = (sim >= low) & ~house_conflict & ~unit_conflict
+
+    # 番地などの数字が異なるペアは、文字列がどれだけ似ていても自動確定しない
+    same_numbers = (house_codes[:, None] == house_codes[None, :]) & (unit_codes[:, None] == unit_codes[None, :])
+    accept = (sim >= high) & same_numbers
+
+    labels = _connected_components(candidate)
+    uncertain = np.zeros(n, dtype=bool)
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        if len(members) > 1 and not accept[np.ix_(members, members)].all():
+            uncertain[members] = True
+
+    return labels, uncertain
+
+def perform_local_matching(
+    df: pd.DataFrame,
+    match_func: Callable[[pd.DataFrame], pd.DataFrame] = perform_llm_matching,
+    low: float = DEFAULT_LOW_THRESHOLD,
+    high: float = DEFAULT_HIGH_THRESHOLD
+) -> pd.DataFrame:
+    """
+    ブロック内で局所的な類似度クラスタリングを行い、確実なものはその場でグループIDを付け、
+    不確実な行だけを match_func (既定は perform_llm_matching) に渡す。
+
+    - 自動確定した行: "Local_{成分番号}"
+    - 不確実な行: match_func が返した LLMGroupID (不確実な行が無ければ呼び出さない)
+
+    Returns:
+        pd.DataFrame: "LLMGroupID" 列を追加したDataFrame (行順・index は入力のまま)
+    """
+    if len(df) < 2:
+        return match_func(df)
+
+    labels, uncertain = cluster_block(df, low=low, high=high)
+
+    df_result = df.copy()
+    df_result["LLMGroupID"] = [f"Local_{label}" for label in labels]
+
+    if uncertain.any():
+        df_matched = match_func(df.iloc[np.flatnonzero(uncertain)])
+        df_result.loc[df_matched.index, "LLMGroupID"] = df_matched["LLMGroupID"]
+
+    return df_result
+
+def _row_texts(df: pd.DataFrame, cols: List[str] = None) -> List[str]:
+    """
+    比較用に各行の指定カラムを連結し、大文字化・空白の正規化をした文字列のリストを返す。
+    """
+    if cols is None:
+        cols = SIMILARITY_COLUMNS
+    cols = [col for col in cols if col in df.columns]
+    if not cols:
+        return [""] * len(df)
+
+    joined = df[cols].fillna("").astype(str).agg(" ".join, axis=1)
+    return [_SPACES_RE.sub(" ", text).strip().upper() for text in joined]
+
+def _codes(values: list) -> np.ndarray:
+    """
+    値 (文字列や frozenset) を、同じ値なら同じになる整数コードの配列にする。
+    """
+    ids = {}
+    return np.array([ids.setdefault(value, len(ids)) for value in values], dtype=np.int64)
+
+def _connected_components(adjacency: np.ndarray) -> np.ndarray:
+    """
+    bool の隣接行列から連結成分番号 (0始まり、先に出現した行の成分から採番) を求める。
+    """
+    n = adjacency.shape[0]
+    labels = np.full(n, -1, dtype=np.int64)
+    current = 0
+    for start in range(n):
+        if labels[start] >= 0:
+            continue
+        labels[start] = current
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            neighbors = np.flatnonzero(adjacency[node] & (labels < 0))
+            labels[neighbors] = current
+            stack.extend(neighbors.tolist())
+        current += 1
+    return labels
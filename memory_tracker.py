@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_MB = 1024 * 1024
+
+def current_rss() -> Optional[int]:
+    """
+    現在の常駐メモリ (RSS, バイト)。取得できない環境では None。
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+def peak_rss() -> Optional[int]:
+    """
+    プロセス開始からの最大常駐メモリ (peak RSS, バイト)。取得できない環境では None。
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StageMemoryTracker:
+    """
+    パイプラインの各ステージの処理時間とメモリ使用量を記録する。
+
+    - 各ステージの前後の RSS と、その時点までの peak RSS を記録する
+    - trace_allocations=True の場合は tracemalloc でステージ中に確保したメモリの最大値も記録する
+      (numpy / pandas の配列も数えられるが、処理は遅くなる)
+
+    例:
+        tracker = StageMemoryTracker()
+        with tracker.stage("clean+normalize"):
+            df = ...
+        tracker.print_report()
+    """
+
+    def __init__(self, trace_allocations: bool = False):
+        self.trace_allocations = trace_allocations
+        self.records: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started_tracing = False
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+
+        rss_before = current_rss()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            rss_after = current_rss()
+            peak = peak_rss()
+            if peak is not None and rss_after is not None:
+                # ru_maxrss と /proc の値は数えるタイミングが少しずれるので、現在値より小さくしない
+                peak = max(peak, rss_after)
+            record = {
+                "stage": name,
+                "seconds": time.perf_counter() - started,
+                "rss_before_mb": _to_mb(rss_before),
+                "rss_after_mb": _to_mb(rss_after),
+                "peak_rss_mb": _to_mb(peak),
+                "allocated_peak_mb": None
+            }
+            if self.trace_allocations:
+                record["allocated_peak_mb"] = _to_mb(tracemalloc.get_traced_memory()[1] - traced_before)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.records.append(record)
+
+    def report(self) -> pd.DataFrame:
+        """
+        ステージごとの記録を DataFrame で返す。
+        """
+        return pd.DataFrame(self.records, columns=[
+            "stage", "seconds", "rss_before_mb", "rss_after_mb", "peak_rss_mb", "allocated_peak_mb"
+        ])
+
+    def print_report(self) -> None:
+        report = self.report()
+        if not self.trace_allocations:
+            report = report.drop(columns=["allocated_peak_mb"])
+        print("=== Memory by stage (MB) ===")
+        print(report.to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+
+def _to_mb(value: Optional[int]) -> Optional[float]:
+    return None if value is None else value / _MB
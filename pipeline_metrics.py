@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, Optional, Tuple
+
+from memory_tracker import StageMemoryTracker
+
+METRIC_PREFIX = "addressmatcher"
+
+# LLM 呼び出しのレイテンシのヒストグラムの境界 (秒)
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+class PipelineMetrics:
+    """
+    run_end_to_end の計測値を集め、構造化ログ (JSON Lines) と Prometheus の textfile に出力する。
+
+    - stage(name): ステージの処理時間・行数・rows/sec・RSS・peak RSS (StageMemoryTracker) を記録し、
+      終わったときに "stage" イベントを1行出す
+    - record_llm_call: LLM API 1回ごとのレイテンシ・入出力トークン数・エラーを記録する
+      (LLMMatcher(metrics=...) が呼ぶ)。log_llm_calls=True なら "llm_call" イベントも1行ずつ出す
+    - record_retry: 429 / 5xx の再試行 (llm_dispatch.call_with_retries の on_retry)
+    - add_counts: Fallback / 救済の件数 (LLMMatcher.stats) やキャッシュのヒット数などをまとめて足す
+    - llm_prices=(入力, 出力) [USD / 100万トークン] を渡すと、推定コストも出す
+    - ログは log_path (JSON Lines, 追記) か log_stream (既定は標準出力) に書く
+
+    どの記録もカウンタの加算と1行の書き込みだけなので、常に有効にしておける (スレッドセーフ)。
+    """
+
+    def __init__(
+        self,
+        log_stream: Optional[IO[str]] = None,
+        log_path: Optional[str] = None,
+        run_id: Optional[str] = None,
+        log_llm_calls: bool = True,
+        llm_prices: Optional[Tuple[float, float]] = None,
+        trace_allocations: bool = False
+    ):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.log_llm_calls = log_llm_calls
+        self.llm_prices = llm_prices
+        self.counters: Counter = Counter()
+        self.gauges: Dict[str, float] = {}
+        self.stages: Dict[str, dict] = {}
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.tracker = StageMemoryTracker(trace_allocations=trace_allocations)
+        self._lock = threading.Lock()
+        self._log_file = open(log_path, "a", encoding="utf-8") if log_path else None
+        self._log_stream = self._log_file or log_stream or sys.stdout
+
+    def log(self, event: str, **fields) -> None:
+        """
+        イベントを JSON 1行で出力する。
+        """
+        record = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "run_id": self.run_id, "event": event, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=_json_default)
+        with self._lock:
+            self._log_stream.write(line + "\n")
+            self._log_stream.flush()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[dict]:
+        """
+        ステージを計測する。yield した dict に "rows" などを入れると、イベントと rows/sec に反映される。
+        例外で抜けた場合も、"error" を付けてイベントを出す。
+        """
+        fields = {}
+        error = None
+        try:
+            with self.tracker.stage(name):
+                yield fields
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            record = {**self.tracker.records[-1], **fields}
+            if record.get("rows") is not None and record["seconds"] > 0:
+                record["rows_per_second"] = record["rows"] / record["seconds"]
+            if record["allocated_peak_mb"] is None:
+                del record["allocated_peak_mb"]
+            if error is not None:
+                record["error"] = type(error).__name__
+            with self._lock:
+                self.stages[name] = record
+            self.log("stage", **record)
+
+    def record_llm_call(
+        self,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        error: Optional[BaseException] = None
+    ) -> None:
+        with self._lock:
+            self.counters["llm_requests"] += 1
+            self.counters["llm_prompt_tokens"] += prompt_tokens
+            self.counters["llm_completion_tokens"] += completion_tokens
+            if error is not None:
+                self.counters["llm_errors"] += 1
+            self.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.latency_sum += latency
+        if self.log_llm_calls:
+            fields = {"latency": latency, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+            if error is not None:
+                fields["error"] = type(error).__name__
+                fields["status_code"] = getattr(error, "status_code", None)
+            self.log("llm_call", **fields)
+
+    def record_retry(self, exc: BaseException, attempt: int, delay: float) -> None:
+        with self._lock:
+            self.counters["llm_retries"] += 1
+            self.counters["llm_retry_wait_seconds"] += delay
+        self.log("llm_retry", attempt=attempt, delay=delay, error=type(exc).__name__,
+                 status_code=getattr(exc, "status_code", None))
+
+    def add_counts(self, prefix: str, counts: Dict[str, float]) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self.counters[f"{prefix}_{key}"] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def cost_usd(self) -> Optional[float]:
+        """
+        llm_prices から計算した LLM の推定コスト (USD)。価格が無ければ None。
+        """
+        if self.llm_prices is None:
+            return None
+        prompt_price, completion_price = self.llm_prices
+        return (self.counters["llm_prompt_tokens"] * prompt_price
+                + self.counters["llm_completion_tokens"] * completion_price) / 1_000_000
+
+    def summary(self) -> dict:
+        peaks = [stage["peak_rss_mb"] for stage in self.stages.values() if stage.get("peak_rss_mb") is not None]
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "stages": dict(self.stages),
+            "peak_rss_mb": max(peaks) if peaks else None,
+            "llm_cost_usd": self.cost_usd()
+        }
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Prometheus (node_exporter の textfile collector) 形式で書き出す。一時ファイルに書いてから置き換える。
+        """
+        run = f'run_id="{self.run_id}"'
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples) -> None:
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join([run] + [f'{k}="{_escape(v)}"' for k, v in labels])
+                lines.append(f"{full_name}{suffix}{{{label_text}}} {_format_value(value)}")
+
+        with self._lock:
+            stages = list(self.stages.items())
+            metric("stage_seconds", "gauge", "Wall time of each pipeline stage.",
+                   [("", [("stage", name)], s["seconds"]) for name, s in stages])
+            metric("stage_rows", "gauge", "Rows processed by each pipeline stage.",
+                   [("", [("stage", name)], s["rows"]) for name, s in stages if s.get("rows") is not None])
+            metric("stage_peak_rss_bytes", "gauge", "Process peak RSS at the end of each stage.",
+                   [("", [("stage", name)], s["peak_rss_mb"] * 1024 * 1024)
+                    for name, s in stages if s.get("peak_rss_mb") is not None])
+
+            for key, value in sorted(self.counters.items()):
+                metric(f"{key}_total", "counter", f"Total {key.replace('_', ' ')}.", [("", [], value)])
+            for key, value in sorted(self.gauges.items()):
+                metric(key, "gauge", key.replace("_", " ").capitalize() + ".", [("", [], value)])
+
+            cumulative = 0
+            samples = []
+            for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], self.latency_buckets):
+                cumulative += count
+                samples.append(("_bucket", [("le", bound)], cumulative))
+            samples += [("_sum", [], self.latency_sum), ("_count", [], cumulative)]
+            metric("llm_latency_seconds", "histogram", "Latency of LLM API calls.", samples)
+
+        cost = self.cost_usd()
+        if cost is not None:
+            metric("llm_cost_usd", "gauge", "Estimated LLM cost of the run.", [("", [], cost)])
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def close(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _json_default(value):
+    # numpy のスカラーなど
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
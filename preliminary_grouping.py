@@ -1,10 +1,29 @@
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from llm_dispatch import estimate_row_tokens
+
+class ChunkBlock(NamedTuple):
+    """
+    1チャンク分の軽量な記述子。データ自体は持たず、元のDataFrame内の行位置だけを持つ。
+
+    - key: グルーピングキーの値 (例: ("USA", "TX", "Dallas"))
+    - part: 同じキーのグループ内で何番目のチャンクか (0始まり)
+    - num_parts: 同じキーのグループが分割されたチャンク数
+    - positions: 元のDataFrameでの行位置 (iloc 用の整数配列)
+    """
+    key: Tuple
+    part: int
+    num_parts: int
+    positions: np.ndarray
 
 def preliminary_grouping(
     df: pd.DataFrame,
     group_cols: List[str] = None,
-    max_chunk_size: int = 50
+    max_chunk_size: int = 50,
+    token_budget: Optional[int] = None,
+    token_estimator: Optional[Callable[[pd.DataFrame], np.ndarray]] = None
 ) -> List[pd.DataFrame]:
     """
     与えられたDataFrameを指定したカラム(例: ["CountryName", "StateName", "City"])でグルーピングし、
@@ -15,41 +34,111 @@ def preliminary_grouping(
         df (pd.DataFrame): 前段のクリーニング・正規化を終えたDataFrame
         group_cols (List[str]): グルーピングに使うカラムのリスト
         max_chunk_size (int): 1チャンクあたりの最大レコード数
+        token_budget (int): 指定すると、1チャンクの行のトークン数の合計がこれを超えないように詰める
+        token_estimator (Callable): 各行のトークン数 (配列) を返す関数。省略時は llm_dispatch.estimate_row_tokens
 
     Returns:
-        List[pd.DataFrame]: 分割後のサブDataFrameのリスト
+        List[pd.DataFrame]: 分割後のサブDataFrameのリスト (index は元のDataFrameのもの)
+    """
+    return list(iter_chunks(df, group_cols, max_chunk_size, token_budget, token_estimator))
+
+def iter_chunks(
+    df: pd.DataFrame,
+    group_cols: List[str] = None,
+    max_chunk_size: int = 50,
+    token_budget: Optional[int] = None,
+    token_estimator: Optional[Callable[[pd.DataFrame], np.ndarray]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    preliminary_grouping のジェネレータ版。チャンクは取り出されたときに初めて切り出される。
+    """
+    for block in iter_chunk_blocks(df, group_cols, max_chunk_size, token_budget, token_estimator):
+        yield materialize_block(df, block)
+
+def iter_chunk_blocks(
+    df: pd.DataFrame,
+    group_cols: List[str] = None,
+    max_chunk_size: int = 50,
+    token_budget: Optional[int] = None,
+    token_estimator: Optional[Callable[[pd.DataFrame], np.ndarray]] = None
+) -> Iterator[ChunkBlock]:
+    """
+    グルーピングとチャンク分割を行い、ChunkBlock (キー + 行位置配列) を順に返す。
+    グループ番号の算出と安定ソートを1回ずつ行うだけで、サブDataFrameのコピーは作らない。
+    チャンクの順序・中身は preliminary_grouping と同じ (キー順、グループ内は元の行順)。
+
+    token_budget を指定すると、各グループを先頭から順に、行のトークン数 (token_estimator) の合計が
+    token_budget 以内に収まるだけ詰めて分割する (max_chunk_size 行も超えない)。
+    1行だけで予算を超える場合は、その行だけのチャンクにする。
     """
     if group_cols is None:
         group_cols = ["CountryName", "StateName", "City"]
+    if max_chunk_size < 1:
+        raise ValueError(f"max_chunk_size は1以上を指定してください: {max_chunk_size}")
+    if token_budget is not None and token_budget < 1:
+        raise ValueError(f"token_budget は1以上を指定してください: {token_budget}")
+
+    # 行ごとのグループ番号 (キー順)。キーに欠損がある行は groupby と同様に除外される
+    group_ids = df.groupby(group_cols, observed=True, sort=True).ngroup().to_numpy()
+    valid = ~pd.isna(group_ids)
+    positions = np.flatnonzero(valid)
+    group_ids = group_ids[valid].astype(np.int64)
+    if len(group_ids) == 0:
+        return
+
+    # グループ番号で安定ソートすると、各グループの行が元の順序のまま連続する
+    order = np.argsort(group_ids, kind="stable")
+    sorted_positions = positions[order]
+    sizes = np.bincount(group_ids)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    # 各グループのキー値は先頭行から一括で取得
+    first_rows = df[group_cols].iloc[sorted_positions[starts]]
+    keys = first_rows.itertuples(index=False, name=None)
+
+    # ソート後の並びでの各行のトークン数の累積和
+    cum_tokens = None
+    if token_budget is not None:
+        row_tokens = (token_estimator or estimate_row_tokens)(df)
+        cum_tokens = np.cumsum(np.asarray(row_tokens, dtype=np.int64)[sorted_positions])
+
+    for key, start, size in zip(keys, starts.tolist(), sizes.tolist()):
+        bounds = _split_group(start, size, max_chunk_size, cum_tokens, token_budget)
+        num_parts = len(bounds)
+        for part, (chunk_start, chunk_end) in enumerate(bounds):
+            yield ChunkBlock(
+                key=key,
+                part=part,
+                num_parts=num_parts,
+                positions=sorted_positions[chunk_start:chunk_end]
+            )
+
+def materialize_block(df: pd.DataFrame, block: ChunkBlock) -> pd.DataFrame:
+    """
+    ChunkBlock が指す行だけを df から切り出す。
+    """
+    return df.iloc[block.positions]
+
+def _split_group(
+    start: int,
+    size: int,
+    max_chunk_size: int,
+    cum_tokens: Optional[np.ndarray],
+    token_budget: Optional[int]
+) -> List[Tuple[int, int]]:
+    """
+    ソート済み配列上の1グループ [start, start + size) を、チャンクの (開始, 終了) のリストに分ける。
+    """
+    end = start + size
+    if cum_tokens is None:
+        return [(s, min(s + max_chunk_size, end)) for s in range(start, end, max_chunk_size)]
 
-    # グループ化
-    grouped = df.groupby(group_cols)
-    
-    result_sub_dfs = []
-    
-    for _, group_df in grouped:
-        group_df = group_df.copy()
-        
-        # レコード数が max_chunk_size を超える場合は分割
-        num_records = len(group_df)
-        if num_records > max_chunk_size:
-            # 等分割するイメージ。実際はレコード順や意味づけによって調整可能
-            chunks = _split_df_into_chunks(group_df, max_chunk_size)
-            result_sub_dfs.extend(chunks)
-        else:
-            result_sub_dfs.append(group_df)
-    
-    return result_sub_dfs
-
-def _split_df_into_chunks(df: pd.DataFrame, chunk_size: int) -> List[pd.DataFrame]:
-    """
-    DataFrameをchunk_sizeごとに切り分け、複数のDataFrameに分割してリストで返す。
-    """
-    # DataFrame の行インデックスをリセットしておくと扱いやすい
-    df = df.reset_index(drop=True)
-    chunks = []
-    for start_idx in range(0, len(df), chunk_size):
-        end_idx = start_idx + chunk_size
-        chunk_df = df.iloc[start_idx:end_idx].copy()
-        chunks.append(chunk_df)
-    return chunks
+    bounds = []
+    chunk_start = start
+    while chunk_start < end:
+        base = cum_tokens[chunk_start - 1] if chunk_start > 0 else 0
+        chunk_end = int(np.searchsorted(cum_tokens, base + token_budget, side="right"))
+        chunk_end = min(max(chunk_end, chunk_start + 1), chunk_start + max_chunk_size, end)
+        bounds.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return bounds
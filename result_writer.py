@@ -0,0 +1,213 @@
+import os
+import warnings
+from typing import List, Optional
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+# 出力形式と拡張子
+OUTPUT_FORMATS = {"parquet": ".parquet", "csv": ".csv"}
+DEFAULT_PARTITION_COLS = ["CountryName", "StateName"]
+
+# Excel の1シートの最大行数 (ヘッダー行を含む)
+EXCEL_MAX_ROWS = 1_048_576
+
+# 値が欠損のパーティションのディレクトリ名 (Hive / pyarrow と同じ)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# 書き出すファイル名の接頭辞
+PART_PREFIX = "part-"
+
+class PartitionedResultWriter:
+    """
+    結果を partition_cols (既定は CountryName / StateName) ごとのディレクトリに分けて、Parquet / CSV で書き出す。
+
+    - write(df) を呼ぶたびに、各パーティションに part-{連番} のファイルを1つずつ追加する
+      (全体を1つのファイル・ワークブックとしてメモリ上に組み立てない)
+    - ディレクトリは Hive 形式 (directory/CountryName=USA/StateName=NC/part-000000.parquet)。
+      パーティションの列はファイルには含めず、read_partitioned_results がパスから戻す
+    - fmt="parquet" で pyarrow が無い場合は CSV で書く
+    - overwrite=True の場合、directory に前回の出力があれば最初に削除する (前回のファイルが混ざらないように)。
+      消すのは part-* のファイルと、空になったパーティションのディレクトリ (Col=value) だけで、
+      directory にある他のファイルには触れない
+
+    例:
+        with PartitionedResultWriter("result") as writer:
+            for df_chunk in ...:
+                writer.write(df_chunk)
+    """
+
+    def __init__(self, directory: str, fmt: str = "parquet", partition_cols: List[str] = None, overwrite: bool = True):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"未対応の出力形式です: {fmt}")
+        if fmt == "parquet" and not _pyarrow_available():
+            warnings.warn("pyarrow が見つからないため、CSV で出力します。")
+            fmt = "csv"
+        self.directory = directory
+        self.fmt = fmt
+        self.partition_cols = DEFAULT_PARTITION_COLS if partition_cols is None else partition_cols
+        self.paths: List[str] = []
+        self.rows = 0
+        if overwrite and os.path.isdir(directory):
+            _remove_parts(directory)
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        df をパーティションごとに分けて、それぞれ新しいファイルに書く。
+        """
+        if len(df) == 0:
+            return
+        cols = [col for col in self.partition_cols if col in df.columns]
+        if not cols:
+            self._write_part(self.directory, df)
+            return
+
+        # パーティションごとの行位置 (グループの順番はデータ中の出現順)
+        codes = df.groupby(cols, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        data = df.drop(columns=cols)
+        for positions in np.split(order, bounds):
+            first = df.iloc[positions[0]]
+            sub_dir = os.path.join(self.directory, *[f"{col}={_partition_value(first[col])}" for col in cols])
+            self._write_part(sub_dir, data.iloc[positions])
+
+    def close(self) -> List[str]:
+        """
+        書き出したファイルのパスを返す。
+        """
+        return self.paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write_part(self, directory: str, df: pd.DataFrame) -> None:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{PART_PREFIX}{len(self.paths):06d}{OUTPUT_FORMATS[self.fmt]}")
+        # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+        tmp_path = path + ".tmp"
+        if self.fmt == "parquet":
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.paths.append(path)
+        self.rows += len(df)
+
+def write_results(
+    df: pd.DataFrame,
+    directory: str,
+    fmt: str = "parquet",
+    partition_cols: List[str] = None,
+    batch_rows: int = 1_000_000
+) -> List[str]:
+    """
+    df を PartitionedResultWriter で書き出し、ファイルのパスを返す。
+    batch_rows 行ずつ書くので、1回に変換する量 (Parquet / CSV のバッファ) は batch_rows 行分に収まる。
+    """
+    with PartitionedResultWriter(directory, fmt, partition_cols) as writer:
+        for start in range(0, len(df), batch_rows):
+            writer.write(df.iloc[start:start + batch_rows])
+    return writer.paths
+
+def read_partitioned_results(directory: str) -> pd.DataFrame:
+    """
+    PartitionedResultWriter が書いたディレクトリを読み込む。パーティションの列はパスから文字列として戻す。
+    読むのは part-* のファイルだけで、同じディレクトリにある他のファイルは無視する。
+    """
+    frames = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if _is_partition_dir(name))
+        partition_values = {}
+        for part in os.path.relpath(root, directory).split(os.sep):
+            if "=" in part:
+                col, value = part.split("=", 1)
+                partition_values[col] = None if value == NULL_PARTITION else unquote(value)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if not name.startswith(PART_PREFIX):
+                continue
+            if name.endswith(".parquet"):
+                df = pd.read_parquet(path)
+            elif name.endswith(".csv"):
+                df = pd.read_csv(path, dtype=str, keep_default_na=False)
+            else:
+                continue
+            frames.append(df.assign(**partition_values))
+
+    if not frames:
+        raise ValueError(f"No result files found in {directory}")
+    return pd.concat(frames, ignore_index=True)
+
+def write_review_excel(
+    df: pd.DataFrame,
+    path: str,
+    review_col: Optional[str] = "NeedsReview",
+    max_rows_per_sheet: int = EXCEL_MAX_ROWS,
+    sheet_name: str = "Review"
+) -> int:
+    """
+    人手レビュー用に、review_col が True の行だけを Excel に書き出し、書いた行数を返す
+    (review_col=None なら全行)。
+
+    - openpyxl の write_only モードで1行ずつ書くので、ワークブック全体をメモリ上に作らない
+    - 1シートに max_rows_per_sheet 行 (ヘッダーを含む) を超える場合は、"Review_2", "Review_3", ... に分ける
+    """
+    from openpyxl import Workbook
+
+    if review_col is not None:
+        if review_col not in df.columns:
+            raise ValueError(f"DataFrame does not contain {review_col} column.")
+        df = df.loc[df[review_col].fillna(False).astype(bool)]
+
+    rows_per_sheet = max_rows_per_sheet - 1
+    workbook = Workbook(write_only=True)
+    header = [str(col) for col in df.columns]
+    num_sheets = max(1, -(-len(df) // rows_per_sheet))
+    for n in range(num_sheets):
+        sheet = workbook.create_sheet(sheet_name if n == 0 else f"{sheet_name}_{n + 1}")
+        sheet.append(header)
+        part = df.iloc[n * rows_per_sheet:(n + 1) * rows_per_sheet]
+        for row in part.astype(object).where(part.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+
+    tmp_path = path + ".tmp"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    return len(df)
+
+def _remove_parts(directory: str) -> None:
+    """
+    前回の出力 (part-* のファイル) を消し、空になったパーティションのディレクトリを消す。
+    """
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            if _is_partition_dir(name):
+                _remove_parts(path)
+                if not os.listdir(path):
+                    os.rmdir(path)
+        elif name.startswith(PART_PREFIX):
+            os.remove(path)
+
+def _is_partition_dir(name: str) -> bool:
+    # Hive 形式のディレクトリ名 (Col=value)
+    col, sep, _ = name.partition("=")
+    return bool(sep) and bool(col)
+
+def _partition_value(value) -> str:
+    if pd.isna(value):
+        return NULL_PARTITION
+    return quote(str(value), safe="")
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
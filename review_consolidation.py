@@ -1,10 +1,23 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from union_find import UnionFind
+
+# split の条件: 行数ぶんの bool 配列/Series、{列名: 値 or 値のリスト}、または DataFrame を受け取り bool Series を返す関数
+SplitPredicate = Union[pd.Series, np.ndarray, Dict[str, object], Callable[[pd.DataFrame], pd.Series]]
+
+# review_and_consolidate が付けるグループ単位のレビュー用シグナル
+GROUP_SIZE_COL = "GroupSize"
+GROUP_POSTAL_CODES_COL = "GroupDistinctPostalCodes"
+GROUP_ACCOUNT_NOS_COL = "GroupDistinctAccountNos"
+REVIEW_SIGNAL_COLUMNS = [GROUP_SIZE_COL, GROUP_POSTAL_CODES_COL, GROUP_ACCOUNT_NOS_COL]
 
 def review_and_consolidate(
     df: pd.DataFrame,
     suspicious_threshold: int = 50,
-    mark_singleton: bool = False
+    mark_singleton: bool = False,
+    copy: bool = True
 ) -> pd.DataFrame:
     """
     LLM Matchingの結果を持つDataFrameを受け取り、NeedsReview フラグを付ける簡易処理。
@@ -12,57 +25,180 @@ def review_and_consolidate(
     - グループサイズ >= suspicious_threshold のグループにフラグ付け (大きすぎるグループ)
     - mark_singleton=True に設定した場合のみ、グループサイズ=1のものもフラグ付けする
     - 最終的に "FinalGroupID" = "LLMGroupID" をコピー
+    - レビューの優先順位付け用に、グループごとの件数 (GroupSize)、郵便番号の種類数
+      (GroupDistinctPostalCodes)、AccountNo の種類数 (GroupDistinctAccountNos) も付ける
+      (元の列が無いシグナルは付けない)
+
+    グループごとのループはせず、factorize + bincount の1パスで計算する。
+    copy=False の場合は df をコピーせず、渡された df に列を足して返す。
     """
 
-    df = df.copy()
+    if copy:
+        df = df.copy()
     if "LLMGroupID" not in df.columns:
         raise ValueError("DataFrame does not contain LLMGroupID column.")
 
-    # groupbyで各グループの件数を数える
-    #print(df.columns)
-    #print(df.dtypes)
-    # Optional: check shape, sample values
-    #print(df[["LLMGroupID"]].head())
-    group_sizes = df.groupby("LLMGroupID").size()
-
-    # 大きいグループ
-    large_groups = group_sizes[group_sizes >= suspicious_threshold].index.tolist()
+    # 各行のグループコード (LLMGroupID が欠損の行は -1 で、どのグループにも数えない)
+    codes, uniques = pd.factorize(df["LLMGroupID"])
+    valid = codes >= 0
+    safe_codes = np.where(valid, codes, 0)
 
-    # デフォルトで全行 False
-    df["NeedsReview"] = False
+    group_sizes = np.bincount(codes[valid], minlength=len(uniques))
+    row_sizes = np.where(valid, group_sizes[safe_codes], 0)
+    df[GROUP_SIZE_COL] = row_sizes
 
-    # しきい値超えグループにフラグ付け
-    for g_id in large_groups:
-        df.loc[df["LLMGroupID"] == g_id, "NeedsReview"] = True
+    for source_col, signal_col in [("PostalCode", GROUP_POSTAL_CODES_COL), ("AccountNo", GROUP_ACCOUNT_NOS_COL)]:
+        if source_col in df.columns:
+            distinct = _distinct_per_group(codes, df[source_col], len(uniques))
+            df[signal_col] = np.where(valid, distinct[safe_codes], 0)
 
-    # 単一レコードのフラグ付けは任意設定
+    # 大きいグループ / 単一レコード (任意設定) にフラグ付け
+    needs_review = valid & (row_sizes >= suspicious_threshold)
     if mark_singleton:
-        single_groups = group_sizes[group_sizes == 1].index.tolist()
-        for g_id in single_groups:
-            df.loc[df["LLMGroupID"] == g_id, "NeedsReview"] = True
+        needs_review |= valid & (row_sizes == 1)
+    df["NeedsReview"] = needs_review
 
     # FinalGroupID は一旦そのままコピー
     df["FinalGroupID"] = df["LLMGroupID"]
 
     return df
 
+def _distinct_per_group(codes: np.ndarray, values: pd.Series, num_groups: int) -> np.ndarray:
+    """
+    グループコードごとの、values の種類数 (欠損は数えない) を返す。
+    """
+    value_codes, value_uniques = pd.factorize(values)
+    ok = (codes >= 0) & (value_codes >= 0)
+    pairs = np.unique(codes[ok].astype(np.int64) * max(len(value_uniques), 1) + value_codes[ok])
+    return np.bincount(pairs // max(len(value_uniques), 1), minlength=num_groups)
+
+class GroupConsolidator:
+    """
+    レビュー担当者の統合 (merge)・分割 (split) の指示をまとめて受け取り、1回で FinalGroupID に反映するエンジン。
+
+    - グループIDは整数コードに変換し、統合は Union-Find で処理する (指示ごとに DataFrame をコピー・走査しない)
+    - 分割の条件はベクトル化した形で受け取り、対象グループの行だけで評価する
+    - apply() で「統合 → 分割」の順に反映し、FinalGroupID を最後に1回だけ作る
+
+    例:
+        consolidator = GroupConsolidator(df)
+        consolidator.merge(["G1", "G2"], new_id="G1_G2_MERGED")
+        consolidator.split("G3", {"PostalCode": "27602"})
+        df = consolidator.apply()
+    """
+
+    def __init__(self, df: pd.DataFrame, id_col: str = "FinalGroupID"):
+        if id_col not in df.columns:
+            raise ValueError(f"DataFrame does not contain {id_col} column.")
+        self.df = df
+        self.id_col = id_col
+        self.codes, uniques = pd.factorize(df[id_col], sort=False)
+        self.group_ids = list(uniques)
+        self._uf = UnionFind(len(self.group_ids))
+        # 現在 (それまでの統合を反映した後) の名前。代表コード -> ID と、ID -> 代表コードの集合
+        # (new_id が既存のIDと同じ場合は、1つの名前が複数のグループを指す)
+        self._name_of: Dict[int, str] = dict(enumerate(self.group_ids))
+        self._roots_of: Dict[str, Set[int]] = {gid: {code} for code, gid in enumerate(self.group_ids)}
+        self._splits: List[tuple] = []
+
+    def merge(self, old_ids: List[str], new_id: Optional[str] = None) -> "GroupConsolidator":
+        """
+        old_ids を1つのグループに統合する指示を追加する。
+        old_ids は現在の名前で指定する (それまでの merge で付けた new_id も使える)。存在しないIDは KeyError。
+        new_id を省略すると、統合後のIDは (データ上で) 最初に出てくるグループの現在のID。
+        """
+        unknown = [gid for gid in old_ids if gid not in self._roots_of]
+        if unknown:
+            raise KeyError(f"Groups to merge do not exist: {unknown}")
+        roots = sorted(set().union(*(self._roots_of[gid] for gid in old_ids)))
+        if not roots:
+            return self
+
+        self._uf.union_many([roots[0]] * (len(roots) - 1), roots[1:])
+        new_root = self._uf.find(roots[0])
+        name = new_id if new_id is not None else self._name_of[new_root]
+        for root in roots:
+            old_name = self._name_of.pop(root)
+            self._roots_of[old_name].discard(root)
+            if not self._roots_of[old_name]:
+                del self._roots_of[old_name]
+        self._name_of[new_root] = name
+        self._roots_of.setdefault(name, set()).add(new_root)
+        return self
+
+    def split(self, group_id: str, predicate: SplitPredicate, new_id: Optional[str] = None) -> "GroupConsolidator":
+        """
+        group_id のうち predicate を満たす行を new_id に分ける指示を追加する。
+        new_id を省略すると "{group_id}_SPLIT"。
+        group_id は統合後の名前で指定する (merge(["G4", "G5"], new_id="G45") の後は "G45"。
+        new_id なしの統合なら残った方のID)。apply() のときに見つからなければ KeyError。
+        """
+        self._splits.append((group_id, predicate, new_id if new_id is not None else f"{group_id}_SPLIT"))
+        return self
+
+    def apply(self) -> pd.DataFrame:
+        """
+        すべての指示を反映した DataFrame (コピー) を返す。
+        """
+        roots = self._uf.roots()
+        root_names = np.empty(len(self.group_ids), dtype=object)
+        for root, name in self._name_of.items():
+            root_names[root] = name
+        names = root_names[roots]
+
+        # ID が欠損の行 (コード -1) はどのグループにも属さない
+        valid = self.codes >= 0
+        row_roots = np.where(valid, roots[np.maximum(self.codes, 0)], -1)
+        labels = np.where(valid, names[np.maximum(self.codes, 0)], None).astype(object)
+
+        if self._splits:
+            # 代表コードごとの行位置 (安定ソート) を1回だけ作り、各分割は対象グループの行だけを見る
+            order = np.argsort(row_roots, kind="stable")
+            sorted_roots = row_roots[order]
+            for group_id, predicate, new_id in self._splits:
+                # 同じ名前になったグループは合わせて1つとして扱う
+                if group_id not in self._roots_of:
+                    raise KeyError(f"Group {group_id!r} to split does not exist after the merges.")
+                positions = np.concatenate([
+                    order[slice(*np.searchsorted(sorted_roots, [root, root + 1]))]
+                    for root in sorted(self._roots_of[group_id])
+                ])
+                mask = self._evaluate(predicate, positions)
+                labels[positions[mask]] = new_id
+
+        df = self.df.copy()
+        df[self.id_col] = labels
+        return df
+
+    def _evaluate(self, predicate: SplitPredicate, positions: np.ndarray) -> np.ndarray:
+        if isinstance(predicate, dict):
+            mask = np.ones(len(positions), dtype=bool)
+            for col, value in predicate.items():
+                values = self.df[col].to_numpy()[positions]
+                if isinstance(value, (list, tuple, set)):
+                    mask &= pd.Series(values).isin(list(value)).to_numpy()
+                else:
+                    mask &= values == value
+            return mask
+        if callable(predicate):
+            return np.asarray(predicate(self.df.iloc[positions]), dtype=bool)
+        return np.asarray(predicate, dtype=bool)[positions]
+
 def merge_groups(df: pd.DataFrame, old_ids: List[str], new_id: str) -> pd.DataFrame:
     """
     指定された複数の old_ids (LLMGroupID or FinalGroupID) を一つの new_id に統合する。
     例: merge_groups(df, old_ids=["G1","G2"], new_id="G1_G2_MERGED")
+    多数の統合・分割をまとめて反映する場合は GroupConsolidator を使う。
 
     Parameters:
         df (pd.DataFrame): "FinalGroupID" 列を持つDataFrame
         old_ids (List[str]): 統合対象となるIDのリスト
         new_id (str): 統合後のID
     """
-    df = df.copy()
-    if "FinalGroupID" not in df.columns:
-        raise ValueError("DataFrame does not contain FinalGroupID column.")
-
-    mask = df["FinalGroupID"].isin(old_ids)
-    df.loc[mask, "FinalGroupID"] = new_id
-    return df
+    # 従来どおり、存在しないIDは無視する
+    if "FinalGroupID" in df.columns:
+        old_ids = [gid for gid in old_ids if gid in set(df["FinalGroupID"].dropna())]
+    return GroupConsolidator(df).merge(old_ids, new_id=new_id).apply()
 
 def split_group(
     df: pd.DataFrame, group_to_split: str, condition_func
@@ -70,6 +206,7 @@ def split_group(
     """
     1つの FinalGroupID にまとめられているレコードを、condition_func に従って2つに分割する例。
     たとえば "郵便番号が特定値なら別グループ" などの独自ロジックを condition_func で判定。
+    多数の統合・分割をまとめて反映する場合は GroupConsolidator を使う。
 
     Parameters:
         df (pd.DataFrame): "FinalGroupID" 列を持つDataFrame
@@ -79,18 +216,12 @@ def split_group(
     Returns:
         pd.DataFrame
     """
-    df = df.copy()
-    if "FinalGroupID" not in df.columns:
-        raise ValueError("DataFrame does not contain FinalGroupID column.")
+    # 従来どおり、存在しないグループを指定した場合は何も変えない
+    if "FinalGroupID" in df.columns and not (df["FinalGroupID"] == group_to_split).any():
+        return df.copy()
 
-    # 対象レコードを抽出
-    target_mask = (df["FinalGroupID"] == group_to_split)
+    # condition_func は1行ずつの関数なので、対象グループの行にだけ適用する
+    def predicate(df_group: pd.DataFrame) -> pd.Series:
+        return df_group.apply(condition_func, axis=1)
 
-    # condition_func(row) が True の行だけ別グループ ID を振る
-    new_id = group_to_split + "_SPLIT"
-    for idx in df[target_mask].index:
-        row = df.loc[idx]
-        if condition_func(row):
-            df.at[idx, "FinalGroupID"] = new_id
-
-    return df
+    return GroupConsolidator(df).split(group_to_split, predicate).apply()
@@ -0,0 +1,140 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Callable, List, Optional
+
+from llm_matching import perform_llm_matching
+
+# 通り名の種別・方角を USPS 標準の略語にそろえる
+STREET_ABBREVIATIONS = {
+    "STREET": "ST", "STR": "ST",
+    "AVENUE": "AVE", "AV": "AVE", "AVN": "AVE",
+    "ROAD": "RD",
+    "DRIVE": "DR", "DRV": "DR",
+    "BOULEVARD": "BLVD", "BOUL": "BLVD",
+    "HIGHWAY": "HWY", "HIWAY": "HWY",
+    "LANE": "LN",
+    "COURT": "CT",
+    "PLACE": "PL",
+    "PARKWAY": "PKWY", "PKY": "PKWY",
+    "CIRCLE": "CIR",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+    "TURNPIKE": "TPKE",
+    "EXPRESSWAY": "EXPY",
+    "FREEWAY": "FWY",
+    "SQUARE": "SQ",
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+    "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+
+# 部屋番号などの前に付く語
+UNIT_DESIGNATORS = {
+    "SUITE", "STE", "UNIT", "APT", "APARTMENT", "RM", "ROOM",
+    "BLDG", "BUILDING", "FL", "FLOOR", "DEPT", "#"
+}
+
+_TOKEN_RE = re.compile(r"#|[A-Z0-9]+")
+_HOUSE_NUMBER_RE = re.compile(r"^\d+[A-Z]?$")
+_ZIP5_RE = re.compile(r"^(\d{5})")
+
+def build_match_key(address1: str, address2: str, postal_code: str) -> Optional[str]:
+    """
+    1行分の住所から、照合用の正規化キー "番地|ZIP5|通り名|部屋番号" を作る。
+    番地または5桁の郵便番号が取れない場合は、確実な照合ができないので None を返す。
+
+    例: ("12301 Patrick Henry Highway", "Suite 100", "23002-1234")
+        -> "12301|23002|PATRICK HENRY HWY|100"
+    """
+    zip_match = _ZIP5_RE.match(_as_text(postal_code).strip())
+    if zip_match is None:
+        return None
+
+    tokens = _TOKEN_RE.findall(_as_text(address1).upper())
+    if not tokens or not _HOUSE_NUMBER_RE.match(tokens[0]):
+        return None
+    house_number = tokens[0]
+
+    # 番地の後ろから、部屋番号の指示語が出るまでを通り名とする
+    street_tokens: List[str] = []
+    unit_tokens: List[str] = []
+    rest = tokens[1:]
+    for pos, token in enumerate(rest):
+        if token in UNIT_DESIGNATORS:
+            unit_tokens = [t for t in rest[pos + 1:] if t not in UNIT_DESIGNATORS]
+            break
+        street_tokens.append(STREET_ABBREVIATIONS.get(token, token))
+
+    # Address2 は部屋番号として扱う ("Suite 100" -> "100")
+    address2_tokens = [t for t in _TOKEN_RE.findall(_as_text(address2).upper()) if t not in UNIT_DESIGNATORS]
+    if address2_tokens:
+        unit_tokens = address2_tokens
+
+    if not street_tokens:
+        return None
+
+    return "|".join([house_number, zip_match.group(1), " ".join(street_tokens), " ".join(unit_tokens)])
+
+def build_match_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    DataFrame の各行について build_match_key を計算した Series (index は df と同じ) を返す。
+    """
+    columns = [
+        df[col].tolist() if col in df.columns else [""] * len(df)
+        for col in ["Address1", "Address2", "PostalCode"]
+    ]
+    keys = [build_match_key(a1, a2, pc) for a1, a2, pc in zip(*columns)]
+    return pd.Series(keys, index=df.index, dtype=object)
+
+def perform_rule_matching(
+    df: pd.DataFrame,
+    match_func: Callable[[pd.DataFrame], pd.DataFrame] = perform_llm_matching
+) -> pd.DataFrame:
+    """
+    正規化キーが一致する行をその場で同一グループ ("Rule_{n}") にまとめ、
+    残りの行だけを match_func (既定は perform_llm_matching) に渡す。
+
+    match_func には残りの行に加えて各ルールグループの代表1行も渡す。
+    代表行に付いたIDはそのグループの全行に反映されるので、
+    キーが作れなかった行 (郵便番号なし等) も既存のルールグループに合流できる。
+
+    Returns:
+        pd.DataFrame: "LLMGroupID" 列を追加したDataFrame (行順・index は入力のまま)
+    """
+    if len(df) < 2:
+        return match_func(df)
+
+    keys = build_match_keys(df)
+    key_sizes = keys.map(keys.value_counts())
+    in_rule_group = keys.notna() & (key_sizes >= 2)
+
+    df_result = df.copy()
+    df_result["LLMGroupID"] = None
+
+    rule_codes, _ = pd.factorize(keys[in_rule_group])
+    df_result.loc[in_rule_group, "LLMGroupID"] = [f"Rule_{code}" for code in rule_codes]
+
+    leftover = ~in_rule_group
+    if not leftover.any():
+        return df_result
+
+    # 残りの行 + 各ルールグループの代表行をまとめて match_func へ
+    rep_mask = in_rule_group & ~df_result["LLMGroupID"].duplicated()
+    send_positions = np.flatnonzero((leftover | rep_mask).to_numpy())
+    df_matched = match_func(df.iloc[send_positions])
+    matched_ids = df_matched["LLMGroupID"]
+
+    # 代表行のIDをルールグループ全体へ
+    rep_ids = df_result.loc[rep_mask, "LLMGroupID"]
+    rule_to_matched = dict(zip(rep_ids, matched_ids.loc[rep_ids.index]))
+    df_result.loc[in_rule_group, "LLMGroupID"] = df_result.loc[in_rule_group, "LLMGroupID"].map(rule_to_matched)
+
+    leftover_index = df_result.index[leftover.to_numpy()]
+    df_result.loc[leftover_index, "LLMGroupID"] = matched_ids.loc[leftover_index]
+
+    return df_result
+
+def _as_text(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return str(value)
@@ -1,95 +1,476 @@
+import os
+import warnings
+import numpy as np
 import pandas as pd
+from functools import partial
+from typing import Optional, Tuple
 
-from data_ingestion import load_customer_data
-from data_cleaning_formatting import clean_and_format_data
-from address_normalization import normalize_addresses
-from preliminary_grouping import preliminary_grouping
-from llm_matching import perform_llm_matching
-from review_consolidation import review_and_consolidate
-from group_id_unifier import unify_local_group_ids
+from stage_cache import load_normalized_data, file_hash, make_cache_key
+from checkpoint_journal import ChunkJournal, DEFAULT_CHECKPOINT_DIR, checkpoint_available
+from duplicate_collapse import collapse_exact_duplicates, expand_exact_duplicates
+from preliminary_grouping import iter_chunk_blocks, materialize_block
+from llm_matching import LLMMatcher, perform_llm_matching
+from llm_cache import LLMResponseCache, DEFAULT_CACHE_PATH
+from llm_batch import BatchCollector, BatchResultMatcher, OpenAIBatchBackend, run_batch, DEFAULT_BATCH_DIR
+from rule_matching import perform_rule_matching
+from local_similarity import perform_local_matching, DEFAULT_LOW_THRESHOLD, DEFAULT_HIGH_THRESHOLD
+from llm_dispatch import (
+    RateLimiter, dispatch_chunks, estimate_row_tokens,
+    PROMPT_OVERHEAD_TOKENS, BLOCK_HEADER_TOKENS
+)
+from pipeline_metrics import PipelineMetrics
+from review_consolidation import review_and_consolidate, REVIEW_SIGNAL_COLUMNS
+from group_id_unifier import GroupIdAllocator, render_group_ids
+from incremental_matching import load_master, match_delta, MASTER_ID_COL
+from chunk_reconciliation import reconcile_split_blocks
+from result_writer import write_results, write_review_excel
 
-def run_end_to_end(csv_path: str):
+# Address Normalization で使う辞書
+CITY_MAP = {"RALIEGH": "RALEIGH"}
+STATE_MAP = {"VA": "VIRGINIA"}
+ADDRESS_MAP = {"St.": "Street"}
+
+# 出力先
+DEFAULT_OUTPUT_DIR = "result"
+DEFAULT_REVIEW_EXCEL = "result_review.xlsx"
+
+def run_end_to_end(
+    csv_path: str,
+    use_cache: bool = True,
+    similarity_thresholds: Optional[Tuple[float, float]] = (DEFAULT_LOW_THRESHOLD, DEFAULT_HIGH_THRESHOLD),
+    use_rules: bool = True,
+    max_concurrency: int = 8,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    max_retries: int = 5,
+    llm_cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+    batch_mode: bool = False,
+    batch_backend=None,
+    batch_dir: str = DEFAULT_BATCH_DIR,
+    chunk_token_budget: Optional[int] = 3000,
+    max_chunk_size: int = 100,
+    checkpoint_dir: Optional[str] = DEFAULT_CHECKPOINT_DIR,
+    resume: bool = False,
+    reconcile: bool = True,
+    memory_report: bool = False,
+    trace_allocations: bool = False,
+    output_path: str = DEFAULT_OUTPUT_DIR,
+    output_format: str = "parquet",
+    review_excel_path: Optional[str] = DEFAULT_REVIEW_EXCEL,
+    metrics_log_path: Optional[str] = None,
+    prometheus_path: Optional[str] = None,
+    llm_prices: Optional[Tuple[float, float]] = None
+):
     """
-    一連の処理を実施し、最終的な結果をExcelに出力。
+    一連の処理を実施し、最終的な結果を出力する。
     - LLMGroupID が二重化しないよう修正し、各チャンク結合はaxis=0
+    - use_cache=True の場合、Cleaning / Normalization の結果をステージキャッシュから再利用する
+    - similarity_thresholds=(low, high) の場合、チャンク内の局所類似度で確実なものは自動確定し、
+      不確実な行だけを LLM に送る (None で無効化し、チャンク全体を LLM に送る)
+    - use_rules=True の場合、さらにその前段で正規化キー (番地 + ZIP5 + 通り名 + 部屋番号) が
+      一致する行を LLM を通さずにまとめる
+    - チャンクは最大 max_concurrency 並列で LLM に送る。requests_per_minute / tokens_per_minute で
+      API の予算を制限し、429 / 5xx は最大 max_retries 回まで指数バックオフで再試行する。
+    - グループIDは全チャンクの (チャンク番号, ローカル LLMGroupID) を GroupIdAllocator で1回で採番する。
+      チャンクの完了順に依存しないので、並行実行・再開でも逐次実行と同じIDになる
+    - llm_cache_path を指定すると、LLM の回答を SQLite ファイルに保存し、再実行時に同じチャンクは API を呼ばない
+      (None でキャッシュしない)
+    - batch_mode=True の場合、LLM に送る全チャンクのプロンプトを Batch API の JSONL (custom_id = チャンクID) に
+      書き出して一括投入し、完了後に結果ファイルを通常と同じ JSON パース・グループID採番の経路で取り込む。
+      batch_backend を省略すると OpenAI Batch API を使う (オフライン検証には llm_batch.LocalBatchBackend)
+    - チャンクは1リクエストの推定トークン数が chunk_token_budget 以内 (かつ max_chunk_size 行以内) になるように詰める
+      (None の場合は max_chunk_size 行ごとに分割する)
+    - checkpoint_dir を指定すると、各チャンクの結果 (ローカル LLMGroupID) をチェックポイントに追記していく。
+      resume=True なら記録済みのチャンクは読み込むだけで LLM に送らず、続きから同じグループIDで処理する
+      (入力ファイルや設定 (LLM のモデル・プロンプトの形式とテンプレート・構造化出力・聞き直し回数を含む) が違う場合はエラー)
+    - reconcile=True の場合、複数チャンクに分割されたブロックについて、各グループの代表行どうしを
+      もう一度照合し、チャンクをまたいだ同一住所のグループを統合する (chunk_reconciliation)
+    - 読み込んだ DataFrame は各ステージでコピーせずに書き換えていき (copy=False)、全件のコピーを複数持たない。
+    - 進捗は print ではなく PipelineMetrics の構造化ログ (JSON Lines) で出す。metrics_log_path を省略すると標準出力。
+      ステージごとの処理時間・行数・rows/sec・RSS・peak RSS、LLM 呼び出しごとのレイテンシ・トークン数・再試行、
+      Fallback / 救済の件数、キャッシュのヒット率を記録し、prometheus_path を指定すると Prometheus の textfile にも書く
+      (llm_prices=(入力, 出力) [USD / 100万トークン] で推定コストも出す)。
+      memory_report=True の場合、ステージごとのメモリの表も最後に表示する
+      (trace_allocations=True なら tracemalloc でステージごとの確保量も測る。遅くなるので調査用)
+    - 結果は output_path ディレクトリに CountryName / StateName ごとに分けて output_format ("parquet" / "csv") で書く
+      (result_writer)。review_excel_path を指定すると、NeedsReview の行だけをレビュー用の Excel にも書く
+      (None で Excel を作らない)
     """
-    # 1. Data Ingestion
-    df_raw = load_customer_data(csv_path)
-    print(f"=== Loaded data: {len(df_raw)} rows ===")
-
-    # 2. Cleaning & Formatting
-    df_cleaned = clean_and_format_data(df_raw)
-    print(f"=== After Cleaning & Formatting: {len(df_cleaned)} rows ===")
-
-    # 3. Address Normalization
-    city_map = {"RALIEGH": "RALEIGH"}
-    state_map = {"VA": "VIRGINIA"}
-    address_map = {"St.": "Street"}
-
-    df_normalized = normalize_addresses(
-        df_cleaned,
-        city_map=city_map,
-        state_map=state_map,
-        address_map=address_map
-    )
-    print(f"=== After Normalization: {len(df_normalized)} rows ===")
+    metrics = PipelineMetrics(log_path=metrics_log_path, llm_prices=llm_prices, trace_allocations=trace_allocations)
+    metrics.log("run_start", pipeline="end_to_end", csv_path=csv_path)
 
-    # 4. Preliminary Grouping
-    sub_dfs = preliminary_grouping(df_normalized, max_chunk_size=50)
-    print(f"=== Preliminary Grouping => {len(sub_dfs)} chunks ===")
+    # 1-3. Data Ingestion → Cleaning & Formatting → Address Normalization
+    city_map = CITY_MAP
+    state_map = STATE_MAP
+    address_map = ADDRESS_MAP
 
-    # 5. LLM Matching + unify group IDs
-    matched_chunks = []
-    global_id_counter = 1  # 全チャンクを通じてユニークなIDをつけるためのカウンタ
-
-    for i, sub_df in enumerate(sub_dfs, start=1):
-        # 2件未満ならLLM呼び出し不要
-        if len(sub_df) < 2:
-            sub_df = sub_df.copy()
-            sub_df["LLMGroupID"] = [f"Single_{i}"] * len(sub_df)
-        else:
-            sub_df = perform_llm_matching(sub_df)
-
-        # まず「ローカル LLMGroupID」を「UnifiedGroupID」に変換し、かぶりを防ぐ
-        sub_df, global_id_counter = unify_local_group_ids(
-            df=sub_df,
-            local_id_col="LLMGroupID",
-            global_id_col="UnifiedGroupID",
-            start_count=global_id_counter,
-            prefix="G"
+    with metrics.stage("load + clean + normalize") as stage:
+        df_normalized = load_normalized_data(
+            csv_path,
+            city_map=city_map,
+            state_map=state_map,
+            address_map=address_map,
+            use_cache=use_cache
         )
+        stage["rows"] = len(df_normalized)
+
+    # 3.5 完全一致の重複住所をまとめ、LLM には代表行だけを送る
+    # (df_members は df_normalized そのものに DedupKey を足したもの)
+    with metrics.stage("collapse duplicates") as stage:
+        df_reps, df_members = collapse_exact_duplicates(df_normalized, copy=False)
+        stage.update(rows=len(df_members), distinct_addresses=len(df_reps))
+    del df_normalized
+
+    # 4. Preliminary Grouping (行位置だけを持つ軽量なブロックを作り、データは処理時に切り出す)
+    token_budget = None
+    if chunk_token_budget is not None:
+        token_budget = max(1, chunk_token_budget - PROMPT_OVERHEAD_TOKENS - BLOCK_HEADER_TOKENS)
+    with metrics.stage("preliminary grouping") as stage:
+        blocks = list(iter_chunk_blocks(
+            df_reps,
+            max_chunk_size=max_chunk_size,
+            token_budget=token_budget,
+            token_estimator=estimate_row_tokens
+        ))
+        stage.update(rows=len(df_reps), chunks=len(blocks))
+
+    # 5. LLM Matching + unify group IDs
+    # API クライアントとプロンプトテンプレートは全チャンクで1つを共有する
+    # レート制限の予算確保と 429 / 5xx の再試行は、聞き直しを含む API 呼び出し1回ごとに行う
+    llm_cache = LLMResponseCache(llm_cache_path) if llm_cache_path else None
+    matcher = LLMMatcher(
+        cache=llm_cache,
+        metrics=metrics,
+        limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+        max_retries=max_retries,
+        on_retry=metrics.record_retry
+    )
+
+    # チェックポイントのキーには LLM の設定 (モデル・プロンプト・聞き直し回数など) も含める
+    journal = None
+    if checkpoint_dir and not checkpoint_available():
+        warnings.warn("pyarrow が見つからないため、チェックポイントを使わずに処理します。")
+        checkpoint_dir = None
+    if checkpoint_dir:
+        run_key = make_cache_key(file_hash(csv_path), "llm_matching", {
+            "maps": [city_map, state_map, address_map],
+            "similarity_thresholds": similarity_thresholds,
+            "use_rules": use_rules,
+            "chunk_token_budget": chunk_token_budget,
+            "max_chunk_size": max_chunk_size,
+            "batch_mode": batch_mode,
+            "llm": matcher.settings()
+        })
+        journal = ChunkJournal(checkpoint_dir, run_key, resume=resume)
+        if journal.completed:
+            metrics.log("resume", completed_chunks=len(journal.completed), chunks=len(blocks))
+
+    chain = partial(
+        build_match_func,
+        similarity_thresholds=similarity_thresholds,
+        use_rules=use_rules
+    )
+
+    with metrics.stage("matching") as stage:
+        batch_matcher = None
+        try:
+            if batch_mode:
+                # (a) LLM に送るプロンプトを集める (API は呼ばない)
+                collector = BatchCollector(cache=llm_cache)
+                collect_func = chain(partial(perform_llm_matching, matcher=collector))
+                for chunk_no, block in enumerate(blocks):
+                    if journal is not None and journal.is_done(chunk_no):
+                        continue
+                    collector.chunk_id = f"chunk-{chunk_no}"
+                    match_chunk(materialize_block(df_reps, block), collect_func)
 
-        # ここで元の LLMGroupID は不要なので削除 or rename
-        #   -> rename columns={"UnifiedGroupID": "LLMGroupID"}
-        #      ただし元の LLMGroupID を残さないように drop
-        sub_df.drop(columns=["LLMGroupID"], inplace=True, errors="ignore")
-        sub_df.rename(columns={"UnifiedGroupID": "LLMGroupID"}, inplace=True)
+                # (b) Batch API に投入して結果を待つ
+                backend = batch_backend if batch_backend is not None else OpenAIBatchBackend(matcher.client)
+                results = run_batch(collector.requests, backend, batch_dir=batch_dir, on_event=metrics.log)
 
-        # 加工したチャンクをリストに格納
-        matched_chunks.append(sub_df)
+                # (c) 結果を回答として、通常と同じ経路でもう一度マッチングする
+                batch_matcher = BatchResultMatcher(collector.custom_ids, results, cache=llm_cache)
+                match_func = chain(partial(perform_llm_matching, matcher=batch_matcher))
+            else:
+                match_func = chain(partial(perform_llm_matching, matcher=matcher))
 
-    # 全チャンクを「縦方向に」結合
-    df_matched_all = pd.concat(matched_chunks, axis=0).reset_index(drop=True)
+            matched_chunks = []
+            allocator = GroupIdAllocator()
 
-    # 万一重複カラムが発生した場合の保険
-    df_matched_all = df_matched_all.loc[:, ~df_matched_all.columns.duplicated()].copy()
+            # チャンクは並行に処理されるが、結果はチャンク順に返ってくる
+            # (チェックポイントに記録済みのチャンクは送らない)
+            sub_dfs = (
+                materialize_block(df_reps, block)
+                for chunk_no, block in enumerate(blocks)
+                if journal is None or not journal.is_done(chunk_no)
+            )
+            matched_sub_dfs = dispatch_chunks(
+                sub_dfs,
+                partial(match_chunk, match_func=match_func),
+                max_concurrency=max_concurrency
+            )
 
-    print(f"=== LLM Matching + unify done. Combined rows: {len(df_matched_all)} ===")
+            for chunk_no in range(len(blocks)):
+                if journal is not None and journal.is_done(chunk_no):
+                    # 記録済みのチャンクは結果を読み込むだけ
+                    sub_df = journal.load(chunk_no)
+                    sub_df = sub_df.astype({col: df_reps[col].dtype for col in df_reps.columns if col in sub_df.columns})
+                else:
+                    sub_df = next(matched_sub_dfs)
+                    if journal is not None:
+                        journal.record(chunk_no, sub_df)
+
+                # ローカル LLMGroupID のまま集めておき、全体のIDは最後にまとめて振る
+                allocator.add(chunk_no, sub_df["LLMGroupID"])
+                matched_chunks.append(sub_df)
+
+            # 全チャンクを「縦方向に」結合し、(チャンク番号, ローカルID) を1回で int64 のグループ番号にする
+            # ("G123" 形式の文字列にするのは出力直前)
+            df_matched_reps = pd.concat(matched_chunks, axis=0)
+            df_matched_reps["LLMGroupID"] = allocator.allocate()
+
+            # 5.5 複数チャンクに分割されたブロックで、チャンクをまたいだ同一住所のグループを統合
+            if reconcile:
+                chunk_ids = pd.Series(
+                    np.concatenate([np.full(len(chunk), n) for n, chunk in enumerate(matched_chunks)]),
+                    index=df_matched_reps.index
+                )
+                # Batch モードでは追加の API 呼び出しをせず、ルール照合・局所類似度で確実なものだけ統合する
+                reconcile_func = chain(_keep_separate) if batch_mode else match_func
+                df_matched_reps, num_merges = reconcile_split_blocks(
+                    df_matched_reps,
+                    chunk_ids,
+                    partial(match_chunk, match_func=reconcile_func),
+                    max_chunk_size=max_chunk_size,
+                    token_budget=token_budget,
+                    token_estimator=estimate_row_tokens,
+                    max_concurrency=max_concurrency
+                )
+                df_matched_reps["LLMGroupID"] = df_matched_reps["LLMGroupID"].astype(np.int64)
+                stage["reconcile_merges"] = num_merges
+            stage["rows"] = len(df_matched_reps)
+        finally:
+            matcher.close()
+            _record_llm_stats(metrics, batch_matcher or matcher, llm_cache)
+
+    # 代表行のグループIDを、同じ住所の全行へ展開
+    with metrics.stage("expand duplicates") as stage:
+        df_matched_all = expand_exact_duplicates(df_matched_reps, df_members, copy=False)
+        df_matched_all.reset_index(drop=True, inplace=True)
+        stage["rows"] = len(df_matched_all)
+    del df_members
 
     # 6. Review & Consolidation
-    df_final = review_and_consolidate(
-        df_matched_all,
-        suspicious_threshold=50,
-        mark_singleton=False
+    with metrics.stage("review") as stage:
+        df_final = review_and_consolidate(
+            df_matched_all,
+            suspicious_threshold=50,
+            mark_singleton=False,
+            copy=False
+        )
+        stage.update(rows=len(df_final), review_rows=int(df_final["NeedsReview"].sum()))
+
+    with metrics.stage("output") as stage:
+        # グループ番号を "G123" 形式に
+        for col in ["LLMGroupID", "FinalGroupID"]:
+            df_final[col] = render_group_ids(df_final[col], prefix="G")
+
+        # 結果をパーティションごとに出力し、レビュー対象だけ Excel にする
+        output_files = write_results(df_final, output_path, fmt=output_format)
+        stage.update(rows=len(df_final), output_path=output_path, files=len(output_files))
+        if review_excel_path:
+            stage["review_excel_path"] = review_excel_path
+            stage["review_excel_rows"] = write_review_excel(df_final, review_excel_path)
+
+    _finish_run(metrics, prometheus_path)
+    if memory_report:
+        metrics.tracker.print_report()
+
+    return df_final
+
+def run_incremental(
+    master_path: str,
+    delta_csv_path: str,
+    output_path: str = DEFAULT_OUTPUT_DIR,
+    use_cache: bool = True,
+    similarity_thresholds: Optional[Tuple[float, float]] = (DEFAULT_LOW_THRESHOLD, DEFAULT_HIGH_THRESHOLD),
+    use_rules: bool = True,
+    max_concurrency: int = 8,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    max_retries: int = 5,
+    llm_cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+    chunk_token_budget: Optional[int] = 3000,
+    max_chunk_size: int = 100,
+    output_format: str = "parquet",
+    review_excel_path: Optional[str] = DEFAULT_REVIEW_EXCEL,
+    metrics_log_path: Optional[str] = None,
+    prometheus_path: Optional[str] = None,
+    llm_prices: Optional[Tuple[float, float]] = None
+):
+    """
+    既存のマスタ (前回の出力ディレクトリや Excel など、FinalGroupID 付き) に、新しく届いた行 (delta_csv_path) だけを追加する。
+    - 新しい行だけを Cleaning / Normalization し、既存グループの代表1行ずつと同じブロックキーで照合する
+      (incremental_matching.match_delta)
+    - LLM に送るのは新しい行と、その候補になる既存グループの代表行だけ
+    - 既存行の FinalGroupID は変えず、新しいグループには既存と重ならない番号を振る
+    - マスタ + 新しい行を run_end_to_end と同じ形式で output_path に書き出す (NeedsReview は全体で付け直す)。
+      master_path と同じ場所は指定できない
+    - 計測・ログ (metrics_log_path / prometheus_path / llm_prices) は run_end_to_end と同じ
+    """
+    if os.path.abspath(output_path) == os.path.abspath(master_path):
+        raise ValueError("output_path must differ from master_path.")
+    metrics = PipelineMetrics(log_path=metrics_log_path, llm_prices=llm_prices)
+    metrics.log("run_start", pipeline="incremental", master_path=master_path, csv_path=delta_csv_path)
+
+    with metrics.stage("load master") as stage:
+        df_master = load_master(master_path)
+        stage["rows"] = len(df_master)
+    with metrics.stage("load + clean + normalize") as stage:
+        df_new = load_normalized_data(
+            delta_csv_path,
+            city_map=CITY_MAP,
+            state_map=STATE_MAP,
+            address_map=ADDRESS_MAP,
+            use_cache=use_cache
+        )
+        stage["rows"] = len(df_new)
+
+    llm_cache = LLMResponseCache(llm_cache_path) if llm_cache_path else None
+    matcher = LLMMatcher(
+        cache=llm_cache,
+        metrics=metrics,
+        limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+        max_retries=max_retries,
+        on_retry=metrics.record_retry
+    )
+    match_func = build_match_func(
+        partial(perform_llm_matching, matcher=matcher),
+        similarity_thresholds=similarity_thresholds,
+        use_rules=use_rules
     )
-    print("=== Review & Consolidation done. ===")
 
-    # 結果を Excel 出力
-    df_final.to_excel("result.xlsx", index=False)
-    print("Output saved to result.xlsx")
+    token_budget = None
+    if chunk_token_budget is not None:
+        token_budget = max(1, chunk_token_budget - PROMPT_OVERHEAD_TOKENS - BLOCK_HEADER_TOKENS)
 
+    with metrics.stage("matching") as stage:
+        try:
+            df_new_matched = match_delta(
+                df_master,
+                df_new,
+                match_func,
+                max_chunk_size=max_chunk_size,
+                token_budget=token_budget,
+                token_estimator=estimate_row_tokens,
+                max_concurrency=max_concurrency
+            )
+        finally:
+            matcher.close()
+            _record_llm_stats(metrics, matcher, llm_cache)
+        num_existing = int(df_new_matched[MASTER_ID_COL].isin(df_master[MASTER_ID_COL]).sum())
+        stage.update(
+            rows=len(df_new_matched),
+            joined_existing_rows=num_existing,
+            new_group_rows=len(df_new_matched) - num_existing
+        )
+
+    # マスタと結合し、NeedsReview とレビュー用シグナルはグループサイズが変わるので全体で付け直す
+    review_cols = ["NeedsReview"] + REVIEW_SIGNAL_COLUMNS
+    with metrics.stage("review") as stage:
+        df_final = pd.concat(
+            [df_master.drop(columns=review_cols, errors="ignore"), df_new_matched],
+            axis=0,
+            ignore_index=True
+        )
+        df_review = review_and_consolidate(
+            df_final.assign(LLMGroupID=df_final[MASTER_ID_COL]),
+            suspicious_threshold=50,
+            mark_singleton=False
+        )
+        for col in review_cols:
+            if col in df_review.columns:
+                df_final[col] = df_review[col].to_numpy()
+        stage.update(rows=len(df_final), review_rows=int(df_final["NeedsReview"].sum()))
+
+    with metrics.stage("output") as stage:
+        output_files = write_results(df_final, output_path, fmt=output_format)
+        stage.update(rows=len(df_final), output_path=output_path, files=len(output_files))
+        if review_excel_path:
+            stage["review_excel_path"] = review_excel_path
+            stage["review_excel_rows"] = write_review_excel(df_final, review_excel_path)
+
+    _finish_run(metrics, prometheus_path)
     return df_final
 
+def _record_llm_stats(
+    metrics: PipelineMetrics,
+    matcher: LLMMatcher,
+    llm_cache: Optional[LLMResponseCache]
+) -> None:
+    """
+    LLMMatcher の集計 (リクエスト数・救済・再リクエスト・Fallback の件数) とキャッシュのヒット率を記録し、
+    キャッシュを閉じる。
+    """
+    fields = {f"matcher_{key}": value for key, value in matcher.stats.items()}
+    metrics.add_counts("matcher", matcher.stats)
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        metrics.add_counts("llm_cache", {key: stats[key] for key in ["hits", "misses", "evictions"]})
+        metrics.set_gauge("llm_cache_hit_rate", stats["hit_rate"])
+        fields.update({f"llm_cache_{key}": value for key, value in stats.items()})
+        llm_cache.close()
+    metrics.log("llm_summary", **fields)
+
+def _finish_run(metrics: PipelineMetrics, prometheus_path: Optional[str]) -> None:
+    """
+    実行全体の集計を "run_end" イベントとして出し、指定があれば Prometheus の textfile を書く。
+    """
+    summary = metrics.summary()
+    if summary["peak_rss_mb"] is not None:
+        metrics.set_gauge("peak_rss_bytes", summary["peak_rss_mb"] * 1024 * 1024)
+    metrics.log(
+        "run_end",
+        seconds=sum(stage["seconds"] for stage in summary["stages"].values()),
+        peak_rss_mb=summary["peak_rss_mb"],
+        llm_cost_usd=summary["llm_cost_usd"],
+        counters=summary["counters"]
+    )
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+    metrics.close()
+
+def build_match_func(llm_func, similarity_thresholds=None, use_rules=True):
+    """
+    LLM 呼び出し関数 llm_func の前段に、ルール照合・局所類似度クラスタリングをつなげる
+    (ルール → 局所類似度 → LLM の順)。bench_pipeline もこれを使い、本体と同じ経路を計測する。
+    """
+    match_func = llm_func
+    if similarity_thresholds is not None:
+        low, high = similarity_thresholds
+        match_func = partial(perform_local_matching, match_func=match_func, low=low, high=high)
+    if use_rules:
+        match_func = partial(perform_rule_matching, match_func=match_func)
+    return match_func
+
+def _keep_separate(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    LLM を使わない代わりに、渡された行をすべて別グループにする。
+    """
+    df = df.copy()
+    df["LLMGroupID"] = [f"Separate_{i}" for i in range(len(df))]
+    return df
+
+def match_chunk(sub_df: pd.DataFrame, match_func) -> pd.DataFrame:
+    """
+    1チャンク分のマッチング。2件未満なら LLM 呼び出し不要。
+    """
+    if len(sub_df) < 2:
+        sub_df = sub_df.copy()
+        sub_df["LLMGroupID"] = [f"Single_{i}" for i in range(len(sub_df))]
+        return sub_df
+    return match_func(sub_df)
+
 if __name__ == "__main__":
     csv_file_path = "customer_data.csv"
     df_result = run_end_to_end(csv_file_path)
@@ -1,18 +1,20 @@
 import pandas as pd
 from run_preliminary_grouping import run_preliminary_grouping
-from llm_matching import perform_llm_matching
+from llm_matching import LLMMatcher, perform_llm_matching
 
-def run_llm_matching_demo(csv_path: str):
+def run_llm_matching_demo(csv_path: str, use_cache: bool = True):
     """
     Preliminary Grouping => 先頭のチャンクを順に LLM Matching => 
     2件以上同一グループになったサブDataFrameのみ上位10件を表示
     """
-    sub_dfs = run_preliminary_grouping(csv_path)
+    sub_dfs = run_preliminary_grouping(csv_path, use_cache=use_cache)
     if not sub_dfs:
         print("No sub DataFrames generated.")
         return
 
     displayed_count = 0
+    # クライアント・プロンプトテンプレートは全チャンクで共有
+    matcher = LLMMatcher()
 
     for i, sub_df in enumerate(sub_dfs, start=1):
         # サブDataFrameが1行だけの場合はスキップ（そもそもグルーピングできない）
@@ -20,7 +22,7 @@ def run_llm_matching_demo(csv_path: str):
             continue
 
         # LLMでマッチング実行
-        df_matched = perform_llm_matching(sub_df)
+        df_matched = perform_llm_matching(sub_df, matcher=matcher)
 
         # グループIDごとの件数を集計
         group_sizes = df_matched.groupby("LLMGroupID").size()
@@ -35,6 +37,8 @@ def run_llm_matching_demo(csv_path: str):
             if displayed_count == 10:
                 break
 
+    matcher.close()
+
     if displayed_count == 0:
         print("No chunk had 2 or more addresses grouped together by LLM.")
 
@@ -1,22 +1,15 @@
 import pandas as pd
-from data_ingestion import load_customer_data
-from data_cleaning_formatting import clean_and_format_data
-from address_normalization import normalize_addresses
+from stage_cache import load_normalized_data
 from preliminary_grouping import preliminary_grouping
 
-def run_preliminary_grouping(csv_path: str):
+def run_preliminary_grouping(csv_path: str, use_cache: bool = True):
     """
     customer_data.csvを読み込み、クリーニング・正規化を経て
     Preliminary Grouping を行い、グループ数と各チャンクの件数を出力する。
     ただし、グループ内のレコード数が2件以上の場合のみ表示する。
+    use_cache=True の場合、1-3 の結果はステージキャッシュから再利用する。
     """
-    # 1. データ読み込み (Data Ingestion)
-    df_raw = load_customer_data(csv_path)
-
-    # 2. クリーニング (Data Cleaning & Formatting)
-    df_cleaned = clean_and_format_data(df_raw)
-
-    # 3. 住所の簡易正規化 (Address Normalization)
+    # 1-3. データ読み込み → クリーニング → 住所の簡易正規化
     city_map = {
         "RALIEGH": "RALEIGH",
         # 必要に応じて表記ゆれを追加
@@ -29,11 +22,12 @@ def run_preliminary_grouping(csv_path: str):
         "St.": "Street",
         # 必要に応じて追加
     }
-    df_normalized = normalize_addresses(
-        df_cleaned,
+    df_normalized = load_normalized_data(
+        csv_path,
         city_map=city_map,
         state_map=state_map,
-        address_map=address_map
+        address_map=address_map,
+        use_cache=use_cache
     )
 
     # 4. グルーピング
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import warnings
+import pandas as pd
+from typing import Callable, Optional
+
+import data_ingestion
+import data_cleaning_formatting
+import address_normalization
+
+# キャッシュの既定保存先
+DEFAULT_CACHE_DIR = ".stage_cache"
+
+# キャッシュファイルの形式を変えたときに上げる
+CACHE_FORMAT_VERSION = 1
+
+# ソースが変わったらキャッシュを無効化する対象モジュール
+_STAGE_MODULES = [data_ingestion, data_cleaning_formatting, address_normalization]
+
+_FILE_EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    ファイル内容の SHA-256 を返す。巨大ファイルでもメモリに載せずブロック単位で読む。
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def code_version() -> str:
+    """
+    Ingestion / Cleaning / Normalization の各モジュールのソースから算出したバージョン文字列。
+    いずれかのロジックが変われば別のキャッシュキーになる。
+    """
+    h = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode("utf-8"))
+    for module in _STAGE_MODULES:
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def make_cache_key(input_hash: str, stage: str, params: Optional[dict] = None) -> str:
+    """
+    入力ファイルのハッシュ・ステージ名・正規化辞書などのパラメータ・コードバージョンから
+    キャッシュキーを作る。
+    """
+    payload = json.dumps(
+        {
+            "input": input_hash,
+            "stage": stage,
+            "params": params or {},
+            "code": code_version()
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cached_stage(
+    cache_dir: str,
+    stage: str,
+    key: str,
+    compute: Callable[[], pd.DataFrame],
+    fmt: str = "arrow"
+) -> pd.DataFrame:
+    """
+    キャッシュがあれば読み込み、なければ compute() を実行して保存したうえで返す。
+
+    Parameters:
+        cache_dir (str): キャッシュ保存先ディレクトリ
+        stage (str): ステージ名 (ファイル名の接頭辞に使う)
+        key (str): make_cache_key で作ったキー
+        compute (Callable): キャッシュミス時に DataFrame を作る関数
+        fmt (str): "arrow" (Arrow IPC, メモリマップで読み込み) または "parquet"
+    """
+    if fmt not in _FILE_EXTENSIONS:
+        raise ValueError(f"未対応のキャッシュ形式です: {fmt}")
+
+    path = os.path.join(cache_dir, f"{stage}-{key[:32]}{_FILE_EXTENSIONS[fmt]}")
+    if os.path.exists(path):
+        return _read_frame(path, fmt)
+
+    df = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _write_frame(df, tmp_path, fmt)
+    os.replace(tmp_path, path)
+    return df
+
+def load_normalized_data(
+    csv_path: str,
+    city_map: dict = None,
+    state_map: dict = None,
+    address_map: dict = None,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    use_cache: bool = True,
+    fmt: str = "arrow"
+) -> pd.DataFrame:
+    """
+    CSV 読み込み → Cleaning & Formatting → Address Normalization を実行し、
+    各ステージの出力をキャッシュする。2回目以降は同じ入力・辞書・コードであれば
+    キャッシュを読み込むだけで済む。
+
+    - cleaned ステージ: 入力ファイルのハッシュ + コードバージョン
+    - normalized ステージ: 上記 + city_map / state_map / address_map
+
+    pyarrow が無い環境ではキャッシュせず、毎回計算する。
+    キャッシュしない場合は Cleaning と Normalization を列ごとに1パスで行う (中間の DataFrame を作らない)。
+    どちらの場合も、読み込んだ DataFrame は各ステージでコピーせずにそのまま書き換える。
+    """
+    def compute_cleaned() -> pd.DataFrame:
+        df_raw = data_ingestion.load_customer_data(csv_path)
+        return data_cleaning_formatting.clean_and_format_data(df_raw, copy=False)
+
+    def compute_normalized(df_cleaned: pd.DataFrame) -> pd.DataFrame:
+        return address_normalization.normalize_addresses(
+            df_cleaned,
+            city_map=city_map,
+            state_map=state_map,
+            address_map=address_map,
+            copy=False
+        )
+
+    def compute_fused() -> pd.DataFrame:
+        df_raw = data_ingestion.load_customer_data(csv_path)
+        return data_cleaning_formatting.clean_and_format_data(
+            df_raw,
+            copy=False,
+            post_transforms=address_normalization.column_normalizers(city_map, state_map, address_map)
+        )
+
+    if use_cache and not _pyarrow_available():
+        warnings.warn("pyarrow が見つからないため、ステージキャッシュを使わずに処理します。")
+        use_cache = False
+
+    if not use_cache:
+        return compute_fused()
+
+    try:
+        input_hash = file_hash(csv_path)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"ファイルが見つかりません: {csv_path}") from e
+
+    maps = {
+        "city_map": city_map or {},
+        "state_map": state_map or {},
+        "address_map": address_map or {}
+    }
+    normalized_key = make_cache_key(input_hash, "normalized", maps)
+    cleaned_key = make_cache_key(input_hash, "cleaned")
+
+    def compute_normalized_from_cache() -> pd.DataFrame:
+        df_cleaned = cached_stage(cache_dir, "cleaned", cleaned_key, compute_cleaned, fmt)
+        return compute_normalized(df_cleaned)
+
+    return cached_stage(cache_dir, "normalized", normalized_key, compute_normalized_from_cache, fmt)
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _write_frame(df: pd.DataFrame, path: str, fmt: str) -> None:
+    if fmt == "parquet":
+        df.to_parquet(path)
+        return
+
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    # メモリマップで読めるよう非圧縮の Arrow IPC ファイルとして書く
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _read_frame(path: str, fmt: str) -> pd.DataFrame:
+    if fmt == "parquet":
+        return pd.read_parquet(path, memory_map=True)
+
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
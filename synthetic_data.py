@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from data_ingestion import REQUIRED_COLUMNS
+
+# 生成する住所の部品
+STREET_NAMES = [
+    "Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park",
+    "Walnut", "Sunset", "Lincoln", "Jackson", "Church", "Highland", "Madison", "Franklin", "Willow", "Spring",
+    "Jefferson", "Ridge", "Meadow", "River", "Forest", "Chestnut", "Center", "Adams", "Dogwood", "Hickory"
+]
+STREET_SUFFIXES = ["Street", "Avenue", "Road", "Drive", "Boulevard", "Lane"]
+# ノイズとして使う略記 (address_normalization の辞書で戻らないものも含む)
+SUFFIX_ABBREVIATIONS = {"Street": "St.", "Avenue": "Ave", "Road": "Rd", "Drive": "Dr.", "Boulevard": "Blvd", "Lane": "Ln"}
+STATE_NAMES = ["NC", "VA", "SC", "GA", "TN", "TX", "CA", "NY", "FL", "OH"]
+DEFAULT_COUNTRY = "United States of America"
+
+# ノイズの種類
+NOISE_KINDS = ["abbreviation", "typo", "case", "whitespace", "zip4"]
+
+ENTITY_ID_COL = "SyntheticEntityID"
+
+def make_synthetic_addresses(
+    num_rows: int,
+    duplicate_rate: float = 0.3,
+    noise_rate: float = 0.1,
+    city_skew: float = 1.1,
+    num_cities: Optional[int] = None,
+    seed: int = 0,
+    include_entity_id: bool = False
+) -> pd.DataFrame:
+    """
+    ベンチマーク用に、load_customer_data と同じカラムを持つ住所データを乱数シードから再現可能に作る。
+
+    - duplicate_rate: 既に出てきた住所 (同じ実体) をもう一度使う行の割合
+      (実体の数は num_rows * (1 - duplicate_rate))
+    - noise_rate: 表記ゆれを入れる行の割合。略記 (Street -> St.)・1文字の入れ替え・大文字小文字・
+      余分な空白・ZIP+4 のどれか1つを入れる
+    - city_skew: 都市の大きさの偏り (Zipf 分布の指数。0 なら一様、大きいほど大都市に集中)
+    - num_cities: 都市の数 (省略時は実体 200 件に 1 都市、最低 10)
+    - include_entity_id=True の場合、正解の実体番号を SyntheticEntityID 列に付ける
+
+    10M 行でも行ごとの Python ループにならないよう、ノイズを入れる行以外は配列演算で作る。
+    """
+    rng = np.random.default_rng(seed)
+    num_entities = max(1, int(round(num_rows * (1 - duplicate_rate))))
+    if num_cities is None:
+        num_cities = max(10, num_entities // 200)
+
+    # 1. 実体 (住所) ごとの属性
+    weights = 1.0 / np.arange(1, num_cities + 1) ** city_skew
+    entity_city = rng.choice(num_cities, size=num_entities, p=weights / weights.sum())
+    city_state = rng.integers(0, len(STATE_NAMES), num_cities)
+    city_zip = 10000 + rng.permutation(89000)[:num_cities] if num_cities <= 89000 else rng.integers(10000, 99000, num_cities)
+    entity_zip = city_zip[entity_city] + rng.integers(0, 5, num_entities)
+    entity_house = rng.integers(1, 10000, num_entities)
+    entity_street = rng.integers(0, len(STREET_NAMES), num_entities)
+    entity_suffix = rng.integers(0, len(STREET_SUFFIXES), num_entities)
+    entity_suite = np.where(rng.random(num_entities) < 0.1, rng.integers(100, 1000, num_entities), 0)
+
+    # 2. 各行がどの実体か (全実体を1回ずつ + 残りは重複)。行の並びはシャッフルする
+    extra = rng.integers(0, num_entities, max(0, num_rows - num_entities))
+    entity = rng.permutation(np.concatenate([np.arange(num_entities), extra])[:num_rows])
+
+    # 文字列は実体・都市ごとに1回だけ作り、行へは添字で配る
+    house_names = _int_strings(np.arange(10000))
+    entity_address1 = _join_words(
+        house_names[entity_house],
+        np.asarray(STREET_NAMES, dtype=object)[entity_street],
+        np.asarray(STREET_SUFFIXES, dtype=object)[entity_suffix]
+    )
+    entity_address2 = np.where(entity_suite > 0, "Suite " + house_names[entity_suite].astype(str), "").astype(object)
+    city_names = "City" + _int_strings(np.arange(num_cities))
+    city_state_names = np.asarray(STATE_NAMES, dtype=object)[city_state]
+
+    address1 = entity_address1[entity]
+    city = city_names[entity_city[entity]]
+    postal = _int_strings(np.arange(100000))[entity_zip[entity]]
+
+    # 3. ノイズ (対象の行だけ Python で加工する)
+    noisy = np.flatnonzero(rng.random(num_rows) < noise_rate)
+    kinds = rng.integers(0, len(NOISE_KINDS), len(noisy))
+    swap_at = rng.integers(0, 1 << 30, len(noisy))
+    noisy_entity = entity[noisy]
+    parts = zip(
+        noisy.tolist(), kinds.tolist(), swap_at.tolist(), house_names[entity_house[noisy_entity]].tolist(),
+        entity_street[noisy_entity].tolist(), entity_suffix[noisy_entity].tolist()
+    )
+    for pos, kind, swap, house, street, suffix in parts:
+        noise = NOISE_KINDS[kind]
+        street, suffix = STREET_NAMES[street], STREET_SUFFIXES[suffix]
+        if noise == "abbreviation":
+            address1[pos] = f"{house} {street} {SUFFIX_ABBREVIATIONS[suffix]}"
+        elif noise == "typo":
+            i = swap % (len(street) - 1)
+            address1[pos] = f"{house} {street[:i]}{street[i + 1]}{street[i]}{street[i + 2:]} {suffix}"
+        elif noise == "case":
+            city[pos] = city[pos].lower()
+        elif noise == "whitespace":
+            address1[pos] = f" {house}  {street} {suffix} "
+        else:
+            postal[pos] = f"{postal[pos]}-{swap % 10000:04d}"
+
+    df = pd.DataFrame({
+        "CustomerDisplayName": ("Customer " + _int_strings(np.arange(num_entities)))[entity],
+        "locationname": "",
+        "DistributorName": ("Distributor" + _int_strings(np.arange(1, 6)))[rng.integers(0, 5, num_rows)],
+        "AccountNo": _int_strings(np.arange(num_rows)),
+        "Address1": address1,
+        "Address2": entity_address2[entity],
+        "City": city,
+        "StateName": city_state_names[entity_city[entity]],
+        "PostalCode": postal,
+        "CountryName": np.where(rng.random(num_rows) < 0.05, "", DEFAULT_COUNTRY).astype(object)
+    }, columns=REQUIRED_COLUMNS)
+    if include_entity_id:
+        df[ENTITY_ID_COL] = entity
+    return df
+
+def _int_strings(values: np.ndarray) -> np.ndarray:
+    # 整数配列 -> 文字列 (object) 配列。ndarray.astype(str) より速い
+    return np.array(list(map(str, values.tolist())), dtype=object)
+
+def _join_words(*columns: np.ndarray) -> np.ndarray:
+    result = columns[0]
+    for column in columns[1:]:
+        result = result + " " + column
+    return result
@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
-from address_normalization import normalize_addresses
+from address_normalization import normalize_addresses, make_address_replacer, column_normalizers
+from data_cleaning_formatting import clean_and_format_data
 
 def test_normalize_addresses_basic():
     """
@@ -93,3 +94,95 @@ def test_normalize_addresses_partial_address_replace():
     assert df_result.loc[0, "Address2"] == "Avenue B"
 
     print("SUCCESS: test_normalize_addresses_partial_address_replace passed")
+
+def test_normalize_addresses_longest_match_first():
+    """
+    重なるキーがある場合は長いキーが優先され、置換結果が再置換されないことを確認。
+    """
+    df_test = pd.DataFrame({
+        "Address1": ["10 Main St. N", "20 Oak St"],
+        "Address2": ["", ""]
+    })
+    address_map = {
+        "St": "Street",
+        "St.": "Street",
+        "Street": "ST"  # 1パス置換なので "St." → "Street" → "ST" とはならない
+    }
+
+    df_result = normalize_addresses(df_test, address_map=address_map)
+
+    assert df_result.loc[0, "Address1"] == "10 Main Street N"
+    assert df_result.loc[1, "Address1"] == "20 Oak Street"
+
+def test_normalize_addresses_word_boundary():
+    """
+    word_boundary=True の場合、単語の途中 ("FST.") は置換されないことを確認。
+    """
+    df_test = pd.DataFrame({
+        "Address1": ["1 FST. AVE.", "2 MAIN ST."],
+        "Address2": ["BLDG AVE.B", ""]
+    })
+    address_map = {"ST.": "STREET", "AVE": "AVENUE"}
+
+    df_default = normalize_addresses(df_test, address_map=address_map)
+    assert df_default.loc[0, "Address1"] == "1 FSTREET AVENUE."
+
+    df_result = normalize_addresses(df_test, address_map=address_map, word_boundary=True)
+    assert df_result.loc[0, "Address1"] == "1 FST. AVENUE."
+    assert df_result.loc[1, "Address1"] == "2 MAIN STREET"
+    assert df_result.loc[0, "Address2"] == "BLDG AVENUE.B"
+
+def test_normalize_addresses_unique_values_and_replacer():
+    """
+    category 型・欠損値を含むデータでも正しく変換され、
+    make_address_replacer のメモがバッチをまたいで再利用されることを確認。
+    """
+    batch1 = pd.DataFrame({
+        "City": pd.Categorical(["RALIEGH", "RALEIGH", "RALIEGH"]),
+        "StateName": ["VA", "VA", None],
+        "Address1": ["1 Main St.", "1 Main St.", "2 Oak St."],
+        "Address2": ["", None, ""]
+    })
+    batch2 = batch1.copy()
+
+    replacer = make_address_replacer({"St.": "Street"}, cache_size=100)
+
+    df_result = normalize_addresses(
+        batch1, city_map={"RALIEGH": "RALEIGH"}, state_map={"VA": "VIRGINIA"},
+        address_replacer=replacer
+    )
+    assert df_result["City"].tolist() == ["RALEIGH", "RALEIGH", "RALEIGH"]
+    assert list(df_result["City"].cat.categories) == ["RALEIGH"]
+    assert df_result["StateName"].tolist()[:2] == ["VIRGINIA", "VIRGINIA"]
+    assert pd.isna(df_result.loc[2, "StateName"])
+    assert df_result["Address1"].tolist() == ["1 Main Street", "1 Main Street", "2 Oak Street"]
+    assert pd.isna(df_result.loc[1, "Address2"])
+    # ユニーク値 ("1 Main St.", "2 Oak St.", "") だけが変換される
+    assert replacer.cache_info().misses == 3
+
+    normalize_addresses(batch2, address_replacer=replacer)
+    assert replacer.cache_info().misses == 3
+    assert replacer.cache_info().hits == 3
+
+def test_fused_clean_and_normalize_matches_two_stages():
+    """
+    Cleaning と Normalization を1パス (post_transforms, copy=False) で行っても、
+    2段階で行った場合と同じ結果 (category の順序を含む) になることを確認。
+    """
+    df_raw = pd.DataFrame({
+        "Address1": [" 1 Main St. ", "1 Main St.", "2 Oak St.", None],
+        "Address2": ["", " Apt 1", "", ""],
+        "City": [" raliegh", "RALEIGH ", "cary", "Raliegh"],
+        "StateName": ["va", "NC", " va ", "nc"],
+        "PostalCode": ["27601", " 27601-1234", "2751", None],
+        "CountryName": ["", "USA", " ", "USA"]
+    })
+    maps = dict(city_map={"RALIEGH": "RALEIGH"}, state_map={"VA": "VIRGINIA"}, address_map={"St.": "Street"})
+
+    df_expected = normalize_addresses(clean_and_format_data(df_raw), **maps)
+    df_input = df_raw.copy()
+    df_fused = clean_and_format_data(df_input, copy=False, post_transforms=column_normalizers(**maps))
+
+    pd.testing.assert_frame_equal(df_fused, df_expected)
+    # copy=False では渡した DataFrame 自体を書き換える
+    assert df_fused is df_input
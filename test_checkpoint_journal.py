@@ -0,0 +1,126 @@
+import pytest
+import pandas as pd
+import run_end_to_end
+from checkpoint_journal import ChunkJournal, MANIFEST_FILE
+
+def test_chunk_journal_resume(tmp_path):
+    """
+    記録したチャンクが再開時に読めること、壊れた最後の行は無視され、続けて2回 resume しても記録が失われないことを確認。
+    """
+    directory = str(tmp_path / "ckpt")
+    journal = ChunkJournal(directory, run_key="k1")
+    df_chunk = pd.DataFrame({"Address1": ["1 Main St", "2 Oak Ave"], "LLMGroupID": ["G1", "G2"]}, index=[5, 9])
+    journal.record(0, df_chunk)
+
+    # 追記途中で落ちた行
+    with open(f"{directory}/{MANIFEST_FILE}", "a", encoding="utf-8") as f:
+        f.write('{"chunk": 1, "fi')
+
+    resumed = ChunkJournal(directory, run_key="k1", resume=True)
+    assert resumed.is_done(0) and not resumed.is_done(1)
+    pd.testing.assert_frame_equal(resumed.load(0), df_chunk)
+
+    with pytest.raises(ValueError):
+        ChunkJournal(directory, run_key="other", resume=True)
+
+    # 続けて記録し、もう一度 resume しても、壊れた行の後の記録が失われない
+    df_chunk_2 = pd.DataFrame({"Address1": ["3 Pine Rd"], "LLMGroupID": ["G1"]})
+    resumed.record(2, df_chunk_2)
+    resumed.record(3, df_chunk_2)
+    resumed_again = ChunkJournal(directory, run_key="k1", resume=True)
+    assert sorted(resumed_again.completed) == [0, 2, 3]
+    pd.testing.assert_frame_equal(resumed_again.load(3), df_chunk_2)
+
+    # resume しなければ前回の記録は捨てる
+    assert not ChunkJournal(directory, run_key="k1").completed
+
+def test_chunk_journal_keeps_unrelated_files(tmp_path):
+    """
+    新規実行で消すのはジャーナルのファイルだけで、同じディレクトリの他のファイルは残ることを確認。
+    """
+    directory = tmp_path / "data"
+    directory.mkdir()
+    (directory / "customer_data.csv").write_text("a,b\n1,2\n")
+    (directory / "sub").mkdir()
+    (directory / "sub" / "notes.txt").write_text("keep")
+
+    journal = ChunkJournal(str(directory), run_key="k1")
+    journal.record(0, pd.DataFrame({"LLMGroupID": ["G1"]}))
+    (directory / "chunk_000001.parquet.tmp").write_text("partial")
+
+    journal = ChunkJournal(str(directory), run_key="k2")
+    assert not journal.completed
+    assert sorted(path.name for path in directory.iterdir()) == ["customer_data.csv", MANIFEST_FILE, "sub"]
+    assert (directory / "sub" / "notes.txt").read_text() == "keep"
+
+def _write_customer_data():
+    pd.DataFrame({
+        "CustomerDisplayName": [f"C{i}" for i in range(8)],
+        "locationname": [f"L{i}" for i in range(8)],
+        "DistributorName": ["D"] * 8,
+        "AccountNo": [str(i) for i in range(8)],
+        "Address1": ["1 Main St", "1 Main Street", "5 Oak Ave", "5 Oak Avenue",
+                     "7 Pine Rd", "7 Pine Road", "9 Elm Dr", "9 Elm Drive"],
+        "Address2": [""] * 8,
+        "City": ["RALEIGH", "RALEIGH", "CARY", "CARY", "DURHAM", "DURHAM", "APEX", "APEX"],
+        "StateName": ["NC"] * 8,
+        "PostalCode": ["27601", "27601", "27511", "27511", "27701", "27701", "27502", "27502"],
+        "CountryName": ["USA"] * 8
+    }).to_csv("customer_data.csv", index=False)
+
+def test_run_end_to_end_resume_gives_identical_ids(tmp_path, monkeypatch):
+    """
+    途中で落ちた実行を resume すると、記録済みのチャンクは LLM に送らず、
+    中断しなかった場合と同じグループIDになることを確認。
+    """
+    monkeypatch.chdir(tmp_path)
+    _write_customer_data()
+
+    calls = []
+    def fake_llm(df, fail_at=None, **kwargs):
+        calls.append(len(df))
+        if fail_at is not None and len(calls) == fail_at:
+            raise RuntimeError("process died")
+        df = df.copy()
+        df["LLMGroupID"] = "G1"
+        return df
+
+    options = dict(
+        use_cache=False, llm_cache_path=None, use_rules=False, similarity_thresholds=None, max_concurrency=1
+    )
+
+    monkeypatch.setattr(run_end_to_end, "perform_llm_matching", fake_llm)
+    df_expected = run_end_to_end.run_end_to_end("customer_data.csv", checkpoint_dir=None, **options)
+
+    calls.clear()
+    monkeypatch.setattr(run_end_to_end, "perform_llm_matching", lambda df, **kw: fake_llm(df, fail_at=3))
+    with pytest.raises(RuntimeError):
+        run_end_to_end.run_end_to_end("customer_data.csv", checkpoint_dir="ckpt", **options)
+
+    calls.clear()
+    monkeypatch.setattr(run_end_to_end, "perform_llm_matching", fake_llm)
+    df_resumed = run_end_to_end.run_end_to_end("customer_data.csv", checkpoint_dir="ckpt", resume=True, **options)
+
+    assert len(calls) == 2  # 4チャンク中、記録済みの2チャンクは送らない
+    pd.testing.assert_frame_equal(df_resumed, df_expected)
+
+def test_resume_rejects_changed_llm_settings(tmp_path, monkeypatch):
+    """
+    LLM の設定 (プロンプト形式など) を変えて resume すると、前回の回答を混ぜずにエラーになることを確認。
+    """
+    monkeypatch.chdir(tmp_path)
+    _write_customer_data()
+    monkeypatch.setattr(run_end_to_end, "perform_llm_matching", lambda df, **kw: df.assign(LLMGroupID="G1"))
+    options = dict(
+        use_cache=False, llm_cache_path=None, use_rules=False, similarity_thresholds=None,
+        max_concurrency=1, checkpoint_dir="ckpt"
+    )
+    run_end_to_end.run_end_to_end("customer_data.csv", **options)
+    run_end_to_end.run_end_to_end("customer_data.csv", resume=True, **options)
+
+    original_init = run_end_to_end.LLMMatcher.__init__
+    def verbose_init(self, *args, **kwargs):
+        original_init(self, *args, prompt_format="verbose", **kwargs)
+    monkeypatch.setattr(run_end_to_end.LLMMatcher, "__init__", verbose_init)
+    with pytest.raises(ValueError):
+        run_end_to_end.run_end_to_end("customer_data.csv", resume=True, **options)
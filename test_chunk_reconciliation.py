@@ -0,0 +1,93 @@
+import pytest
+import numpy as np
+import pandas as pd
+from chunk_reconciliation import reconcile_split_blocks
+from union_find import UnionFind
+
+def test_union_find_keeps_smallest_root():
+    uf = UnionFind(6)
+    assert uf.union(3, 1)
+    assert uf.union(4, 3)
+    assert not uf.union(1, 4)
+    assert uf.union_many([5], [0]) == 1
+    assert uf.roots().tolist() == [0, 1, 2, 1, 1, 0]
+
+def test_reconcile_split_blocks_merges_across_chunks():
+    """
+    別チャンクに入った同一住所のグループだけが統合され、送られるのは複数チャンクにまたがるブロックの代表行だけであることを確認。
+    """
+    df = pd.DataFrame({
+        "Address1": ["1 Main St", "1 Main St", "9 Oak Ave", "1 MAIN ST", "5 Elm Dr", "9 OAK AVE", "2 Lake Rd"],
+        "City": ["RALEIGH"] * 6 + ["CARY"],
+        "StateName": ["NC"] * 7,
+        "CountryName": ["USA"] * 7,
+        "LLMGroupID": ["G1", "G1", "G2", "G3", "G4", "G5", "G6"]
+    }, index=[10, 11, 12, 13, 14, 15, 16])
+    chunk_ids = pd.Series([0, 0, 0, 1, 1, 2, 3], index=df.index)
+
+    sent = []
+    def fake_match(sub_df):
+        sent.append(sorted(sub_df["Address1"]))
+        sub_df = sub_df.copy()
+        sub_df["LLMGroupID"] = sub_df["Address1"].str.upper()
+        return sub_df
+
+    df_result, merges = reconcile_split_blocks(df, chunk_ids, fake_match)
+
+    assert merges == 2
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1", "G2", "G1", "G4", "G2", "G6"]
+    # 代表行 (G1, G2, G3, G4, G5) だけを1回送る。CARY は1チャンクだけなので送らない
+    assert sent == [sorted(["1 Main St", "9 Oak Ave", "1 MAIN ST", "5 Elm Dr", "9 OAK AVE"])]
+
+def test_reconcile_split_blocks_ignores_single_chunk_matches():
+    """
+    同じ元チャンク内の代表行どうしは、再照合で同一とされても統合しないことを確認。
+    """
+    df = pd.DataFrame({
+        "Address1": ["A", "A", "B"],
+        "City": ["RALEIGH"] * 3,
+        "StateName": ["NC"] * 3,
+        "CountryName": ["USA"] * 3,
+        "LLMGroupID": ["G1", "G2", "G3"]
+    })
+    chunk_ids = pd.Series([0, 0, 1])
+    def same_group(sub_df):
+        sub_df = sub_df.copy()
+        sub_df["LLMGroupID"] = sub_df["Address1"]
+        return sub_df
+
+    df_result, merges = reconcile_split_blocks(df, chunk_ids, same_group)
+    assert merges == 0
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G2", "G3"]
+
+def test_reconcile_split_blocks_finds_far_apart_duplicates():
+    """
+    ほとんどのグループが別住所で、同じ住所の2グループが max_chunk_size 行以上離れていても、
+    代表行を候補キーで並べ替えるので同じチャンクで照合され、統合されることを確認。
+    """
+    num_rows = 150
+    address1 = [f"{100 + i} Main St" for i in range(num_rows)]
+    address1[120] = "100 MAIN STREET"  # 0 行目と同じ住所
+    df = pd.DataFrame({
+        "Address1": address1,
+        "PostalCode": ["27601"] * num_rows,
+        "City": ["RALEIGH"] * num_rows,
+        "StateName": ["NC"] * num_rows,
+        "CountryName": ["USA"] * num_rows,
+        "LLMGroupID": [f"G{i}" for i in range(num_rows)]
+    })
+    chunk_ids = pd.Series(np.arange(num_rows) // 50)
+
+    calls = []
+    def match_by_house_number(sub_df):
+        calls.append(len(sub_df))
+        sub_df = sub_df.copy()
+        sub_df["LLMGroupID"] = sub_df["Address1"].str.split().str[0]
+        return sub_df
+
+    df_result, merges = reconcile_split_blocks(df, chunk_ids, match_by_house_number, max_chunk_size=50)
+
+    assert merges == 1
+    assert df_result["LLMGroupID"].iloc[120] == "G0"
+    assert (df_result["LLMGroupID"].drop(index=120) == df["LLMGroupID"].drop(index=120)).all()
+    assert len(calls) >= 1
@@ -73,3 +73,33 @@ def test_clean_and_format_data_postal_code():
 #     ここではテストしない or 削除する。
 #     """
 #     pass
+
+def test_clean_and_format_data_matches_legacy_outputs():
+    """
+    ベクトル化後も従来 (行ごとの astype(str)/strip/apply) と同じ値になることを確認。
+    City, StateName, CountryName は category 型になる。
+    """
+    test_data = {
+        "CustomerDisplayName": ["A ", None, " C"],
+        "locationname": ["x", "y", "z"],
+        "DistributorName": ["D1", "D2", "D3"],
+        "AccountNo": [54046, 123, 7],  # 数値カラムも文字列化される
+        "Address1": [" 1 Main St ", "2 Oak Ave", "3 Pine Rd"],
+        "Address2": ["", " Suite 5 ", ""],
+        "City": ["raleigh", " Durham", "raleigh "],
+        "StateName": ["nc", "NC", "nc"],
+        "PostalCode": [" 27601 ", "27622-0013", "2760"],
+        "CountryName": ["", "Canada", " "]
+    }
+    df_cleaned = clean_and_format_data(pd.DataFrame(test_data))
+
+    assert df_cleaned["CustomerDisplayName"].tolist() == ["A", "None", "C"]
+    assert df_cleaned["AccountNo"].tolist() == ["54046", "123", "7"]
+    assert df_cleaned["Address2"].tolist() == ["", "Suite 5", ""]
+    assert df_cleaned["City"].tolist() == ["RALEIGH", "DURHAM", "RALEIGH"]
+    assert df_cleaned["PostalCode"].tolist() == ["27601", "27622-0013", "2760"]
+    assert df_cleaned["CountryName"].tolist() == [
+        "United States of America", "Canada", "United States of America"
+    ]
+    for col in ["City", "StateName", "CountryName"]:
+        assert isinstance(df_cleaned[col].dtype, pd.CategoricalDtype)
@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
-from data_ingestion import load_customer_data
+from data_ingestion import load_customer_data, iter_customer_data, REQUIRED_COLUMNS
+from data_cleaning_formatting import clean_and_format_data
 
 def test_load_customer_data_valid(tmp_path):
     """
@@ -67,3 +68,69 @@ def test_load_customer_data_missing_columns(tmp_path):
     
     # エラーメッセージに欠落カラムの名前が含まれるか確認
     assert "CustomerDisplayName" in str(exc_info.value)
+
+def _write_sample_csv(csv_file, num_rows):
+    data = {
+        "CustomerDisplayName": [f"Customer{i}" for i in range(num_rows)],
+        "locationname": ["Quarry"] * num_rows,
+        "DistributorName": ["Distributor1"] * num_rows,
+        "AccountNo": [f"{i:05d}" for i in range(num_rows)],
+        "Address1": [f"{i} Main St" for i in range(num_rows)],
+        "Address2": [""] * num_rows,
+        "City": ["RALEIGH"] * num_rows,
+        "StateName": ["NC"] * num_rows,
+        "PostalCode": ["02134"] * num_rows,
+        "CountryName": ["United States of America"] * num_rows,
+        "Unused": ["x"] * num_rows
+    }
+    pd.DataFrame(data).to_csv(csv_file, index=False)
+
+@pytest.mark.parametrize("engine", ["c", "pyarrow"])
+def test_iter_customer_data_batches(tmp_path, engine):
+    """
+    バッチ読み込み: batch_size ごとに分割され、必須カラムのみが文字列として読まれることを確認
+    """
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    csv_file = tmp_path / "test_batches.csv"
+    _write_sample_csv(csv_file, 7)
+
+    batches = list(iter_customer_data(str(csv_file), batch_size=3, engine=engine))
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert list(batches[0].columns) == REQUIRED_COLUMNS
+    # index はファイル全体での通し番号
+    assert list(batches[2].index) == [6]
+    # 先頭 0 が落ちていない (文字列として読まれている)
+    assert batches[0].loc[0, "PostalCode"] == "02134"
+    assert batches[1].loc[3, "AccountNo"] == "00003"
+
+def test_iter_customer_data_engines_match(tmp_path):
+    """
+    空セルを含むCSVで、c エンジンと pyarrow エンジンの結果 (読み込み直後とクリーニング後) が一致することを確認
+    """
+    pytest.importorskip("pyarrow")
+    csv_file = tmp_path / "test_engines.csv"
+    _write_sample_csv(csv_file, 5)
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    df.loc[[1, 3], "City"] = ""
+    df.loc[2, "Address2"] = "Suite 2"
+    df.to_csv(csv_file, index=False)
+
+    c_batches = list(iter_customer_data(str(csv_file), batch_size=2, engine="c"))
+    arrow_batches = list(iter_customer_data(str(csv_file), batch_size=2, engine="pyarrow"))
+
+    for c_batch, arrow_batch in zip(c_batches, arrow_batches):
+        pd.testing.assert_frame_equal(c_batch, arrow_batch)
+        pd.testing.assert_frame_equal(clean_and_format_data(c_batch), clean_and_format_data(arrow_batch))
+
+def test_iter_customer_data_missing_columns(tmp_path):
+    """
+    必須カラム不足はヘッダー確認の時点で ValueError になることを確認
+    """
+    csv_file = tmp_path / "test_missing_columns.csv"
+    pd.DataFrame({"City": ["RALEIGH"]}).to_csv(csv_file, index=False)
+
+    with pytest.raises(ValueError) as exc_info:
+        next(iter_customer_data(str(csv_file)))
+    assert "CustomerDisplayName" in str(exc_info.value)
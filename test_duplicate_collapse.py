@@ -0,0 +1,45 @@
+import pytest
+import pandas as pd
+from duplicate_collapse import (
+    collapse_exact_duplicates, expand_exact_duplicates, DEDUP_KEY_COL, DUPLICATE_COUNT_COL
+)
+
+def test_collapse_and_expand_exact_duplicates():
+    """
+    同一住所の行が代表1行にまとまり、代表行のグループIDが全行へ展開されることを確認。
+    """
+    df_test = pd.DataFrame({
+        "AccountNo": ["A1", "A2", "A3", "A4"],
+        "DistributorName": ["D1", "D2", "D1", "D3"],
+        "Address1": ["1 Main Street", "2 Oak Street", "1 Main Street", "1 Main Street"],
+        "Address2": ["", "", "", "Suite 5"],
+        "City": ["RALEIGH"] * 4,
+        "StateName": ["NC"] * 4,
+        "PostalCode": ["27601"] * 4,
+        "CountryName": ["United States of America"] * 4
+    })
+
+    df_reps, df_members = collapse_exact_duplicates(df_test)
+
+    # 行0と行2だけが完全一致 (行3は Address2 が違う)
+    assert len(df_reps) == 3
+    assert df_reps[DUPLICATE_COUNT_COL].tolist() == [2, 1, 1]
+    assert df_members.loc[0, DEDUP_KEY_COL] == df_members.loc[2, DEDUP_KEY_COL]
+
+    df_matched = df_reps.drop(columns=[DUPLICATE_COUNT_COL])
+    df_matched["LLMGroupID"] = ["G1", "G2", "G1"]
+
+    df_result = expand_exact_duplicates(df_matched, df_members)
+
+    assert df_result["AccountNo"].tolist() == ["A1", "A2", "A3", "A4"]
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G2", "G1", "G1"]
+    assert DEDUP_KEY_COL not in df_result.columns
+
+    print("SUCCESS: test_collapse_and_expand_exact_duplicates passed")
+
+def test_collapse_exact_duplicates_no_key_columns():
+    """
+    住所カラムが1つもない場合は ValueError になることを確認。
+    """
+    with pytest.raises(ValueError):
+        collapse_exact_duplicates(pd.DataFrame({"AccountNo": ["A1"]}))
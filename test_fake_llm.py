@@ -0,0 +1,64 @@
+import json
+import pytest
+import pandas as pd
+from fake_llm import FakeLLMClient, FakeAPIError, parse_prompt_rows
+from llm_matching import LLMMatcher, perform_llm_matching
+from llm_dispatch import is_retryable_error
+import bench_pipeline
+
+def _sample_df():
+    return pd.DataFrame({
+        "Address1": ["12 Oak Street", "12 Oka St.", " 12  Oak Street ", "40 Pine Road"],
+        "Address2": ["", "", "", ""],
+        "City": ["CARY", "CARY", "CARY", "CARY"],
+        "StateName": ["NC", "NC", "NC", "NC"],
+        "PostalCode": ["27511", "27511-1234", "27511", "27511"],
+        "CountryName": ["USA", "USA", "USA", "USA"]
+    }, index=[10, 11, 12, 13])
+
+@pytest.mark.parametrize("prompt_format", ["compact", "verbose"])
+def test_fake_llm_groups_noisy_duplicates(prompt_format):
+    """
+    略記・1文字の入れ替え・空白・ZIP+4 のゆれがあっても同じグループと答え、使用量を集計することを確認。
+    """
+    client = FakeLLMClient()
+    matcher = LLMMatcher(client=client, prompt_format=prompt_format)
+    assert len(parse_prompt_rows(matcher.build_prompt(_sample_df()))) == 4
+
+    df_result = perform_llm_matching(_sample_df(), matcher=matcher)
+
+    ids = df_result["LLMGroupID"].tolist()
+    assert ids[0] == ids[1] == ids[2] != ids[3]
+    assert client.usage["requests"] == 1
+    assert client.usage["prompt_tokens"] > 0 and client.usage["completion_tokens"] > 0
+
+def test_fake_llm_errors_and_latency():
+    waits = []
+    client = FakeLLMClient(latency=0.5, error_rate=1.0, sleep=waits.append)
+    with pytest.raises(FakeAPIError) as excinfo:
+        client.chat.completions.create(messages=[{"role": "user", "content": "i,Address1\n0,1 Main St"}])
+    assert is_retryable_error(excinfo.value)
+    assert waits == [0.5]
+    assert client.usage["errors"] == 1
+
+    client = FakeLLMClient(malformed_rate=1.0)
+    content = client.chat.completions.create(messages=[{"role": "user", "content": "i,Address1\n0,1 Main St\n1,2 Main St"}]).choices[0].message.content
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(content)
+
+def test_bench_pipeline_writes_json(tmp_path):
+    """
+    小さいデータでベンチマークを流し、全ステージの計測と精度が JSON に書かれることを確認。
+    """
+    output = str(tmp_path / "bench.json")
+    bench_pipeline.main(["--rows", "500", "--output", output, "--max-concurrency", "2"])
+
+    with open(output, encoding="utf-8") as f:
+        results = json.load(f)
+    assert len(results) == 1
+    result = results[0]
+    assert [stage["stage"] for stage in result["stages"]] == [
+        "ingest", "clean", "normalize", "collapse", "group", "match", "unify", "reconcile", "review"
+    ]
+    assert result["rows"] == 500 and result["llm"]["requests"] > 0
+    assert result["quality"]["pure_group_rate"] > 0.9
@@ -0,0 +1,42 @@
+import pandas as pd
+from group_id_unifier import unify_local_group_ids, allocate_group_codes, render_group_ids, GroupIdAllocator
+
+def test_allocate_group_codes_matches_sequential_unify():
+    """
+    1回の採番が、チャンク順に unify_local_group_ids を適用した場合と同じIDになることを確認。
+    """
+    chunks = [
+        pd.DataFrame({"LLMGroupID": ["G2", "G1", "G2", None]}),
+        pd.DataFrame({"LLMGroupID": ["G1", "Rule_0", "G1"]}),
+        pd.DataFrame({"LLMGroupID": ["Single_0"]})
+    ]
+
+    expected = []
+    counter = 1
+    for sub_df in chunks:
+        sub_df, counter = unify_local_group_ids(sub_df, start_count=counter)
+        expected.extend(sub_df["UnifiedGroupID"])
+
+    chunk_ids = [n for n, sub_df in enumerate(chunks) for _ in range(len(sub_df))]
+    local_ids = pd.concat([sub_df["LLMGroupID"] for sub_df in chunks]).tolist()
+    codes = allocate_group_codes(chunk_ids, local_ids)
+
+    assert codes.dtype == "int64"
+    assert render_group_ids(codes).tolist() == expected
+
+def test_group_id_allocator_out_of_order():
+    """
+    チャンクの完了順が違っても同じ番号になることを確認。
+    """
+    in_order = GroupIdAllocator()
+    in_order.add(0, ["G1", "G2", "G1"])
+    in_order.add(1, ["G1", "G1"])
+    in_order.add(2, ["G3", "G1"])
+
+    shuffled = GroupIdAllocator()
+    shuffled.add(2, ["G3", "G1"])
+    shuffled.add(0, ["G1", "G2", "G1"])
+    shuffled.add(1, ["G1", "G1"])
+
+    assert shuffled.chunk_ids() == [0, 1, 2]
+    assert shuffled.allocate().tolist() == in_order.allocate().tolist() == [1, 2, 1, 3, 3, 4, 5]
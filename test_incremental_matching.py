@@ -0,0 +1,71 @@
+import pytest
+import pandas as pd
+from incremental_matching import match_delta, next_group_number
+
+def _fake_llm(sent):
+    # 大文字化して Street/Drive を略したものが同じなら同一住所とみなす
+    def match(df):
+        sent.append(df["Address1"].tolist())
+        df = df.copy()
+        df["LLMGroupID"] = (
+            df["Address1"].str.upper().str.replace("STREET", "ST").str.replace("DRIVE", "DR")
+        )
+        return df
+    return match
+
+def test_match_delta_keeps_existing_ids_and_sends_only_candidates():
+    """
+    完全一致は LLM に送らずに既存IDを使い、それ以外は同じブロックの代表行とだけ照合されることを確認。
+    既存IDは変わらず、新しいグループには既存と重ならない番号が振られることも確認。
+    """
+    df_master = pd.DataFrame({
+        "Address1": ["1 Main St", "1 Main Street", "5 Oak Ave", "7 Pine Rd"],
+        "Address2": [None] * 4,
+        "City": ["RALEIGH", "RALEIGH", "RALEIGH", "CARY"],
+        "StateName": ["NC"] * 4,
+        "PostalCode": ["27601", "27601", "27605", "27511"],
+        "CountryName": ["USA"] * 4,
+        "FinalGroupID": ["G1", "G1", "G2", "G7"]
+    })
+    df_new = pd.DataFrame({
+        "Address1": ["1 Main St", "1 MAIN STREET", "9 Elm Dr", "9 Elm Drive", "9 Elm Dr", "3 Lake Rd"],
+        "Address2": [""] * 6,
+        "City": pd.Categorical(["RALEIGH"] * 5 + ["DURHAM"]),
+        "StateName": ["NC"] * 6,
+        "PostalCode": ["27601", "27601", "27609", "27609", "27609", "27701"],
+        "CountryName": ["USA"] * 6
+    }, index=[100, 101, 102, 103, 104, 105])
+
+    sent = []
+    df_result = match_delta(df_master, df_new, _fake_llm(sent))
+
+    assert df_result.index.tolist() == [100, 101, 102, 103, 104, 105]
+    assert df_result["FinalGroupID"].tolist() == ["G1", "G1", "G9", "G9", "G9", "G8"]
+    # RALEIGH のチャンクだけが送られる (CARY の代表行、完全一致の行、重複行は送らない)
+    assert len(sent) == 1
+    assert sorted(sent[0]) == sorted(["1 MAIN STREET", "9 Elm Dr", "9 Elm Drive", "1 Main St", "5 Oak Ave"])
+
+@pytest.mark.filterwarnings("error")
+def test_match_delta_without_pending_rows_or_candidates():
+    """
+    すべて完全一致で照合する行が無い場合や、既存マスタが空の場合も、警告なしで ID が付くことを確認。
+    """
+    df_master = pd.DataFrame({
+        "Address1": ["1 Main St"],
+        "Address2": [None],
+        "City": ["RALEIGH"],
+        "StateName": ["NC"],
+        "PostalCode": ["27601"],
+        "CountryName": ["USA"],
+        "FinalGroupID": ["G1"]
+    })
+    df_new = df_master.drop(columns="FinalGroupID").assign(City=pd.Categorical(["RALEIGH"]))
+
+    sent = []
+    assert match_delta(df_master, df_new, _fake_llm(sent))["FinalGroupID"].tolist() == ["G1"]
+    assert match_delta(df_master.iloc[:0], df_new, _fake_llm(sent))["FinalGroupID"].tolist() == ["G1"]
+    assert sent == []
+
+def test_next_group_number():
+    assert next_group_number(pd.Series(["G1", "G12", "Custom", None])) == 13
+    assert next_group_number(pd.Series([], dtype=object)) == 1
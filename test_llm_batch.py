@@ -0,0 +1,110 @@
+import json
+import pytest
+import pandas as pd
+from llm_matching import perform_llm_matching
+from llm_cache import LLMResponseCache
+from llm_batch import (
+    BatchCollector, BatchResultMatcher, LocalBatchBackend, parse_batch_results, run_batch
+)
+
+def _sample_df():
+    return pd.DataFrame({
+        "Address1": ["123 Main St", "123 Main Street", "456 Another Rd"],
+        "Address2": ["", "", ""],
+        "City": ["RALEIGH"] * 3,
+        "StateName": ["NC"] * 3,
+        "PostalCode": ["27601", "27601", "27605"],
+        "CountryName": ["USA"] * 3
+    }, index=[10, 11, 12])
+
+def test_batch_roundtrip_through_local_backend(tmp_path):
+    """
+    集めたプロンプトを JSONL にしてローカル代替に投入し、結果が perform_llm_matching に反映されることを確認。
+    """
+    df_test = _sample_df()
+    collector = BatchCollector(client=object())
+    collector.chunk_id = "chunk-0"
+    perform_llm_matching(df_test, matcher=collector)
+
+    assert [r["custom_id"] for r in collector.requests] == ["chunk-0"]
+    assert collector.requests[0]["url"] == "/v1/chat/completions"
+
+    answer = json.dumps([
+        {"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 2, "group_id": "G2"}
+    ])
+    backend = LocalBatchBackend(answer_func=lambda body: answer)
+    results = run_batch(collector.requests, backend, batch_dir=str(tmp_path))
+    assert (tmp_path / "batch_input.jsonl").exists()
+
+    batch_matcher = BatchResultMatcher(collector.custom_ids, results, client=object())
+    df_result = perform_llm_matching(df_test, matcher=batch_matcher)
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1", "G2"]
+
+def test_batch_counts_cache_lookups_once(tmp_path):
+    """
+    バッチモードでは集める段階と結果を反映する段階の2回キャッシュを引くが、ヒット・ミスは1回ずつしか数えないことを確認。
+    """
+    df_test = _sample_df()
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"))
+    answer = json.dumps([
+        {"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 2, "group_id": "G2"}
+    ])
+
+    for expected in ({"hits": 0, "misses": 1}, {"hits": 1, "misses": 1}):
+        collector = BatchCollector(client=object(), cache=cache)
+        collector.chunk_id = "chunk-0"
+        perform_llm_matching(df_test, matcher=collector)
+        results = run_batch(collector.requests, LocalBatchBackend(answer_func=lambda body: answer), batch_dir=str(tmp_path))
+        batch_matcher = BatchResultMatcher(collector.custom_ids, results, client=object(), cache=cache)
+        assert perform_llm_matching(df_test, matcher=batch_matcher)["LLMGroupID"].tolist() == ["G1", "G1", "G2"]
+
+        stats = cache.stats()
+        assert {"hits": stats["hits"], "misses": stats["misses"]} == expected
+    cache.close()
+
+def test_parse_batch_results_marks_errors(tmp_path):
+    """
+    エラーになったリクエストは None になり、マッチングでは Fallback になることを確認。
+    """
+    path = tmp_path / "out.jsonl"
+    path.write_text(
+        json.dumps({"custom_id": "chunk-0", "response": None, "error": {"code": "server_error"}}) + "\n",
+        encoding="utf-8"
+    )
+    results = parse_batch_results(str(path))
+    assert results == {"chunk-0": None}
+
+    df_test = _sample_df()
+    collector = BatchCollector(client=object())
+    collector.chunk_id = "chunk-0"
+    perform_llm_matching(df_test, matcher=collector)
+    df_result = perform_llm_matching(df_test, matcher=BatchResultMatcher(collector.custom_ids, results, client=object()))
+    assert df_result["LLMGroupID"].tolist() == ["Fallback_10", "Fallback_11", "Fallback_12"]
+
+class _SlowBackend(LocalBatchBackend):
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = list(statuses)
+    def poll(self, batch_id):
+        return self.statuses.pop(0)
+
+def test_run_batch_polls_until_terminal_status(tmp_path):
+    """
+    完了するまで監視を続け、completed 以外で終わった場合は例外になることを確認。
+    """
+    requests = [{"custom_id": "chunk-0", "body": {"messages": [{"role": "user", "content": "i,Address1\n0,x"}]}}]
+    sleeps = []
+    events = []
+    backend = _SlowBackend(["validating", "in_progress", "completed"])
+    results = run_batch(
+        requests, backend, batch_dir=str(tmp_path), poll_interval=5, sleep=sleeps.append,
+        on_event=lambda event, **fields: events.append((event, fields))
+    )
+    assert sleeps == [5, 5]
+    assert [event for event, _ in events] == ["batch_submitted", "batch_finished"]
+    assert events[0][1] == {"batch_id": "local_batch_0", "requests": 1}
+    assert events[1][1]["status"] == "completed"
+    assert json.loads(results["chunk-0"]) == [{"index": 0, "group_id": "G1"}]
+
+    with pytest.raises(RuntimeError):
+        run_batch(requests, _SlowBackend(["in_progress", "expired"]), batch_dir=str(tmp_path), sleep=sleeps.append)
@@ -0,0 +1,64 @@
+import pytest
+from llm_cache import LLMResponseCache, make_cache_key
+
+def test_make_cache_key_ignores_row_order():
+    """
+    行の並び順が違っても同じキーになり、モデルやテンプレートが違えば別キーになることを確認。
+    """
+    rows = ["1 MAIN ST|27601", "2 OAK AVE|27605", "1 MAIN STREET|27601"]
+    key1, order1 = make_cache_key("o3-mini", "medium", "template", rows)
+    key2, order2 = make_cache_key("o3-mini", "medium", "template", [rows[2], rows[0], rows[1]])
+
+    assert key1 == key2
+    assert [rows[p] for p in order1] == [[rows[2], rows[0], rows[1]][p] for p in order2]
+    assert make_cache_key("o3-mini", "high", "template", rows)[0] != key1
+    assert make_cache_key("o3-mini", "medium", "other", rows)[0] != key1
+
+def test_llm_response_cache_roundtrip(tmp_path):
+    """
+    保存した対応表が別インスタンス (再実行) からも読め、ヒット・ミスが数えられることを確認。
+    """
+    path = str(tmp_path / "cache.sqlite")
+    cache = LLMResponseCache(path)
+    assert cache.get("k1") is None
+    cache.put("k1", {0: "G1", 1: "G1", 2: "G2"})
+    cache.close()
+
+    cache = LLMResponseCache(path)
+    assert cache.get("k1") == {0: "G1", 1: "G1", 2: "G2"}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 0
+    assert stats["entries"] == 1
+
+def test_llm_response_cache_eviction(tmp_path):
+    """
+    合計サイズが上限を超えると、最終アクセスの古いエントリから削除されることを確認。
+    """
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=300)
+    for i in range(10):
+        cache.put(f"key{i}", {0: "G" * 40})
+    stats = cache.stats()
+    assert stats["bytes"] <= 300
+    assert stats["evictions"] > 0
+    assert cache.get("key9") is not None
+    assert cache.get("key0") is None
+
+def test_llm_response_cache_tracks_total_size(tmp_path):
+    """
+    メモリ上の合計サイズが、上書き・削除・開き直しの後も実際の合計と一致することを確認。
+    """
+    path = str(tmp_path / "cache.sqlite")
+    cache = LLMResponseCache(path, max_bytes=300)
+    for i in range(10):
+        cache.put(f"key{i % 4}", {0: "G" * (10 + 10 * i)})
+
+    def actual_bytes(cache):
+        return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    assert cache.stats()["bytes"] == actual_bytes(cache) <= 300
+    cache.close()
+
+    cache = LLMResponseCache(path, max_bytes=300)
+    assert cache.stats()["bytes"] == actual_bytes(cache) > 0
+    cache.close()
@@ -0,0 +1,83 @@
+import time
+import pytest
+import pandas as pd
+from unittest.mock import MagicMock
+from llm_dispatch import (
+    TokenBucket, RateLimiter, call_with_retries, dispatch_chunks, is_retryable_error
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = None
+
+def test_token_bucket_waits_for_refill():
+    """
+    容量を使い切ると、補充レートに応じて待つことを確認。
+    """
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock, sleep=clock.sleep)  # 1秒に1単位
+
+    assert bucket.acquire(60) == 0.0
+    waited = bucket.acquire(2)
+    assert waited == pytest.approx(2.0)
+    assert clock.now == pytest.approx(2.0)
+
+def test_rate_limiter_both_budgets():
+    """
+    リクエスト数とトークン数の両方の予算が適用されることを確認。
+    """
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=120, tokens_per_minute=600, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire(600)
+    # トークン予算が空 => 100 トークンぶん (10秒) 待つ
+    assert limiter.acquire(100) == pytest.approx(10.0)
+
+def test_call_with_retries_on_retryable_errors():
+    """
+    429 / 5xx はリトライし、それ以外のエラーは即座に送出することを確認。
+    """
+    sleeps = []
+    func = MagicMock(side_effect=[FakeAPIError(429), FakeAPIError(503), "ok"])
+    assert call_with_retries(func, max_retries=5, sleep=sleeps.append) == "ok"
+    assert func.call_count == 3
+    assert len(sleeps) == 2
+    assert all(0 <= s <= 2.0 for s in sleeps)
+
+    func = MagicMock(side_effect=FakeAPIError(400))
+    with pytest.raises(FakeAPIError):
+        call_with_retries(func, max_retries=5, sleep=sleeps.append)
+    assert func.call_count == 1
+
+    func = MagicMock(side_effect=FakeAPIError(500))
+    with pytest.raises(FakeAPIError):
+        call_with_retries(func, max_retries=2, sleep=lambda s: None)
+    assert func.call_count == 3
+
+    assert is_retryable_error(FakeAPIError(429))
+    assert not is_retryable_error(ValueError("x"))
+
+def test_dispatch_chunks_keeps_order():
+    """
+    処理時間がばらついても、結果は入力と同じ順序で返ることを確認。
+    """
+    chunks = [pd.DataFrame({"v": [i]}) for i in range(10)]
+
+    def slow_match(df):
+        time.sleep(0.01 * (10 - df["v"].iloc[0]) / 10)
+        df = df.copy()
+        df["LLMGroupID"] = f"G{df['v'].iloc[0]}"
+        return df
+
+    results = list(dispatch_chunks(iter(chunks), slow_match, max_concurrency=4))
+    assert [r["LLMGroupID"].iloc[0] for r in results] == [f"G{i}" for i in range(10)]
@@ -1,7 +1,7 @@
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
-from llm_matching import perform_llm_matching
+from llm_matching import perform_llm_matching, LLMMatcher
 
 def test_perform_llm_matching_basic():
     # テスト用データ（同じCity/Stateと想定）
@@ -85,3 +85,202 @@ def test_perform_llm_matching_json_error():
     assert df_result.loc[1, "LLMGroupID"].startswith("Fallback_")
 
     print("SUCCESS: test_perform_llm_matching_json_error passed")
+
+def test_llm_matcher_reuses_client_and_template(tmp_path, monkeypatch):
+    """
+    LLMMatcher を渡した場合、クライアントとテンプレートが全チャンクで使い回され、
+    カレントディレクトリに llm_prompt.txt が無くても動くことを確認。
+    """
+    monkeypatch.chdir(tmp_path)
+
+    mock_client = MagicMock()
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '[{"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}]'
+    mock_client.chat.completions.create.return_value = mock_response
+
+    df_test = pd.DataFrame({
+        "Address1": ["1 Main St", "1 Main Street"],
+        "Address2": ["", ""],
+        "City": ["RALEIGH", "RALEIGH"],
+        "StateName": ["NC", "NC"],
+        "PostalCode": ["27601", "27601"],
+        "CountryName": ["USA", "USA"]
+    })
+
+    with patch("llm_matching.get_llm_client") as mock_get_client:
+        matcher = LLMMatcher(client=mock_client)
+        for _ in range(3):
+            df_result = perform_llm_matching(df_test, matcher=matcher)
+        mock_get_client.assert_not_called()
+
+    assert mock_client.chat.completions.create.call_count == 3
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1"]
+    prompt = mock_client.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+    assert "Shared fields: City=RALEIGH; State=NC; Country=USA" in prompt
+    assert "0,1 Main St,,27601" in prompt
+    assert "{address_block}" not in prompt
+
+def test_perform_llm_matching_uses_response_cache(tmp_path):
+    """
+    同じ住所の集合なら、行順・index が違ってもキャッシュから回答が再利用されることを確認。
+    """
+    from llm_cache import LLMResponseCache
+
+    mock_client = MagicMock()
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = (
+        '[{"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 2, "group_id": "G2"}]'
+    )
+    mock_client.chat.completions.create.return_value = mock_response
+
+    df_test = pd.DataFrame({
+        "Address1": ["123 Main St", "123 Main Street", "456 Another Rd"],
+        "Address2": ["", "", ""],
+        "City": ["RALEIGH"] * 3,
+        "StateName": ["NC"] * 3,
+        "PostalCode": ["27601", "27601", "27605"],
+        "CountryName": ["USA"] * 3
+    })
+
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"))
+    matcher = LLMMatcher(client=mock_client, cache=cache)
+    perform_llm_matching(df_test, matcher=matcher)
+
+    # 行を並べ替え、index も変えて再実行
+    df_shuffled = df_test.iloc[[2, 0, 1]].set_index(pd.Index([7, 8, 9]))
+    df_result = perform_llm_matching(df_shuffled, matcher=matcher)
+
+    assert mock_client.chat.completions.create.call_count == 1
+    assert df_result.loc[7, "LLMGroupID"] == "G2"
+    assert df_result.loc[8, "LLMGroupID"] == "G1"
+    assert df_result.loc[9, "LLMGroupID"] == "G1"
+    assert cache.stats()["hits"] == 1
+
+def test_compact_prompt_uses_local_indices():
+    """
+    compact 形式ではローカル番号で送り、回答のローカル番号が元の index に戻されることを確認。
+    値がそろっていない共通項目は行に載ることも確認。
+    """
+    mock_client = MagicMock()
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = '[{"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 7, "group_id": "G9"}]'
+    mock_client.chat.completions.create.return_value = mock_response
+
+    df_test = pd.DataFrame({
+        "Address1": ["1 Main St", "1 Main Street, Apt 2"],
+        "Address2": ["", None],
+        "City": ["RALEIGH", "CARY"],
+        "StateName": ["NC", "NC"],
+        "PostalCode": ["27601", "27601"],
+        "CountryName": ["USA", "USA"]
+    }, index=[100, 200])
+
+    matcher = LLMMatcher(client=mock_client)
+    prompt = matcher.build_prompt(df_test)
+    assert "Shared fields: State=NC; Country=USA" in prompt
+    assert "i,Address1,Address2,City,Zip" in prompt
+    assert '1,"1 Main Street, Apt 2",,CARY,27601' in prompt
+
+    df_result = perform_llm_matching(df_test, matcher=matcher)
+    assert df_result.loc[100, "LLMGroupID"] == "G1"
+    assert df_result.loc[200, "LLMGroupID"] == "G1"
+
+    verbose_prompt = LLMMatcher(client=mock_client, prompt_format="verbose").build_prompt(df_test)
+    assert "Index:100, Address1:1 Main St" in verbose_prompt
+
+def _mock_client(*answers):
+    client = MagicMock()
+    responses = []
+    for answer in answers:
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = answer
+        responses.append(response)
+    client.chat.completions.create.side_effect = responses
+    return client
+
+def _four_rows():
+    return pd.DataFrame({
+        "Address1": ["1 Main St", "1 Main Street", "9 Oak Ave", "1 MAIN ST"],
+        "Address2": [""] * 4,
+        "City": ["RALEIGH"] * 4,
+        "StateName": ["NC"] * 4,
+        "PostalCode": ["27601", "27601", "27605", "27601"],
+        "CountryName": ["USA"] * 4
+    }, index=[10, 11, 12, 13])
+
+def test_truncated_answer_is_salvaged_and_missing_rows_resent():
+    """
+    途中で切れた回答から正しい項目を拾い、漏れた行だけを代表行と一緒に聞き直すことを確認。
+    """
+    client = _mock_client(
+        # 途中で切れた回答 (3番目は group_id が無い、4番目は切れている)
+        '{"groups": [{"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 2}, {"index": 3, "gro',
+        # 聞き直し: 送られるのは 漏れた行 (12, 13) + 代表行 (10) の3行 (ローカル番号 0=10, 1=12, 2=13)
+        '{"groups": [{"index": 0, "group_id": "A"}, {"index": 1, "group_id": "B"}, {"index": 2, "group_id": "A"}]}'
+    )
+    matcher = LLMMatcher(client=client)
+    df_result = perform_llm_matching(_four_rows(), matcher=matcher)
+
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1", "B_r1", "G1"]
+    followup_prompt = client.chat.completions.create.call_args_list[1].kwargs["messages"][0]["content"]
+    assert "9 Oak Ave" in followup_prompt and "1 Main Street" not in followup_prompt
+    assert client.chat.completions.create.call_args.kwargs["response_format"]["type"] == "json_schema"
+
+    stats = df_result.attrs["llm_stats"]
+    assert stats["requests"] == 2
+    assert stats["salvaged_responses"] == 1
+    assert stats["invalid_items"] == 1
+    assert stats["followup_requests"] == 1
+    assert stats["fallback_rows"] == 0
+    assert matcher.stats["followup_requests"] == 1
+
+def test_rows_still_missing_after_followup_fall_back():
+    """
+    聞き直しても回答が無い行だけが Fallback になることを確認。
+    """
+    client = _mock_client(
+        '[{"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 2, "group_id": "G2"}]',
+        'not json'
+    )
+    df_result = perform_llm_matching(_four_rows(), matcher=LLMMatcher(client=client))
+
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1", "G2", "Fallback_13"]
+    assert df_result.attrs["llm_stats"]["fallback_rows"] == 1
+
+class _RateLimited(Exception):
+    def __init__(self):
+        super().__init__("429")
+        self.status_code = 429
+        self.response = None
+
+def test_followup_429_retries_only_the_followup():
+    """
+    聞き直しが 429 になっても、その聞き直しだけを再試行し、最初のプロンプトは送り直さないこと、
+    レート制限の予算が聞き直しを含む API 呼び出しごとに確保されることを確認。
+    """
+    client = _mock_client(
+        '[{"index": 0, "group_id": "G1"}, {"index": 1, "group_id": "G1"}, {"index": 2, "group_id": "G2"}]',
+        '[{"index": 0, "group_id": "A"}, {"index": 1, "group_id": "B"}, {"index": 2, "group_id": "A"}]'
+    )
+    answers = list(client.chat.completions.create.side_effect)
+    answers.insert(1, _RateLimited())
+    client.chat.completions.create.side_effect = answers
+    limiter = MagicMock()
+    retries = []
+    matcher = LLMMatcher(
+        client=client, limiter=limiter, max_retries=3,
+        on_retry=lambda exc, attempt, delay: retries.append(attempt), sleep=lambda seconds: None
+    )
+
+    df_result = perform_llm_matching(_four_rows(), matcher=matcher)
+
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1", "G2", "G1"]
+    prompts = [call.kwargs["messages"][0]["content"] for call in client.chat.completions.create.call_args_list]
+    assert len(prompts) == 3
+    assert prompts[1] == prompts[2] != prompts[0]  # 再試行したのは聞き直しだけ
+    assert retries == [1]
+    assert limiter.acquire.call_count == 3
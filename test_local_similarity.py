@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+import pandas as pd
+from local_similarity import similarity_matrix, cluster_block, perform_local_matching
+
+def _make_block():
+    return pd.DataFrame({
+        "Address1": [
+            "123 Main Street", "123 MAIN STREET", "123 Main St",
+            "124 Main Street", "500 Oak Avenue"
+        ],
+        "Address2": ["", "", "", "", "Suite 5"],
+        "City": ["RALEIGH"] * 5,
+        "StateName": ["NC"] * 5,
+        "PostalCode": ["27601", "27601", "27601", "27601", "27605"],
+        "CountryName": ["USA"] * 5
+    }, index=[10, 11, 12, 13, 14])
+
+def test_similarity_matrix_basic():
+    """
+    同一文字列 (大文字小文字違い) は 1.0、無関係な住所は低い値になることを確認。
+    """
+    sim = similarity_matrix(_make_block())
+
+    assert sim.shape == (5, 5)
+    assert np.allclose(sim, sim.T)
+    assert sim[0, 1] == pytest.approx(1.0)
+    assert sim[0, 4] < 0.3
+
+def test_cluster_block_auto_accept_and_reject():
+    """
+    高類似度かつ番地一致のみの成分は自動確定、表記揺れを含む成分は不確実、番地違いの行は別住所になることを確認。
+    """
+    df = _make_block().iloc[[0, 1, 4]]
+    labels, uncertain = cluster_block(df, low=0.3, high=0.9)
+    assert labels[0] == labels[1] != labels[2]
+    assert not uncertain.any()
+
+    labels, uncertain = cluster_block(_make_block(), low=0.3, high=0.9)
+    # 123 Main Street / St は表記揺れ => LLM へ。124 Main Street は番地が違うので辺を張らず別住所として確定
+    assert uncertain.tolist() == [True, True, True, False, False]
+    assert labels[3] not in labels[[0, 1, 2, 4]]
+
+def test_cluster_block_does_not_chain_different_numbers():
+    """
+    通り名が同じで番地・部屋番号が違う住所どうしは1つの成分につながらず、
+    部屋番号が片方にしか無いペアだけが LLM に回ることを確認。
+    """
+    df = pd.DataFrame({
+        "Address1": [f"{100 + i} Main Street" for i in range(6)] + ["100 Main Street"] * 2,
+        "Address2": [""] * 6 + ["Apt 1", "Apt 2"],
+        "PostalCode": ["27601"] * 8
+    })
+    labels, uncertain = cluster_block(df, low=0.3, high=0.9)
+
+    assert len(np.unique(labels[:6])) == 6
+    # 100 Main Street と Apt 1 / Apt 2 は部屋番号の有無が違うだけなので LLM へ。Apt 1 と Apt 2 は別住所
+    assert labels[0] == labels[6] == labels[7]
+    assert uncertain.tolist() == [True] + [False] * 5 + [True, True]
+
+def test_perform_local_matching_sends_only_uncertain_rows():
+    """
+    不確実な行だけが match_func に渡され、結果が元の index に反映されることを確認。
+    """
+    calls = []
+
+    def fake_match_func(df):
+        calls.append(df.index.tolist())
+        df = df.copy()
+        df["LLMGroupID"] = ["G1", "G1", "G1"]
+        return df
+
+    df_result = perform_local_matching(_make_block(), match_func=fake_match_func)
+
+    assert calls == [[10, 11, 12]]
+    assert df_result.index.tolist() == [10, 11, 12, 13, 14]
+    assert df_result["LLMGroupID"].tolist()[:3] == ["G1", "G1", "G1"]
+    assert df_result.loc[13, "LLMGroupID"].startswith("Local_")
+    assert df_result.loc[14, "LLMGroupID"].startswith("Local_")
+
+def test_perform_local_matching_no_llm_call():
+    """
+    すべて自動確定できる場合は match_func を呼ばないことを確認。
+    """
+    def fail_match_func(df):
+        raise AssertionError("match_func should not be called")
+
+    df_result = perform_local_matching(_make_block().iloc[[0, 1, 4]], match_func=fail_match_func)
+    assert df_result.loc[10, "LLMGroupID"] == df_result.loc[11, "LLMGroupID"]
+    assert df_result.loc[10, "LLMGroupID"] != df_result.loc[14, "LLMGroupID"]
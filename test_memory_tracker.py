@@ -0,0 +1,21 @@
+import numpy as np
+from memory_tracker import StageMemoryTracker, current_rss, peak_rss
+
+def test_stage_memory_tracker_records_stages():
+    """
+    ステージごとに時間・RSS・peak RSS、trace_allocations=True なら確保量も記録されることを確認。
+    """
+    tracker = StageMemoryTracker(trace_allocations=True)
+    with tracker.stage("allocate"):
+        data = np.ones(2_000_000)  # 約 15 MB
+    with tracker.stage("noop"):
+        pass
+
+    report = tracker.report()
+    assert report["stage"].tolist() == ["allocate", "noop"]
+    assert report.loc[0, "allocated_peak_mb"] >= 15
+    assert report.loc[1, "allocated_peak_mb"] < 1
+    assert (report["seconds"] >= 0).all()
+    if current_rss() is not None and peak_rss() is not None:
+        assert report.loc[0, "peak_rss_mb"] >= report.loc[0, "rss_after_mb"] > 0
+    del data
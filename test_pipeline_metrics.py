@@ -0,0 +1,73 @@
+import io
+import json
+import pandas as pd
+import pytest
+from pipeline_metrics import PipelineMetrics
+from llm_matching import LLMMatcher, perform_llm_matching
+from fake_llm import FakeLLMClient, FakeAPIError
+
+def _events(stream: io.StringIO) -> list:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_stage_events_and_prometheus_textfile(tmp_path):
+    """
+    ステージごとに JSON イベント (処理時間・行数・rows/sec) が出て、Prometheus の textfile に
+    ステージ・カウンタ・レイテンシのヒストグラム・推定コストが書かれることを確認。
+    """
+    stream = io.StringIO()
+    metrics = PipelineMetrics(log_stream=stream, run_id="test", llm_prices=(1.0, 2.0))
+    with metrics.stage("clean") as stage:
+        stage["rows"] = 10
+    with pytest.raises(ValueError):
+        with metrics.stage("broken"):
+            raise ValueError("boom")
+    metrics.record_llm_call(0.3, prompt_tokens=1000, completion_tokens=500)
+    metrics.record_llm_call(1.5, error=FakeAPIError(429))
+    metrics.add_counts("matcher", {"fallback_rows": 3})
+
+    events = _events(stream)
+    assert [event["event"] for event in events] == ["stage", "stage", "llm_call", "llm_call"]
+    assert events[0]["stage"] == "clean" and events[0]["rows"] == 10 and "rows_per_second" in events[0]
+    assert events[1]["error"] == "ValueError"
+    assert events[3]["status_code"] == 429
+    assert metrics.cost_usd() == pytest.approx((1000 * 1.0 + 500 * 2.0) / 1_000_000)
+
+    path = tmp_path / "metrics.prom"
+    metrics.write_prometheus(str(path))
+    text = path.read_text()
+    assert 'addressmatcher_stage_rows{run_id="test",stage="clean"} 10' in text
+    assert 'addressmatcher_llm_requests_total{run_id="test"} 2' in text
+    assert 'addressmatcher_llm_errors_total{run_id="test"} 1' in text
+    assert 'addressmatcher_matcher_fallback_rows_total{run_id="test"} 3' in text
+    assert 'addressmatcher_llm_latency_seconds_bucket{run_id="test",le="0.5"} 1' in text
+    assert 'addressmatcher_llm_latency_seconds_bucket{run_id="test",le="+Inf"} 2' in text
+    assert 'addressmatcher_llm_latency_seconds_count{run_id="test"} 2' in text
+    assert "# TYPE addressmatcher_llm_cost_usd gauge" in text
+
+def test_llm_calls_and_retries_are_recorded():
+    """
+    LLMMatcher(metrics=..., on_retry=...) が API 呼び出しごとのトークン数と再試行を記録することを確認。
+    """
+    stream = io.StringIO()
+    metrics = PipelineMetrics(log_stream=stream, log_llm_calls=False)
+    client = FakeLLMClient(error_rate=0.5, seed=1)
+    matcher = LLMMatcher(
+        client=client, metrics=metrics, max_retries=20, on_retry=metrics.record_retry, sleep=lambda seconds: None
+    )
+    df = pd.DataFrame({
+        "Address1": ["1 Main Street", "1 Main St.", "2 Oak Road"],
+        "Address2": ["", "", ""],
+        "City": ["A", "A", "A"],
+        "StateName": ["NC", "NC", "NC"],
+        "PostalCode": ["10000", "10000", "10000"],
+        "CountryName": ["USA", "USA", "USA"]
+    })
+    for _ in range(5):
+        perform_llm_matching(df, matcher=matcher)
+
+    counters = metrics.counters
+    assert counters["llm_requests"] == client.usage["requests"]
+    assert counters["llm_errors"] == client.usage["errors"] == counters["llm_retries"] > 0
+    assert counters["llm_prompt_tokens"] == client.usage["prompt_tokens"] > 0
+    assert counters["llm_completion_tokens"] == client.usage["completion_tokens"] > 0
+    assert [event["event"] for event in _events(stream)] == ["llm_retry"] * counters["llm_retries"]
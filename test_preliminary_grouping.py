@@ -1,6 +1,7 @@
 import pytest
+import numpy as np
 import pandas as pd
-from preliminary_grouping import preliminary_grouping
+from preliminary_grouping import preliminary_grouping, iter_chunk_blocks, materialize_block
 
 def test_preliminary_grouping_basic():
     """
@@ -74,3 +75,53 @@ def test_preliminary_grouping_custom_group_cols():
     assert sum(len(df_sub) for df_sub in sub_dfs) == len(df_test)
 
     print("SUCCESS: test_preliminary_grouping_custom_group_cols passed")
+
+def test_iter_chunk_blocks_positions():
+    """
+    ChunkBlock がキー・分割番号・行位置を正しく持ち、
+    materialize_block で元の index のまま切り出せることを確認。
+    """
+    data = {
+        "CountryName": ["USA", "CANADA", "USA", "USA", None],
+        "StateName": ["TX", "ON", "TX", "TX", "TX"],
+        "City": ["Dallas", "Toronto", "Dallas", "Dallas", "Dallas"],
+        "Address1": ["Addr0", "Addr1", "Addr2", "Addr3", "Addr4"]
+    }
+    df_test = pd.DataFrame(data, index=[10, 11, 12, 13, 14])
+
+    blocks = list(iter_chunk_blocks(df_test, max_chunk_size=2))
+
+    # キーに欠損がある行 (index 14) は除外される
+    assert [(b.key, b.part, b.num_parts) for b in blocks] == [
+        (("CANADA", "ON", "Toronto"), 0, 1),
+        (("USA", "TX", "Dallas"), 0, 2),
+        (("USA", "TX", "Dallas"), 1, 2),
+    ]
+    assert blocks[1].positions.tolist() == [0, 2]
+
+    chunk = materialize_block(df_test, blocks[2])
+    assert chunk.index.tolist() == [13]
+    assert chunk["Address1"].tolist() == ["Addr3"]
+
+    print("SUCCESS: test_iter_chunk_blocks_positions passed")
+
+def test_iter_chunk_blocks_token_budget():
+    """
+    token_budget を指定すると、行のトークン数の合計が予算以内になるように詰められることを確認。
+    """
+    df_test = pd.DataFrame({
+        "CountryName": ["USA"] * 7,
+        "StateName": ["TX"] * 7,
+        "City": ["Dallas"] * 7,
+        "Address1": [f"Addr{i}" for i in range(7)]
+    })
+    row_tokens = lambda df: np.array([3, 3, 3, 10, 2, 2, 2])
+
+    blocks = list(iter_chunk_blocks(df_test, token_budget=6, token_estimator=row_tokens))
+    # [3,3] / [3] / [10] (1行で予算超え) / [2,2,2]
+    assert [b.positions.tolist() for b in blocks] == [[0, 1], [2], [3], [4, 5, 6]]
+    assert [b.num_parts for b in blocks] == [4, 4, 4, 4]
+
+    # max_chunk_size も上限として効く
+    blocks = list(iter_chunk_blocks(df_test, max_chunk_size=2, token_budget=100, token_estimator=row_tokens))
+    assert [len(b.positions) for b in blocks] == [2, 2, 2, 1]
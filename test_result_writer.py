@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from result_writer import PartitionedResultWriter, write_results, read_partitioned_results, write_review_excel
+
+def _sample_results():
+    return pd.DataFrame({
+        "Address1": ["1 Main St", "2 Oak Ave", "3 Pine Rd", "4 Elm Dr", "5 Ash Ct"],
+        "CountryName": ["USA", "USA", "USA", "Canada", None],
+        "StateName": ["NC", "VA", "NC", "ON / QC", "NC"],
+        "FinalGroupID": ["G1", "G2", "G1", "G3", "G4"],
+        "GroupSize": np.array([2, 1, 2, 1, 1], dtype=np.int64),
+        "NeedsReview": [True, False, True, False, True]
+    })
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+def test_partitioned_results_round_trip(tmp_path, fmt):
+    """
+    CountryName / StateName ごとのディレクトリに書き、読み戻すと同じ行になることを確認
+    (欠損や "/" を含むパーティション値、write を複数回呼んだ場合、前回の出力があるディレクトリを含む)。
+    """
+    df = _sample_results()
+    directory = str(tmp_path / "result")
+    (tmp_path / "result").mkdir()
+    (tmp_path / "result" / "stale.csv").write_text("not ours")
+
+    # 前回の出力は消えるが、ディレクトリにある他のファイルは残る
+    write_results(df.assign(StateName="OLD"), directory, fmt=fmt)
+    with PartitionedResultWriter(directory, fmt=fmt) as writer:
+        writer.write(df.iloc[:3])
+        writer.write(df.iloc[3:])
+    assert writer.rows == 5
+    assert len(writer.paths) == 4  # write ごと・パーティションごとに1ファイル
+    assert (tmp_path / "result" / "stale.csv").read_text() == "not ours"
+    assert not list((tmp_path / "result").glob("*/StateName=OLD"))
+
+    df_read = read_partitioned_results(directory)
+    key = ["Address1"]
+    df_read = df_read.sort_values(key).reset_index(drop=True)[df.columns]
+    expected = df.astype(str) if fmt == "csv" else df
+    expected = expected.assign(CountryName=df["CountryName"])
+    pd.testing.assert_frame_equal(df_read, expected, check_dtype=False)
+
+def test_write_results_batches(tmp_path):
+    paths = write_results(_sample_results(), str(tmp_path / "out"), fmt="csv", batch_rows=2)
+    assert len(read_partitioned_results(str(tmp_path / "out"))) == 5
+    assert all(path.endswith(".csv") for path in paths)
+
+def test_write_review_excel_splits_sheets(tmp_path):
+    """
+    NeedsReview の行だけが書かれ、1シートの行数を超えると次のシートに分かれることを確認。
+    """
+    path = str(tmp_path / "review.xlsx")
+    num_rows = write_review_excel(_sample_results(), path, max_rows_per_sheet=3)
+    assert num_rows == 3
+
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ["Review", "Review_2"]
+    rows = [list(sheet.values) for sheet in workbook.worksheets]
+    assert [len(sheet_rows) for sheet_rows in rows] == [3, 2]  # ヘッダー + データ行
+    assert rows[0][0][0] == "Address1"
+    assert [row[0] for row in rows[0][1:] + rows[1][1:]] == ["1 Main St", "3 Pine Rd", "5 Ash Ct"]
+    assert rows[1][1][1] is None  # 欠損は空セル
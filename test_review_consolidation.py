@@ -1,6 +1,6 @@
 import pytest
 import pandas as pd
-from review_consolidation import review_and_consolidate, merge_groups, split_group
+from review_consolidation import review_and_consolidate, merge_groups, split_group, GroupConsolidator
 
 def test_review_and_consolidate():
     data = {
@@ -53,3 +53,63 @@ def test_split_group():
     assert df_split["FinalGroupID"].tolist() == ["G1","G1","G1_SPLIT"]
 
     print("SUCCESS: test_split_group passed")
+
+def test_group_consolidator_batch():
+    """
+    複数の統合・分割の指示がまとめて (統合 → 分割の順で) 反映されることを確認。
+    """
+    df_test = pd.DataFrame({
+        "FinalGroupID": ["G1", "G2", "G2", "G3", "G4", "G5", None],
+        "PostalCode": ["27601", "27601", "27602", "27603", "27604", "27605", "27606"]
+    })
+
+    consolidator = GroupConsolidator(df_test)
+    consolidator.merge(["G1", "G2"])
+    consolidator.merge(["G1", "G3"])          # 統合後の名前で指定し、G1, G2, G3 が1つに
+    consolidator.merge(["G4", "G5"], new_id="G45")
+    consolidator.split("G1", {"PostalCode": ["27602", "27603"]}, new_id="G2_NEW")  # 統合後の名前で指定
+    consolidator.split("G45", lambda df: df["PostalCode"] == "27605")
+    df_result = consolidator.apply()
+
+    assert df_result["FinalGroupID"].tolist() == ["G1", "G1", "G2_NEW", "G2_NEW", "G45", "G45_SPLIT", None]
+    # 元の DataFrame は変更しない
+    assert df_test["FinalGroupID"].tolist()[:2] == ["G1", "G2"]
+
+    # 統合で無くなったIDを分割しようとするとエラー (G4 だけでなく G5 の行まで分けてしまわない)
+    consolidator.split("G4", df_test["PostalCode"] == "27605")
+    with pytest.raises(KeyError):
+        consolidator.apply()
+
+def test_group_consolidator_merge_uses_current_names():
+    """
+    merge で付けた名前を次の merge で指定でき、存在しないID (統合で無くなったIDを含む) はエラーになることを確認。
+    """
+    df_test = pd.DataFrame({"FinalGroupID": ["G1", "G2", "G3", "G4"]})
+
+    df_result = GroupConsolidator(df_test).merge(["G1", "G2"], new_id="M").merge(["M", "G3"]).apply()
+    assert df_result["FinalGroupID"].tolist() == ["M", "M", "M", "G4"]
+
+    with pytest.raises(KeyError):
+        GroupConsolidator(df_test).merge(["G1", "G9"])
+    with pytest.raises(KeyError):
+        GroupConsolidator(df_test).merge(["G1", "G2"], new_id="M").merge(["G2", "G3"])
+
+    # merge_groups は従来どおり、存在しないIDを無視する
+    assert merge_groups(df_test, ["G3", "G9"], "X")["FinalGroupID"].tolist() == ["G1", "G2", "X", "G4"]
+
+def test_review_and_consolidate_signals():
+    """
+    グループ単位のシグナルとフラグが行ごとに付くことを確認 (LLMGroupID が欠損の行は数えない)。
+    """
+    df_test = pd.DataFrame({
+        "LLMGroupID": ["G1", "G1", "G1", "G2", None],
+        "PostalCode": ["27601", "27602", "27601", None, "27603"],
+        "AccountNo": ["A", "B", "C", "D", "E"]
+    })
+
+    df_result = review_and_consolidate(df_test, suspicious_threshold=3, mark_singleton=True)
+
+    assert df_result["GroupSize"].tolist() == [3, 3, 3, 1, 0]
+    assert df_result["GroupDistinctPostalCodes"].tolist() == [2, 2, 2, 0, 0]
+    assert df_result["GroupDistinctAccountNos"].tolist() == [3, 3, 3, 1, 0]
+    assert df_result["NeedsReview"].tolist() == [True, True, True, True, False]
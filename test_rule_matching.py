@@ -0,0 +1,62 @@
+import pytest
+import pandas as pd
+from rule_matching import build_match_key, perform_rule_matching
+
+def test_build_match_key():
+    """
+    通り名の略語・方角・部屋番号表記の違いを吸収したキーになることを確認。
+    """
+    key = build_match_key("12301 Patrick Henry Highway", "Suite 100", "23002-1234")
+    assert key == "12301|23002|PATRICK HENRY HWY|100"
+    assert build_match_key("12301 PATRICK HENRY HWY. STE 100", "", "23002") == key
+    assert build_match_key("500 North Oak Avenue #5", "", "27605") == "500|27605|N OAK AVE|5"
+
+    # 番地・郵便番号が無い場合はキーを作らない
+    assert build_match_key("Patrick Henry Hwy", "", "23002") is None
+    assert build_match_key("12301 Patrick Henry Hwy", "", "") is None
+    assert build_match_key("12301 Patrick Henry Hwy", "", None) is None
+
+def test_perform_rule_matching():
+    """
+    キー一致の行は LLM を通さずに同一グループになり、
+    残りの行と各ルールグループの代表行だけが match_func に渡されることを確認。
+    """
+    df_test = pd.DataFrame({
+        "Address1": [
+            "123 Main Street", "123 MAIN ST", "500 Oak Avenue",
+            "123 Main St", "9 Elm Road"
+        ],
+        "Address2": ["", "", "", "", ""],
+        "PostalCode": ["27601", "27601-0001", "27605", "", "27610"],
+    }, index=[10, 11, 12, 13, 14])
+
+    calls = []
+
+    def fake_match_func(df):
+        calls.append(df.index.tolist())
+        df = df.copy()
+        # 代表行(10) と 郵便番号なしの行(13) を同一と判定
+        df["LLMGroupID"] = ["G1", "G2", "G1", "G3"]
+        return df
+
+    df_result = perform_rule_matching(df_test, match_func=fake_match_func)
+
+    # 行11 (ルールグループのメンバー) は送られない
+    assert calls == [[10, 12, 13, 14]]
+    assert df_result["LLMGroupID"].tolist() == ["G1", "G1", "G2", "G1", "G3"]
+
+def test_perform_rule_matching_all_rule_matched():
+    """
+    全行がルールでまとまる場合は match_func を呼ばないことを確認。
+    """
+    df_test = pd.DataFrame({
+        "Address1": ["123 Main Street", "123 Main St"],
+        "Address2": ["", ""],
+        "PostalCode": ["27601", "27601"],
+    })
+
+    def fail_match_func(df):
+        raise AssertionError("match_func should not be called")
+
+    df_result = perform_rule_matching(df_test, match_func=fail_match_func)
+    assert df_result["LLMGroupID"].tolist() == ["Rule_0", "Rule_0"]
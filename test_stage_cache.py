@@ -0,0 +1,65 @@
+import os
+import pytest
+import pandas as pd
+from unittest.mock import patch
+from stage_cache import load_normalized_data
+
+pytest.importorskip("pyarrow")
+
+def _write_csv(csv_file):
+    data = {
+        "CustomerDisplayName": ["SampleCustomer1", "SampleCustomer2"],
+        "locationname": ["Amelia Quarry", "Aggregates"],
+        "DistributorName": ["Distributor1", "Distributor2"],
+        "AccountNo": ["MARTI003", "54046"],
+        "Address1": ["1234 Main St.", "1000 WASHINGTON PIKE"],
+        "Address2": ["", ""],
+        "City": ["raliegh", "BRIDGEVILLE"],
+        "StateName": ["va", "PENNSYLVANIA"],
+        "PostalCode": ["23002", "15017"],
+        "CountryName": ["United States of America", "United States of America"]
+    }
+    pd.DataFrame(data).to_csv(csv_file, index=False)
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_load_normalized_data_uses_cache(tmp_path, fmt):
+    """
+    2回目の呼び出しではキャッシュが使われ、Cleaning/Normalization が再実行されないことを確認
+    """
+    csv_file = tmp_path / "customer_data.csv"
+    _write_csv(csv_file)
+    cache_dir = str(tmp_path / "cache")
+    maps = dict(city_map={"RALIEGH": "RALEIGH"}, state_map={"VA": "VIRGINIA"}, address_map={"St.": "Street"})
+
+    df_first = load_normalized_data(str(csv_file), cache_dir=cache_dir, fmt=fmt, **maps)
+    assert len(os.listdir(cache_dir)) == 2  # cleaned + normalized
+
+    with patch("stage_cache.data_cleaning_formatting.clean_and_format_data") as mock_clean:
+        df_second = load_normalized_data(str(csv_file), cache_dir=cache_dir, fmt=fmt, **maps)
+        mock_clean.assert_not_called()
+
+    assert df_second.loc[0, "City"] == "RALEIGH"
+    assert df_second.loc[0, "Address1"] == "1234 Main Street"
+    pd.testing.assert_frame_equal(df_first, df_second, check_dtype=False, check_categorical=False)
+
+def test_load_normalized_data_key_changes(tmp_path):
+    """
+    正規化辞書や入力ファイルが変わると別のキャッシュになることを確認
+    """
+    csv_file = tmp_path / "customer_data.csv"
+    _write_csv(csv_file)
+    cache_dir = str(tmp_path / "cache")
+
+    load_normalized_data(str(csv_file), cache_dir=cache_dir)
+    df_mapped = load_normalized_data(str(csv_file), cache_dir=cache_dir, city_map={"RALIEGH": "RALEIGH"})
+    # 辞書違い => normalized が1つ増える (cleaned は共有)
+    assert len(os.listdir(cache_dir)) == 3
+    assert df_mapped.loc[0, "City"] == "RALEIGH"
+
+    # 入力ファイルが変われば cleaned も作り直し
+    df = pd.read_csv(csv_file)
+    df.loc[0, "Address1"] = "99 Other Rd"
+    df.to_csv(csv_file, index=False)
+    df_changed = load_normalized_data(str(csv_file), cache_dir=cache_dir)
+    assert df_changed.loc[0, "Address1"] == "99 Other Rd"
+    assert len(os.listdir(cache_dir)) == 5
@@ -0,0 +1,28 @@
+import pandas as pd
+from data_ingestion import REQUIRED_COLUMNS
+from synthetic_data import make_synthetic_addresses, ENTITY_ID_COL
+
+def test_make_synthetic_addresses_is_seeded_and_controls_duplicates():
+    """
+    同じシードなら同じデータになり、重複率・ノイズ率・都市の偏りが指定どおりに反映されることを確認。
+    """
+    df = make_synthetic_addresses(5000, duplicate_rate=0.4, noise_rate=0.0, city_skew=1.5, seed=7, include_entity_id=True)
+
+    assert list(df.columns) == REQUIRED_COLUMNS + [ENTITY_ID_COL]
+    pd.testing.assert_frame_equal(df, make_synthetic_addresses(5000, 0.4, 0.0, 1.5, seed=7, include_entity_id=True))
+    assert not df.equals(make_synthetic_addresses(5000, 0.4, 0.0, 1.5, seed=8, include_entity_id=True))
+
+    assert df[ENTITY_ID_COL].nunique() == 3000
+    # ノイズなしなら、同じ実体の行は住所がすべて同じ
+    address_cols = ["Address1", "Address2", "City", "StateName", "PostalCode"]
+    assert (df.groupby(ENTITY_ID_COL)[address_cols].nunique() == 1).all().all()
+
+    city_shares = df["City"].value_counts(normalize=True)
+    assert city_shares.iloc[0] > 3 * city_shares.iloc[len(city_shares) // 2]
+
+def test_make_synthetic_addresses_noise():
+    df = make_synthetic_addresses(2000, duplicate_rate=0.5, noise_rate=1.0, seed=1, include_entity_id=True)
+    # すべての行に何かしらの表記ゆれが入るので、実体ごとの表記が複数になる
+    assert (df.groupby(ENTITY_ID_COL)["Address1"].nunique() > 1).any()
+    assert df["PostalCode"].str.contains("-").any()
+    assert df["City"].str.islower().any()
@@ -0,0 +1,54 @@
+import numpy as np
+from typing import Iterable
+
+class UnionFind:
+    """
+    0 .. n-1 の整数コードに対する Union-Find (素集合データ構造)。
+
+    - union(a, b) で2つの集合をまとめる。代表 (根) は常に小さい方のコードになるので、
+      「先に出てきたグループのIDを残す」といった決定的な統合ができる
+    - roots() で全要素の根をまとめて (ベクトル化して) 求める
+    """
+
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            # 経路半減
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return int(x)
+
+    def union(self, a: int, b: int) -> bool:
+        """
+        a と b の集合をまとめる。別々の集合だった場合 True を返す。
+        """
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if root_b < root_a:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        return True
+
+    def union_many(self, a: Iterable[int], b: Iterable[int]) -> int:
+        """
+        (a[i], b[i]) の組をすべてまとめ、実際に統合された回数を返す。
+        """
+        return sum(self.union(int(x), int(y)) for x, y in zip(a, b))
+
+    def roots(self) -> np.ndarray:
+        """
+        全要素の根を返す (親配列を根に張り替える)。
+        """
+        parent = self.parent
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                return parent.copy()
+            parent[:] = grandparent